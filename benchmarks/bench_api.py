@@ -0,0 +1,306 @@
+"""
+HTTP load test of the API: drives every polled GET route plus
+/update-sleep and /device/update-setting with a weighted traffic mix at one
+or more concurrency levels, and reports throughput and p50/p95/p99 latency
+overall and per route.
+
+The app runs in-process against a fresh storage backend per scenario:
+"memory" and "sqlite" (a temporary file), or "firestore-sync" /
+"firestore-async" on benchmarks.firestore_standin with a simulated round
+trip. Requests go through httpx's ASGI transport by default, or through a
+real uvicorn server (a child process on localhost) with --transport http;
+the latter measures HTTP parsing too, but needs a spare core for the server
+to give meaningful numbers.
+
+Results can be saved as JSON and a later run compared against them; the
+comparison exits with status 1 if any scenario's throughput drops, or its
+p99 grows, by more than --max-regression. From the repository root:
+
+    python -m benchmarks.bench_api --concurrency 1,50,200 --output bench_base.json
+    python -m benchmarks.bench_api --concurrency 1,50,200 --compare bench_base.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import main
+from benchmarks.firestore_standin import StandInAsyncClient, StandInClient, StandInStore
+from storage import FirestoreStorage, MemoryStorage, SQLiteStorage
+
+BACKENDS = ("memory", "sqlite", "firestore-sync", "firestore-async")
+
+# (weight, method, path, json body). Polling reads dominate, as with the
+# watch app and the Pi; "{flag}" alternates between true and false.
+TRAFFIC_MIX = [
+    (6, "GET", "/state/is-sleeping", None),
+    (4, "GET", "/state", None),
+    (4, "GET", "/device/settings", None),
+    (3, "GET", "/device/settings/sleep", None),
+    (3, "GET", "/device/settings/not-sleep", None),
+    (1, "GET", "/debug/db", None),
+    (1, "GET", "/debug/cache", None),
+    (1, "GET", "/debug/writes", None),
+    (1, "GET", "/", None),
+    (3, "POST", "/update-sleep", {"isSleeping": "{flag}"}),
+    (1, "POST", "/device/update-setting", {"device": "lights", "setting": "sleepingStatus", "value": "{flag}"}),
+]
+
+
+def _schedule(total, households):
+    """Deterministic request list following TRAFFIC_MIX weights, spread over `households`."""
+    pattern = [(method, path, body) for weight, method, path, body in TRAFFIC_MIX for _ in range(weight)]
+    requests = []
+    for i in range(total):
+        method, path, body = pattern[i % len(pattern)]
+        household = f"bench{i % households}"
+        if body is not None:
+            flag = (i // len(pattern)) % 2 == 0
+            body = {k: (flag if v == "{flag}" else v) for k, v in body.items()}
+        requests.append((method, path, household, body))
+    return requests
+
+
+def _make_storage(backend, latency, workdir):
+    if backend == "memory":
+        return MemoryStorage(), None
+    if backend == "sqlite":
+        return SQLiteStorage(os.path.join(workdir, f"bench-{time.monotonic_ns()}.db")), None
+    store = StandInStore(latency=latency)
+    async_client = StandInAsyncClient(store) if backend == "firestore-async" else None
+    return FirestoreStorage(StandInClient(store), async_client), store
+
+
+def _percentiles(latencies):
+    if len(latencies) < 2:
+        value = latencies[0] * 1000 if latencies else None
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    q = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_ms": q[49] * 1000, "p95_ms": q[94] * 1000, "p99_ms": q[98] * 1000}
+
+
+class _Server:
+    """
+    uvicorn serving main.app with `backend` on a free localhost port, in a
+    child process so the server and the load generator don't share a GIL.
+    """
+
+    def __init__(self, backend, latency, workdir):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self._cmd = [
+            sys.executable, "-m", "benchmarks.bench_api", "--serve", str(self.port),
+            "--backend", backend, "--latency-ms", str(latency * 1000), "--workdir", workdir,
+        ]
+        self._proc = None
+
+    def __enter__(self):
+        self._proc = subprocess.Popen(self._cmd, stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                    break
+            except OSError:
+                if self._proc.poll() is not None or time.monotonic() > deadline:
+                    self.__exit__()
+                    raise RuntimeError("benchmark server did not start")
+                time.sleep(0.1)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self._proc.terminate()
+        try:
+            self._proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+
+
+def _serve(port, backend, latency, workdir):
+    import uvicorn
+
+    main._storage, _ = _make_storage(backend, latency, workdir)
+    main._storage.add_change_callback(main._on_document_change)
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def _drive(client, requests, concurrency):
+    """Send `requests` keeping `concurrency` in flight; returns per-request (route, status, seconds)."""
+    samples = []
+    queue = iter(requests)
+
+    async def worker():
+        for method, path, household, body in queue:
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, path, params={"household": household}, json=body)
+                status = r.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.append((f"{method} {path}", status, time.perf_counter() - t0))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+async def _run_scenario(base_url, transport, requests, warmup, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as client:
+        if warmup:
+            await _drive(client, requests[:warmup], min(concurrency, warmup))
+        return await _drive(client, requests, concurrency)
+
+
+def _summarize(samples, elapsed):
+    latencies = sorted(s for _, _, s in samples)
+    errors = sum(1 for _, status, _ in samples if status != 200)
+    routes = {}
+    for route, status, seconds in samples:
+        routes.setdefault(route, []).append(seconds)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(samples) / elapsed if elapsed else None,
+        **_percentiles(latencies),
+        "routes": {
+            route: {"requests": len(values), **_percentiles(sorted(values))}
+            for route, values in sorted(routes.items())
+        },
+    }
+
+
+def run(backends, concurrencies, total, warmup, households, latency, transport_name):
+    """Run every (backend, concurrency) scenario, yielding one result dict each."""
+    requests = _schedule(total, households)
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in backends:
+            for concurrency in concurrencies:
+                result = {"scenario": f"{backend}@c{concurrency}", "backend": backend, "concurrency": concurrency}
+                if transport_name == "http":
+                    with _Server(backend, latency, workdir) as base_url:
+                        samples, elapsed = asyncio.run(_run_scenario(base_url, None, requests, warmup, concurrency))
+                    result.update(_summarize(samples, elapsed))
+                    yield result
+                    continue
+
+                storage, store = _make_storage(backend, latency, workdir)
+                previous, main._storage = main._storage, storage
+                storage.add_change_callback(main._on_document_change)
+                try:
+                    transport = httpx.ASGITransport(app=main.app)
+                    samples, elapsed = asyncio.run(_run_scenario("http://bench", transport, requests, warmup, concurrency))
+                finally:
+                    main._storage = previous
+                    storage.close()
+                result.update(_summarize(samples, elapsed))
+                if store is not None:
+                    result["rpcs"] = store.rpcs
+                yield result
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, max_regression):
+    """
+    Compare scenarios present in both runs. Returns a list of regression
+    messages: throughput below (1 - max_regression) x baseline, or p99 above
+    (1 + max_regression) x baseline, or new errors.
+    """
+    base = {r["scenario"]: r for r in baseline["results"]}
+    problems = []
+    for r in results:
+        b = base.get(r["scenario"])
+        if b is None:
+            continue
+        if b["throughput_rps"] and r["throughput_rps"] < b["throughput_rps"] * (1 - max_regression):
+            problems.append(f"{r['scenario']}: throughput {r['throughput_rps']:.1f} req/s vs baseline {b['throughput_rps']:.1f}")
+        if b["p99_ms"] and r["p99_ms"] > b["p99_ms"] * (1 + max_regression):
+            problems.append(f"{r['scenario']}: p99 {r['p99_ms']:.2f} ms vs baseline {b['p99_ms']:.2f}")
+        if r["errors"] > b["errors"]:
+            problems.append(f"{r['scenario']}: {r['errors']} errors vs baseline {b['errors']}")
+    return problems
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backend", default="memory", help=f"comma-separated, from {', '.join(BACKENDS)}")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 50, 200], help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=3000, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=200, help="unmeasured requests before each scenario")
+    parser.add_argument("--households", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated Firestore round trip")
+    parser.add_argument("--transport", choices=("asgi", "http"), default="asgi")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --output run")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="tolerated fractional slowdown")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)  # child server of --transport http
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.serve, args.backend, args.latency_ms / 1000, args.workdir or tempfile.gettempdir())
+        return
+
+    backends = [b.strip() for b in args.backend.split(",") if b.strip()]
+    unknown = [b for b in backends if b not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backend(s): {', '.join(unknown)}")
+
+    print(f"{args.requests} requests per scenario, {args.households} households, transport {args.transport}\n")
+    print(f"{'scenario':<24} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    results = []
+    for r in run(backends, args.concurrency, args.requests, args.warmup, args.households,
+                 args.latency_ms / 1000, args.transport):
+        results.append(r)
+        print(f"{r['scenario']:<24} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>6}")
+
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "serve", "workdir")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.max_regression)
+        if problems:
+            print(f"\nREGRESSION vs {args.compare} (commit {baseline.get('commit')}):")
+            for p in problems:
+                print(f"  {p}")
+            sys.exit(1)
+        print(f"\nOK: no regression beyond {args.max_regression:.0%} vs {args.compare}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,322 @@
+"""
+Throughput, per-sample latency and per-instance memory of every
+SleepDetector variant in hardware/, over the same synthetic nights, plus a
+check of where their outputs diverge from hardware.detector (the rules the
+Controller runs).
+
+Variants:
+    detector            hardware/detector.py (extracted from hardware.py)
+    editedApiCode       hardware/editedApiCode.py (curtain opens once per day)
+    HarwareWithSafety   hardware/HarwareWithSafety.py
+    apiAddedCode        hardware/apiAddedCode.py
+    capstoneWithMotor   hardware/capstoneWithMotor.py
+
+The last three are scripts that drive GPIO and loop at import, so only
+their SleepDetector class is compiled out of the source. Their global
+turn_off_lamp() is pointed at the same lamp callback the others get, and
+print() inside them is a no-op so the numbers measure the rules, not the
+terminal. HarwareWithSafety's constructor is spelled `_init_`, so
+SleepDetector(resting_hr) raises TypeError there; it is reported as broken
+and measured by calling `_init_` on a bare instance.
+
+Each synthetic user (hardware.fleet.generate_user) keeps one detector for
+all of their nights, as a server would. Reported per variant:
+samples/s (best of --repeat), p50/p99/p99.9/max of per-call latency
+(perf_counter_ns around every call; the timer's own cost is printed),
+bytes per instance (tracemalloc over --instances new detectors),
+and sleep/wake outputs and lamp-lock calls that differ from `detector`.
+
+Results can be saved as JSON and a later run compared against them; the
+comparison exits with status 1 if a variant's throughput drops, or its p99
+grows, by more than --max-regression. From the repository root:
+
+    python -m benchmarks.bench_detectors --users 50 --nights 7 --output detectors_base.json
+    python -m benchmarks.bench_detectors --users 50 --nights 7 --compare detectors_base.json
+"""
+import argparse
+import ast
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from hardware.fleet import generate_user
+
+HARDWARE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hardware")
+REFERENCE = "detector"
+
+
+class Variant:
+    """One SleepDetector class and how to build it with a lamp callback."""
+
+    def __init__(self, name, cls, namespace=None):
+        self.name = name
+        self.cls = cls
+        self.namespace = namespace   # globals of a class compiled out of a script
+        self.note = None
+        try:
+            cls(65)
+        except TypeError as e:
+            self.note = f"SleepDetector(resting_hr) raises TypeError ({e})"
+
+    def make(self, resting_hr, sleep_threshold, required_minutes, on_lamp_lock):
+        if self.namespace is not None:
+            self.namespace["turn_off_lamp"] = on_lamp_lock
+        if self.note is not None:
+            detector = self.cls.__new__(self.cls)
+            detector._init_(resting_hr, sleep_threshold, required_minutes)
+            return detector
+        try:
+            return self.cls(resting_hr, sleep_threshold, required_minutes, on_lamp_lock=on_lamp_lock)
+        except TypeError:
+            return self.cls(resting_hr, sleep_threshold, required_minutes)
+
+
+def _from_script(name):
+    """Compile only the SleepDetector class of hardware/<name>.py."""
+    path = os.path.join(HARDWARE, f"{name}.py")
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    node = next(n for n in tree.body if isinstance(n, ast.ClassDef) and n.name == "SleepDetector")
+    namespace = {"__name__": f"bench_detectors.{name}", "print": lambda *args, **kwargs: None,
+                 "turn_off_lamp": lambda: None}
+    exec(compile(ast.Module(body=[node], type_ignores=[]), path, "exec"), namespace)
+    return Variant(name, namespace["SleepDetector"], namespace)
+
+
+def load_variants():
+    from hardware import detector, editedApiCode
+
+    variants = [Variant("detector", detector.SleepDetector), Variant("editedApiCode", editedApiCode.SleepDetector)]
+    editedApiCode.print = lambda *args, **kwargs: None
+    for name in ("HarwareWithSafety", "apiAddedCode", "capstoneWithMotor"):
+        variants.append(_from_script(name))
+    return variants
+
+
+def standard_nights(users, nights, seed):
+    """Per user: (resting_hr, [(bpm, "HH:MM"), ...] over all their nights)."""
+    out = []
+    for user in range(users):
+        fleet = generate_user(seed, user, nights)
+        minute = fleet.minute.astype(np.int64)
+        hhmm = [f"{h:02d}:{m:02d}" for h, m in zip((minute // 60).tolist(), (minute % 60).tolist())]
+        out.append((int(fleet.resting_hr[0]), list(zip(fleet.bpm.tolist(), hhmm))))
+    return out
+
+
+def _noop():
+    pass
+
+
+def throughput(variant, users, threshold, required, repeat):
+    samples = sum(len(s) for _, s in users)
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        for resting_hr, night in users:
+            process = variant.make(resting_hr, threshold, required, _noop).process_heart_rate
+            for hr, t in night:
+                process(hr, t)
+        best = min(best, time.perf_counter() - t0)
+    return samples / best
+
+
+def latencies(variant, users, threshold, required):
+    clock = time.perf_counter_ns
+    out = []
+    append = out.append
+    for resting_hr, night in users:
+        process = variant.make(resting_hr, threshold, required, _noop).process_heart_rate
+        for hr, t in night:
+            t0 = clock()
+            process(hr, t)
+            append(clock() - t0)
+    return np.array(out)
+
+
+def timer_overhead(n=100_000):
+    clock = time.perf_counter_ns
+    out = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        t0 = clock()
+        out[i] = clock() - t0
+    return float(np.median(out))
+
+
+def bytes_per_instance(variant, threshold, required, instances):
+    """Traced bytes per detector over `instances` new ones (no variant adds attributes later)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    detectors = [variant.make(65, threshold, required, _noop) for _ in range(instances)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del detectors
+    return (after - before) / instances
+
+
+def outputs(variant, users, threshold, required):
+    """Per user: the sleep/wake status list and the sample indices of lamp-lock calls."""
+    out = []
+    for resting_hr, night in users:
+        lamp = []
+        position = [0]
+        detector = variant.make(resting_hr, threshold, required, lambda: lamp.append(position[0]))
+        status = []
+        for i, (hr, t) in enumerate(night):
+            position[0] = i
+            status.append(detector.process_heart_rate(hr, t))
+        out.append((status, lamp))
+    return out
+
+
+def divergence(reference, candidate, users):
+    """Counts of differing outputs vs the reference, and the first differing sample."""
+    samples = users_affected = lamp_users = 0
+    first = None
+    for u, ((ref_status, ref_lamp), (status, lamp)) in enumerate(zip(reference, candidate)):
+        diff = [i for i, (a, b) in enumerate(zip(ref_status, status)) if a != b]
+        if diff:
+            samples += len(diff)
+            users_affected += 1
+            if first is None:
+                i = diff[0]
+                hr, t = users[u][1][i]
+                first = f"user {u} sample {i} ({t}, {hr} bpm): {ref_status[i]} -> {status[i]}"
+        if ref_lamp != lamp:
+            lamp_users += 1
+    lamp_calls = sum(len(lamp) for _, lamp in candidate)
+    return {"status_diffs": samples, "users_diverging": users_affected, "lamp_users_diverging": lamp_users,
+            "lamp_calls": lamp_calls, "first_divergence": first}
+
+
+def run(variants, users, threshold, required, repeat, instances):
+    results = []
+    reference = None
+    for variant in variants:
+        lat = latencies(variant, users, threshold, required)
+        result = {
+            "variant": variant.name,
+            "samples_per_s": throughput(variant, users, threshold, required, repeat),
+            "p50_ns": float(np.percentile(lat, 50)),
+            "p99_ns": float(np.percentile(lat, 99)),
+            "p999_ns": float(np.percentile(lat, 99.9)),
+            "max_ns": float(lat.max()),
+            "bytes_per_instance": bytes_per_instance(variant, threshold, required, instances),
+            "note": variant.note,
+        }
+        produced = outputs(variant, users, threshold, required)
+        if reference is None:
+            reference = produced
+        result.update(divergence(reference, produced, users))
+        results.append(result)
+    return results
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, max_regression):
+    """
+    Compare variants present in both runs. Returns a list of regression
+    messages: throughput below (1 - max_regression) x baseline, p99 above
+    (1 + max_regression) x baseline, or outputs that now differ where they
+    did not.
+    """
+    base = {r["variant"]: r for r in baseline["results"]}
+    problems = []
+    for r in results:
+        b = base.get(r["variant"])
+        if b is None:
+            continue
+        if r["samples_per_s"] < b["samples_per_s"] * (1 - max_regression):
+            problems.append(f"{r['variant']}: {r['samples_per_s']:,.0f} samples/s vs baseline {b['samples_per_s']:,.0f}")
+        if r["p99_ns"] > b["p99_ns"] * (1 + max_regression):
+            problems.append(f"{r['variant']}: p99 {r['p99_ns']:.0f} ns vs baseline {b['p99_ns']:.0f}")
+        if r["status_diffs"] != b["status_diffs"] or r["lamp_calls"] != b["lamp_calls"]:
+            problems.append(f"{r['variant']}: outputs changed ({r['status_diffs']} status diffs, {r['lamp_calls']} "
+                            f"lamp calls vs baseline {b['status_diffs']}, {b['lamp_calls']})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--nights", type=int, default=7, help="nights per user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sleep-threshold", type=int, default=5)
+    parser.add_argument("--required-minutes", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--instances", type=int, default=10_000, help="detectors created for the memory figure")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --output run")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="tolerated fractional slowdown")
+    args = parser.parse_args()
+
+    variants = load_variants()
+    users = standard_nights(args.users, args.nights, args.seed)
+    samples = sum(len(s) for _, s in users)
+    print(f"{args.users} users x {args.nights} nights, {samples:,} one-minute samples per variant; "
+          f"timer overhead {timer_overhead():.0f} ns per call\n")
+    print(f"{'variant':<18} {'samples/s':>11} {'p50 ns':>7} {'p99 ns':>7} {'p99.9 ns':>8} {'max ns':>8} "
+          f"{'B/inst':>7} {'status diffs':>12} {'users':>5} {'lamp calls':>10}")
+    results = run(variants, users, args.sleep_threshold, args.required_minutes, args.repeat, args.instances)
+    for r in results:
+        print(f"{r['variant']:<18} {r['samples_per_s']:>11,.0f} {r['p50_ns']:>7.0f} {r['p99_ns']:>7.0f} "
+              f"{r['p999_ns']:>8.0f} {r['max_ns']:>8.0f} {r['bytes_per_instance']:>7.0f} "
+              f"{r['status_diffs']:>12} {r['users_diverging']:>5} {r['lamp_calls']:>10}")
+
+    flagged = [r for r in results if r["note"] or r["status_diffs"] or r["lamp_users_diverging"]]
+    if flagged:
+        print(f"\nDIVERGENT from {REFERENCE}:")
+        for r in flagged:
+            if r["note"]:
+                print(f"  {r['variant']}: {r['note']}")
+            if r["status_diffs"]:
+                print(f"  {r['variant']}: {r['status_diffs']} sleep/wake outputs differ for {r['users_diverging']} "
+                      f"users, first at {r['first_divergence']}")
+            if r["lamp_users_diverging"]:
+                print(f"  {r['variant']}: lamp-lock calls differ for {r['lamp_users_diverging']} users "
+                      f"({r['lamp_calls']} calls)")
+
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.max_regression)
+        if problems:
+            print(f"\nREGRESSION vs {args.compare} (commit {baseline.get('commit')}):")
+            for p in problems:
+                print(f"  {p}")
+            sys.exit(1)
+        print(f"\nOK: no regression beyond {args.max_regression:.0%} vs {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare request throughput of the sync (threadpool) and async (AsyncClient)
+Firestore modes of main.py under concurrent load.
+
+Both modes run against benchmarks.firestore_standin with the same simulated
+round-trip latency, so the difference comes only from how handlers wait on
+Firestore. Run from the repository root:
+
+    python -m benchmarks.bench_firestore_modes --concurrency 200 --requests 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+import main
+from benchmarks.firestore_standin import StandInAsyncClient, StandInClient, StandInStore
+from storage import FirestoreStorage
+
+# (method, path, json body) — mostly polling reads with some sleep updates
+TRAFFIC_MIX = [
+    ("GET", "/state", None),
+    ("GET", "/state/is-sleeping", None),
+    ("GET", "/device/settings/sleep", None),
+    ("GET", "/device/settings/not-sleep", None),
+    ("GET", "/debug/db", None),
+    ("POST", "/update-sleep", {"isSleeping": True}),
+    ("GET", "/state", None),
+    ("POST", "/update-sleep", {"isSleeping": False}),
+]
+
+
+def _configure(mode, store):
+    async_client = StandInAsyncClient(store) if mode == "async" else None
+    main._storage = FirestoreStorage(StandInClient(store), async_client)
+
+
+async def _run(mode, total, concurrency, latency):
+    store = StandInStore(latency=latency)
+    _configure(mode, store)
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            nonlocal errors
+            method, path, body = TRAFFIC_MIX[i % len(TRAFFIC_MIX)]
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.request(method, path, json=body)
+                latencies.append(time.perf_counter() - t0)
+                if r.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100)
+    return {
+        "mode": mode,
+        "requests": total,
+        "errors": errors,
+        "rpcs": store.rpcs,
+        "throughput_rps": total / elapsed,
+        "p50_ms": q[49] * 1000,
+        "p99_ms": q[98] * 1000,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated Firestore round trip")
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, Firestore latency {args.latency_ms} ms\n")
+    print(f"{'mode':<6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'rpcs':>6} {'errors':>6}")
+    for mode in ("sync", "async"):
+        r = asyncio.run(_run(mode, args.requests, args.concurrency, args.latency_ms / 1000))
+        print(f"{r['mode']:<6} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['rpcs']:>6} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,125 @@
+"""
+Compare whole-day and incremental Fitbit intraday polling against the local
+stand-in (benchmarks.fitbit_standin) on a virtual clock.
+
+Each poll advances the stand-in's clock by --interval seconds. The
+"whole-day" strategy downloads .../date/today/1d/1sec.json and takes its last
+sample, as hardware/mainFitbit.py used to; "incremental" is
+hardware.fitbit.IntradayHeartRate. Both must see the same latest sample on
+every poll.
+
+With --hours, the stand-in enforces Fitbit's hourly quota (--limit) and a
+fixed --interval poller (waiting out each 429's Retry-After) is compared
+with hardware.fitbit.PollScheduler over that many virtual hours: requests
+sent, 429s received and how stale samples from the 20:00-04:00 sleep
+window were when they arrived. From the repository root:
+
+    python -m benchmarks.bench_fitbit_polling --start 22:00 --polls 120
+    python -m benchmarks.bench_fitbit_polling --start 18:00 --hours 12 --interval 10
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.fitbit_standin import FitbitStandIn, UrllibSession
+from hardware.fitbit import FitbitError, IntradayHeartRate, PollScheduler, RequestBudget
+
+
+def _in_sleep_window(ts):
+    return ts.hour >= 20 or ts.hour < 4
+
+
+def compare_scheduling(args, start):
+    results = {}
+    for name in ("fixed", "scheduled"):
+        server = FitbitStandIn(start, limit=args.limit).start()
+        end = start + datetime.timedelta(hours=args.hours)
+
+        def advance(seconds):
+            server.now += datetime.timedelta(seconds=seconds)
+
+        fetcher = IntradayHeartRate(UrllibSession(), base_url=server.base_url, clock=lambda: server.now)
+        if name == "scheduled":
+            budget = RequestBudget(limit=args.limit, clock=lambda: server.now.timestamp())
+            scheduler = PollScheduler(fetcher, budget, sleep=advance)
+        lags = []
+        try:
+            while server.now < end:
+                if name == "scheduled":
+                    new = scheduler.poll_once()
+                    delay = scheduler.next_delay()
+                else:
+                    delay = args.interval
+                    try:
+                        new = fetcher.fetch_new()
+                    except FitbitError as e:
+                        new = []
+                        delay = max(delay, e.retry_after or 60.0)
+                lags.extend((server.now - ts).total_seconds() for ts, _ in new if _in_sleep_window(ts))
+                advance(delay)
+        finally:
+            server.stop()
+        results[name] = (server.requests, server.throttled, lags)
+
+    print(f"{args.hours:g} virtual hours from {args.date} {args.start}, quota {args.limit}/h, "
+          f"fixed interval {args.interval:g}s")
+    for name, (requests, throttled, lags) in results.items():
+        mean = sum(lags) / len(lags) if lags else float("nan")
+        worst = max(lags) if lags else float("nan")
+        print(f"{name:10s} {requests:6d} requests  {throttled:5d} x 429  "
+              f"sleep-window staleness mean {mean:7.1f}s  max {worst:7.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-day vs incremental Fitbit intraday polling.")
+    parser.add_argument("--date", default="2026-01-15")
+    parser.add_argument("--start", default="22:00", help="virtual time of the first poll (HH:MM)")
+    parser.add_argument("--polls", type=int, default=60)
+    parser.add_argument("--interval", type=float, default=30.0, help="virtual seconds between polls")
+    parser.add_argument("--hours", type=float, help="compare fixed and scheduled polling over this many hours")
+    parser.add_argument("--limit", type=int, default=150, help="requests per hour (with --hours)")
+    args = parser.parse_args()
+
+    now = datetime.datetime.combine(datetime.date.fromisoformat(args.date),
+                                    datetime.time.fromisoformat(args.start))
+    if args.hours:
+        return compare_scheduling(args, now)
+    server = FitbitStandIn(now).start()
+    session = UrllibSession()
+    whole_day_url = f"{server.base_url}/1/user/-/activities/heart/date/today/1d/1sec.json"
+    fetcher = IntradayHeartRate(session, base_url=server.base_url, clock=lambda: server.now)
+    totals = {"whole-day": [0, 0.0], "incremental": [0, 0.0]}
+    received = 0
+    try:
+        for _ in range(args.polls):
+            server.now += datetime.timedelta(seconds=args.interval)
+
+            sent = server.bytes_sent
+            t0 = time.perf_counter()
+            dataset = session.get(whole_day_url).json()["activities-heart-intraday"]["dataset"]
+            latest_full = (dataset[-1]["time"], dataset[-1]["value"]) if dataset else None
+            totals["whole-day"][1] += time.perf_counter() - t0
+            totals["whole-day"][0] += server.bytes_sent - sent
+
+            sent = server.bytes_sent
+            t0 = time.perf_counter()
+            new = fetcher.fetch_new()
+            totals["incremental"][1] += time.perf_counter() - t0
+            totals["incremental"][0] += server.bytes_sent - sent
+            received += len(new)
+            latest_incremental = (f"{fetcher.cursor:%H:%M:%S}", new[-1][1]) if new else None
+
+            if new and latest_full != latest_incremental:
+                raise SystemExit(f"MISMATCH at {server.now}: whole-day={latest_full} incremental={latest_incremental}")
+    finally:
+        server.stop()
+
+    print(f"{args.polls} polls every {args.interval:g}s from {args.date} {args.start}; "
+          f"{received} new samples received incrementally")
+    for name, (nbytes, seconds) in totals.items():
+        print(f"{name:12s} {nbytes / 1e6:10.2f} MB  {seconds * 1000 / args.polls:8.2f} ms/poll")
+    print("OK: identical latest samples")
+
+
+if __name__ == "__main__":
+    main()
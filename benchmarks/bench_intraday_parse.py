@@ -0,0 +1,86 @@
+"""
+Parse time and peak memory of a Fitbit intraday response: json.loads of the
+whole body (a dict per sample) vs hardware.intraday.parse_dataset streaming
+the body in chunks into uint32/uint16 arrays.
+
+The body is a synthetic full day of 1-second data in Fitbit's compact
+layout; --pretty adds whitespace so the regex fallback path is timed
+instead. Peak memory is measured with tracemalloc and excludes the body
+itself, which a streamed response never holds in full. From the repository
+root:
+
+    python -m benchmarks.bench_intraday_parse --seconds 86400
+"""
+import argparse
+import datetime
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from hardware.intraday import parse_dataset
+
+
+def synthetic_body(seconds, pretty=False, seed=0):
+    rng = np.random.default_rng(seed)
+    bpm = rng.integers(40, 180, size=seconds).tolist()
+    dataset = [{"time": f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}", "value": v} for s, v in enumerate(bpm)]
+    doc = {
+        "activities-heart": [{"dateTime": "2026-01-15", "value": {"restingHeartRate": 65}}],
+        "activities-heart-intraday": {"dataset": dataset, "datasetInterval": 1, "datasetType": "second"},
+    }
+    return json.dumps(doc, indent=1 if pretty else None, separators=None if pretty else (",", ":")).encode()
+
+
+def _with_json(body, chunk_size):
+    data = json.loads(body)
+    return data["activities-heart-intraday"]["dataset"]
+
+
+def _streaming(body, chunk_size):
+    chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    return parse_dataset(chunks, datetime.date(2026, 1, 15))
+
+
+def measure(fn, body, chunk_size, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(body, chunk_size)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    result = fn(body, chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="json.loads vs streaming parse of an intraday response.")
+    parser.add_argument("--seconds", type=int, default=86400, help="samples in the body")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pretty", action="store_true", help="indented JSON (regex fallback path)")
+    args = parser.parse_args()
+
+    body = synthetic_body(args.seconds, args.pretty)
+    print(f"{args.seconds} samples, {len(body) / 1e6:.2f} MB body, {args.chunk_size // 1024} KiB chunks")
+
+    dataset, t_json, peak_json = measure(_with_json, body, args.chunk_size, args.repeat)
+    series, t_stream, peak_stream = measure(_streaming, body, args.chunk_size, args.repeat)
+
+    print(f"json.loads:  {t_json * 1000:8.1f} ms  peak {peak_json / 1e6:8.2f} MB")
+    print(f"streaming:   {t_stream * 1000:8.1f} ms  peak {peak_stream / 1e6:8.2f} MB  "
+          f"(arrays {series.nbytes / 1e6:.2f} MB)")
+    print(f"speed-up x{t_json / t_stream:.1f}, memory /{peak_json / max(peak_stream, 1):.1f}")
+
+    expected_bpm = [p["value"] for p in dataset]
+    expected_seconds = [int(p["time"][:2]) * 3600 + int(p["time"][3:5]) * 60 + int(p["time"][6:]) for p in dataset]
+    if series.bpm.tolist() != expected_bpm or series.seconds.tolist() != expected_seconds:
+        raise SystemExit("MISMATCH between json.loads and the streaming parser")
+    print("OK: identical samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+In-process stand-in for the parts of the Firestore client used by main.py.
+
+Documents live in a shared dict and every RPC (get, set, update, get_all,
+batch commit, transaction begin/commit/rollback) waits `latency` seconds,
+blocking in the sync client and awaiting asyncio.sleep in the async client,
+so both access modes can be benchmarked against the same simulated network
+round trip.
+
+Transactions work with google.cloud.firestore's transactional and
+async_transactional decorators. As in Firestore's server client libraries,
+get_all(..., transaction=t) locks the documents it reads until the
+transaction commits or rolls back, so concurrent transactions on the same
+documents queue. A non-transactional write to a locked document is not
+blocked, but the transaction then fails its commit with Aborted and the
+decorator retries it.
+"""
+import asyncio
+import copy
+import datetime
+import itertools
+import threading
+import time
+
+from google.api_core.exceptions import Aborted
+
+
+class StandInStore:
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.rpcs = 0
+        self._docs = {}
+        self._update_times = {}
+        self._versions = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._held = {}                          # path -> id of the transaction holding its lock
+        self._released = threading.Condition(self._lock)
+
+    def _try_lock(self, paths, transaction_id):
+        if any(self._held.get(path, transaction_id) != transaction_id for path in paths):
+            return False
+        for path in paths:
+            self._held[path] = transaction_id
+        return True
+
+    def lock(self, paths, transaction_id):
+        """Block until every path is free (or already held by this transaction), then hold them."""
+        with self._released:
+            self._released.wait_for(lambda: self._try_lock(paths, transaction_id))
+
+    async def lock_async(self, paths, transaction_id):
+        while True:
+            with self._lock:
+                if self._try_lock(paths, transaction_id):
+                    return
+            await asyncio.sleep(0.001)
+
+    def unlock(self, transaction_id):
+        with self._released:
+            for path in [p for p, t in self._held.items() if t == transaction_id]:
+                del self._held[path]
+            self._released.notify_all()
+
+    def snapshot(self, ref, transaction=None):
+        with self._lock:
+            if transaction is not None:
+                transaction._reads[ref.path] = self._versions.get(ref.path)
+            return StandInSnapshot(ref, self._docs.get(ref.path), self._update_times.get(ref.path))
+
+    def apply(self, writes, reads=None):
+        """Apply a write batch; with `reads` ({path: version}), abort if any of them changed."""
+        with self._lock:
+            self.rpcs += 1
+            if reads and any(self._versions.get(path) != version for path, version in reads.items()):
+                raise Aborted("Transaction contention: a document read in the transaction has changed")
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for op, path, data, merge in writes:
+                if op == "update" and path not in self._docs:
+                    raise KeyError(f"No document to update: {path}")
+                if op == "set" and not merge:
+                    self._docs[path] = copy.deepcopy(data)
+                else:
+                    self._docs.setdefault(path, {}).update(copy.deepcopy(data))
+                self._update_times[path] = now
+                self._versions[path] = next(self._counter)
+
+    def count_read(self):
+        with self._lock:
+            self.rpcs += 1
+
+
+class StandInSnapshot:
+    def __init__(self, reference, data, update_time):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = copy.deepcopy(data)
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self.exists else None
+
+
+class _Ref:
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+
+class _Batch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref.path, data, merge))
+
+    def update(self, ref, data):
+        self._writes.append(("update", ref.path, data, True))
+
+
+class _Transaction(_Batch):
+    """The state google.cloud.firestore's transactional decorators drive."""
+
+    _read_only = False
+    _max_attempts = 5
+    _ids = itertools.count(1)
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._id = None
+        self._reads = {}
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _clean_up(self):
+        if self._id is not None:
+            self._store.unlock(self._id)
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    def _start(self):
+        if self.in_progress:
+            raise ValueError("Transaction already begun")
+        self._id = next(self._ids)
+
+    def _finish(self):
+        if not self.in_progress:
+            raise ValueError("No transaction in progress")
+        try:
+            self._store.apply(self._writes, self._reads)
+        finally:
+            self._clean_up()
+
+
+# ---------------- SYNC CLIENT ----------------
+class StandInDocument(_Ref):
+    def get(self):
+        time.sleep(self._store.latency)
+        self._store.count_read()
+        return self._store.snapshot(self)
+
+    def set(self, data, merge=False):
+        time.sleep(self._store.latency)
+        self._store.apply([("set", self.path, data, merge)])
+
+    def update(self, data):
+        time.sleep(self._store.latency)
+        self._store.apply([("update", self.path, data, True)])
+
+
+class StandInBatch(_Batch):
+    def commit(self):
+        time.sleep(self._store.latency)
+        self._store.apply(self._writes)
+
+
+class StandInTransaction(_Transaction):
+    def _begin(self, retry_id=None):
+        time.sleep(self._store.latency)
+        self._start()
+
+    def _commit(self):
+        time.sleep(self._store.latency)
+        self._finish()
+
+    def _rollback(self):
+        time.sleep(self._store.latency)
+        self._clean_up()
+
+
+class StandInClient:
+    def __init__(self, store):
+        self._store = store
+
+    def document(self, path):
+        return StandInDocument(self._store, path)
+
+    def get_all(self, references, transaction=None):
+        time.sleep(self._store.latency)
+        if transaction is not None:
+            self._store.lock([ref.path for ref in references], transaction._id)
+        self._store.count_read()
+        return [self._store.snapshot(ref, transaction) for ref in references]
+
+    def batch(self):
+        return StandInBatch(self._store)
+
+    def transaction(self):
+        return StandInTransaction(self._store)
+
+
+# ---------------- ASYNC CLIENT ----------------
+class StandInAsyncDocument(_Ref):
+    async def get(self):
+        await asyncio.sleep(self._store.latency)
+        self._store.count_read()
+        return self._store.snapshot(self)
+
+    async def set(self, data, merge=False):
+        await asyncio.sleep(self._store.latency)
+        self._store.apply([("set", self.path, data, merge)])
+
+    async def update(self, data):
+        await asyncio.sleep(self._store.latency)
+        self._store.apply([("update", self.path, data, True)])
+
+
+class StandInAsyncBatch(_Batch):
+    async def commit(self):
+        await asyncio.sleep(self._store.latency)
+        self._store.apply(self._writes)
+
+
+class StandInAsyncTransaction(_Transaction):
+    async def _begin(self, retry_id=None):
+        await asyncio.sleep(self._store.latency)
+        self._start()
+
+    async def _commit(self):
+        await asyncio.sleep(self._store.latency)
+        self._finish()
+
+    async def _rollback(self):
+        await asyncio.sleep(self._store.latency)
+        self._clean_up()
+
+
+class StandInAsyncClient:
+    def __init__(self, store):
+        self._store = store
+
+    def document(self, path):
+        return StandInAsyncDocument(self._store, path)
+
+    async def get_all(self, references, transaction=None):
+        await asyncio.sleep(self._store.latency)
+        if transaction is not None:
+            await self._store.lock_async([ref.path for ref in references], transaction._id)
+        self._store.count_read()
+        for ref in references:
+            yield self._store.snapshot(ref, transaction)
+
+    def batch(self):
+        return StandInAsyncBatch(self._store)
+
+    def transaction(self):
+        return StandInAsyncTransaction(self._store)
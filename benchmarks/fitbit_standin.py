@@ -0,0 +1,191 @@
+"""
+Local HTTP stand-in for the Fitbit intraday heart-rate endpoints.
+
+Serves a deterministic synthetic heart rate for every second of any day,
+but only up to `server.now` (a settable virtual clock), for both URL forms:
+
+    /1/user/-/activities/heart/date/{today|YYYY-MM-DD}/1d/{1sec|1min}.json
+    /1/user/-/activities/heart/date/{day}/1d/{detail}/time/{HH:MM}/{HH:MM}.json
+
+Every request and the bytes sent are counted, so the whole-day and the
+incremental polling strategies can be compared over real HTTP. Like Fitbit,
+the stand-in allows `limit` requests per (virtual) clock hour, reports the
+quota in Fitbit-Rate-Limit-* headers and answers 429 with Retry-After once
+it is used up. A 429 can also be forced by setting `server.rate_limited`.
+
+UrllibSession is a requests-style session over urllib, so
+hardware.fitbit.IntradayHeartRate can be pointed at the stand-in without
+requests installed.
+"""
+import datetime
+import json
+import math
+import re
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PATH = re.compile(
+    r"^/1/user/[^/]+/activities/heart/date/(?P<day>today|\d{4}-\d{2}-\d{2})/1d/(?P<detail>1sec|1min)"
+    r"(?:/time/(?P<start>\d{2}:\d{2})/(?P<end>\d{2}:\d{2}))?\.json$"
+)
+
+
+def synthetic_bpm(ts):
+    """A smooth, deterministic heart rate for any datetime."""
+    seconds = ts.hour * 3600 + ts.minute * 60 + ts.second
+    return int(round(66 + 8 * math.sin(seconds / 3600.0) + 3 * math.sin(seconds / 97.0 + ts.toordinal())))
+
+
+class FitbitStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, now, limit=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.now = now
+        self.limit = limit         # requests per clock hour; None for no quota
+        self.rate_limited = None   # Retry-After seconds to answer every request with 429
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+        self._hour = None
+        self._used = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fitbit-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def charge(self):
+        """Count one request against this hour's quota; returns (headers, allowed)."""
+        if self.limit is None:
+            return [], True
+        with self._lock:
+            hour = self.now.replace(minute=0, second=0, microsecond=0)
+            if hour != self._hour:
+                self._hour, self._used = hour, 0
+            reset = int((hour + datetime.timedelta(hours=1) - self.now).total_seconds())
+            allowed = self._used < self.limit
+            if allowed:
+                self._used += 1
+            else:
+                self.throttled += 1
+            headers = [
+                ("Fitbit-Rate-Limit-Limit", str(self.limit)),
+                ("Fitbit-Rate-Limit-Remaining", str(self.limit - self._used)),
+                ("Fitbit-Rate-Limit-Reset", str(reset)),
+            ]
+        return headers, allowed
+
+    def dataset(self, day, detail, start, end):
+        step = 1 if detail == "1sec" else 60
+        first = datetime.datetime.combine(day, start)
+        last = min(datetime.datetime.combine(day, end).replace(second=59), self.now)
+        if first > last:
+            return []
+        out = []
+        ts = first
+        while ts <= last:
+            out.append({"time": f"{ts:%H:%M:%S}", "value": synthetic_bpm(ts)})
+            ts += datetime.timedelta(seconds=step)
+        return out
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, headers=()):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server._lock:
+            self.server.requests += 1
+            self.server.bytes_sent += len(data)
+
+    def do_GET(self):
+        server = self.server
+        if server.rate_limited is not None:
+            return self._reply(429, {"errors": [{"errorType": "request"}]},
+                               [("Retry-After", str(server.rate_limited))])
+        quota, allowed = server.charge()
+        if not allowed:
+            reset = quota[-1][1]
+            return self._reply(429, {"errors": [{"errorType": "request"}]}, quota + [("Retry-After", reset)])
+        m = _PATH.match(self.path)
+        if not m:
+            return self._reply(404, {"errors": [{"errorType": "not_found"}]}, quota)
+        day = server.now.date() if m["day"] == "today" else datetime.date.fromisoformat(m["day"])
+        start = datetime.time.fromisoformat(m["start"]) if m["start"] else datetime.time.min
+        end = datetime.time.fromisoformat(m["end"]) if m["end"] else datetime.time(23, 59)
+        dataset = server.dataset(day, m["detail"], start, end)
+        self._reply(200, {
+            "activities-heart": [{"dateTime": day.isoformat(), "value": {}}],
+            "activities-heart-intraday": {
+                "dataset": dataset,
+                "datasetInterval": 1,
+                "datasetType": "second" if m["detail"] == "1sec" else "minute",
+            },
+        }, quota)
+
+
+class _Response:
+    def __init__(self, status_code, headers, raw):
+        self.status_code = status_code
+        self.headers = headers
+        self._raw = raw
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self._raw.read()
+        return self._content
+
+    def iter_content(self, chunk_size=1):
+        if self._content is not None:
+            yield from (self._content[i:i + chunk_size] for i in range(0, len(self._content), chunk_size))
+            return
+        while True:
+            chunk = self._raw.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        self._raw.close()
+
+
+class UrllibSession:
+    def get(self, url, timeout=None, stream=False):
+        try:
+            resp = urllib.request.urlopen(url, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            resp = e
+        out = _Response(resp.status if hasattr(resp, "status") else resp.code, resp.headers, resp)
+        if not stream:
+            out.content
+            out.close()
+        return out
@@ -0,0 +1,198 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+
+class MissingSnapshot:
+    """
+    Stands in for a DocumentSnapshot of a document that does not exist. A
+    document listener delivers an empty snapshot list when the document is
+    missing or has been deleted, and the cache keeps this entry for it so the
+    absence is served from memory like any other state.
+    """
+
+    exists = False
+    create_time = None
+    update_time = None
+
+    def __init__(self, reference, read_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.read_time = read_time
+
+    def to_dict(self):
+        return None
+
+
+class DocumentCache:
+    """
+    In-process cache of Firestore documents.
+
+    A document is watched with an on_snapshot listener from the first time it
+    is read, so the cached snapshot is replaced as soon as Firestore pushes a
+    change. Reads are served from memory while the path's listener is
+    connected; otherwise get_cached() returns None, the caller falls back to
+    a direct read and the listener is (re-)subscribed. At most `max_watched`
+    documents are watched; the least recently read one that is not pinned is
+    unsubscribed to make room. Pinned documents (those with an open push
+    stream) are never evicted, so the watch count can exceed `max_watched` by
+    the number of pinned paths.
+    """
+
+    def __init__(self, client, paths=(), max_watched=3000, resubscribe_interval=5.0):
+        self._client = client
+        self._initial_paths = list(paths)
+        self._max_watched = max_watched
+        self._resubscribe_interval = resubscribe_interval
+        self._lock = threading.Lock()
+        self._snapshots = {}         # path -> latest DocumentSnapshot from the listener
+        self._watches = OrderedDict()  # path -> Watch handle, least recently read first
+        self._last_subscribe = {}    # path -> monotonic time of the last subscribe attempt
+        self._pins = {}              # path -> number of open pins, exempt from eviction
+        self._running = False
+        self._change_callbacks = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add_change_callback(self, callback):
+        """Register callback(path, snapshot), called from the listener thread on every change."""
+        self._change_callbacks.append(callback)
+
+    def start(self):
+        self._running = True
+        for path in self._initial_paths:
+            self._subscribe(path)
+
+    def pin(self, path):
+        """Keep `path` watched until a matching unpin(), regardless of how long ago it was read."""
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+        self.watch(path)
+
+    def unpin(self, path):
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            watches = list(self._watches.values())
+            self._watches.clear()
+            self._snapshots.clear()
+        for watch in watches:
+            self._unsubscribe(watch)
+
+    def _unsubscribe(self, watch):
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            print(f"[WARN] Failed to unsubscribe listener: {e}")
+
+    def _subscribe(self, path):
+        with self._lock:
+            self._last_subscribe[path] = time.monotonic()
+            # Register the path before the listener exists so its first snapshot is kept.
+            old = self._watches.pop(path, None)
+            self._watches[path] = None
+        if old is not None:
+            self._unsubscribe(old)
+
+        try:
+            watch = self._client.document(path).on_snapshot(self._make_callback(path))
+        except Exception as e:
+            print(f"[WARN] Snapshot listener for {path} failed to start: {e}")
+            with self._lock:
+                self._watches.pop(path, None)
+            return
+
+        evicted = []
+        with self._lock:
+            self._watches[path] = watch
+            excess = max(len(self._watches) - self._max_watched, 0)
+            unpinned = (p for p in self._watches if p not in self._pins and p != path)
+            victims = list(itertools.islice(unpinned, excess))
+            for lru_path in victims:
+                lru_watch = self._watches.pop(lru_path)
+                self._snapshots.pop(lru_path, None)
+                self._last_subscribe.pop(lru_path, None)
+                evicted.append(lru_watch)
+                self.evictions += 1
+        for lru_watch in evicted:
+            if lru_watch is not None:
+                self._unsubscribe(lru_watch)
+
+    def _make_callback(self, path):
+        def _on_snapshot(snapshots, changes, read_time):
+            # An empty list means the document does not exist (never created or deleted).
+            snapshot = snapshots[-1] if snapshots else MissingSnapshot(self._client.document(path), read_time)
+            with self._lock:
+                if path not in self._watches:
+                    return  # evicted while the snapshot was in flight
+                self._snapshots[path] = snapshot
+            for callback in self._change_callbacks:
+                try:
+                    callback(path, snapshot)
+                except Exception as e:
+                    print(f"[WARN] Change callback failed for {path}: {e}")
+        return _on_snapshot
+
+    def _is_connected(self, path):
+        watch = self._watches.get(path)
+        if watch is None:
+            return False
+        # Watch.is_active turns False once the underlying stream has closed.
+        return getattr(watch, "is_active", True)
+
+    def watch(self, path):
+        """Start watching `path` if it is not watched yet, without counting a read."""
+        self.get_cached(path, count=False)
+
+    def get_cached(self, path, count=True):
+        """
+        Return the in-memory DocumentSnapshot for `path` (a MissingSnapshot when
+        the document does not exist) when its listener is connected and has
+        delivered at least one snapshot, otherwise None
+        (counted as a miss, and the listener is started or re-subscribed).
+        """
+        with self._lock:
+            if path in self._watches:
+                self._watches.move_to_end(path)
+            snapshot = self._snapshots.get(path)
+            connected = self._is_connected(path)
+            if snapshot is not None and connected:
+                if count:
+                    self.hits += 1
+                return snapshot
+            if count:
+                self.misses += 1
+            if not connected:
+                self._snapshots.pop(path, None)
+            now = time.monotonic()
+            due = now - self._last_subscribe.get(path, float("-inf")) >= self._resubscribe_interval
+            resubscribe = not connected and self._running and due
+            if resubscribe:
+                # Claimed under the lock, so concurrent misses subscribe only once.
+                self._last_subscribe[path] = now
+
+        if resubscribe:
+            self._subscribe(path)
+        return None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else None,
+                "evictions": self.evictions,
+                "watched": len(self._watches),
+                "pinned": len(self._pins),
+                "disconnected": sum(1 for path in self._watches if not self._is_connected(path)),
+            }
@@ -0,0 +1,35 @@
+import os
+import re
+
+# Firestore document layout: every household has its own state and device docs
+#   households/{household_id}/state/update
+#   households/{household_id}/devices/{device}
+# Requests without a household id use DEFAULT_HOUSEHOLD_ID
+# (see migrate_households.py for moving the old global documents).
+DEFAULT_HOUSEHOLD_ID = os.getenv("DEFAULT_HOUSEHOLD_ID", "default")
+DEVICES = ("lights", "curtain")
+
+HOUSEHOLD_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+DOC_PATH_RE = re.compile(r"^households/(?P<household>[^/]+)/(?:state/update|devices/(?P<device>[^/]+))$")
+
+
+def state_doc(household_id):
+    return f"households/{household_id}/state/update"
+
+
+def device_doc(household_id, device):
+    return f"households/{household_id}/devices/{device}"
+
+
+def household_docs(household_id):
+    """State doc followed by every device doc of the household."""
+    return [state_doc(household_id), *(device_doc(household_id, d) for d in DEVICES)]
+
+
+def path_template(path):
+    """`path` with the household id replaced by a placeholder, for low-cardinality metric labels."""
+    match = DOC_PATH_RE.match(path)
+    if match is None:
+        return "other"
+    device = match.group("device")
+    return device_doc("{household}", device) if device is not None else state_doc("{household}")
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+
+class Subscription:
+    """
+    One push-channel connection. Events wait in a bounded queue; when the
+    consumer falls behind and the queue is full, the oldest event is dropped so
+    a slow client never blocks the broker or grows memory. Every event carries
+    the full current document, so the newest one is always enough to resync.
+    """
+
+    def __init__(self, max_queue):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBroker:
+    """
+    Fans change events out to the subscribers of a topic (a household id).
+    Events are published from the Firestore listener thread and handed to the
+    event loop, so subscriber queues are only ever touched from the loop.
+    """
+
+    def __init__(self, max_queue=32):
+        self._max_queue = max_queue
+        self._subscribers = {}  # topic -> set of Subscription
+        self._loop = None
+        self.published = 0
+
+    def bind(self, loop):
+        self._loop = loop
+
+    def unbind(self):
+        self._loop = None
+
+    def publish_threadsafe(self, topic, event):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._publish, topic, event)
+
+    def _publish(self, topic, event):
+        self.published += 1
+        for sub in self._subscribers.get(topic, ()):
+            sub.offer(event)
+
+    def subscribe(self, topic):
+        sub = Subscription(self._max_queue)
+        self._subscribers.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, topic, sub):
+        subs = self._subscribers.get(topic)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[topic]
+
+    def stats(self):
+        subs = [sub for topic_subs in self._subscribers.values() for sub in topic_subs]
+        return {
+            "topics": len(self._subscribers),
+            "subscribers": len(subs),
+            "published": self.published,
+            "dropped": sum(sub.dropped for sub in subs),
+        }
+
+
+def format_sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
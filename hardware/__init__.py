@@ -0,0 +1,2 @@
+"""Pi-side sleep automation: hardware.controller.Controller drives GPIO, detector and API client."""
+from hardware.controller import Controller
@@ -0,0 +1,189 @@
+"""
+Non-blocking actuator executor for the lamp and the curtain servo.
+
+Callers enqueue commands and return immediately; one executor thread
+applies them. A curtain motion is a list of (duty cycle, seconds) steps
+that the thread advances between commands instead of sleeping through, so
+a lamp switch is applied even while the curtain is moving, and a newer
+curtain command supersedes the motion in flight as soon as it arrives.
+
+Commands that would not change anything are dropped when they are
+submitted: switching the lamp to the state it is already in (or is queued
+to be in), or asking for the curtain motion that was last requested.
+
+Without start(), nothing runs in the background: a simulation calls pump()
+to apply what is queued at the current (virtual) clock time, and advances
+the clock to next_deadline() to finish the motion in flight.
+"""
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class _Motion:
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = list(steps)   # [(duty, seconds)], applied in order
+        self.index = 0
+        self.step_ends = None      # monotonic time the current step ends
+
+
+class ActuatorExecutor:
+    def __init__(self, gpio, lamp_pin, servo, idle_duty=0, clock=time.monotonic, verbose=True):
+        self._gpio = gpio
+        self._lamp_pin = lamp_pin
+        self._servo = servo
+        self._idle_duty = idle_duty    # duty cycle left on the servo when the executor stops
+        self._clock = clock
+        self._verbose = verbose        # report superseded motions
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+        self._motion = None
+        # Desired state, including commands still queued; used to drop redundant ones.
+        self._lamp_target = None
+        self._curtain_target = None
+        self.executed = 0
+        self.dropped = 0
+        self.superseded = 0
+
+    # ---------- submitting (any thread) ----------
+    def lamp(self, on):
+        """Queue a lamp switch. Returns False if it was dropped as redundant."""
+        on = bool(on)
+        with self._lock:
+            if self._lamp_target == on:
+                self.dropped += 1
+                return False
+            self._lamp_target = on
+            self._idle.clear()
+            self._queue.put(("lamp", on))
+        return True
+
+    def move_curtain(self, name, steps):
+        """
+        Queue a curtain motion (e.g. "open" or "close") given as (duty, seconds)
+        steps. It supersedes any motion in flight. Returns False if the same
+        motion was already the last one requested.
+        """
+        with self._lock:
+            if self._curtain_target == name:
+                self.dropped += 1
+                return False
+            self._curtain_target = name
+            self._idle.clear()
+            self._queue.put(("curtain", _Motion(name, steps)))
+        return True
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="actuators", daemon=True)
+            self._thread.start()
+
+    def wait_idle(self, timeout=None):
+        """Block until every queued command and motion has finished."""
+        return self._idle.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        """Stop the executor; a motion still in flight is cut short and the servo set to idle_duty."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def pump(self):
+        """Apply every queued command and every motion step that is due, without blocking."""
+        if self._idle.is_set():
+            return
+        while True:
+            try:
+                command = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if command is not _STOP:
+                self._apply(command)
+        self._advance_motion()
+        with self._lock:
+            if self._motion is None and self._queue.empty():
+                self._idle.set()
+
+    def next_deadline(self):
+        """Clock time the current motion step ends, or None when no motion is in flight."""
+        return self._motion.step_ends if self._motion is not None else None
+
+    def stats(self):
+        return {"executed": self.executed, "dropped": self.dropped, "superseded": self.superseded}
+
+    # ---------- executor thread ----------
+    def _set_duty(self, duty):
+        try:
+            self._servo.ChangeDutyCycle(duty)
+        except Exception as e:
+            print(f"[WARN] Servo control failed: {e}")
+
+    def _start_step(self, at=None):
+        duty, seconds = self._motion.steps[self._motion.index]
+        self._set_duty(duty)
+        self._motion.step_ends = (self._clock() if at is None else at) + seconds
+
+    def _advance_motion(self):
+        """Move past every step whose time is up; finish the motion after its last step."""
+        motion = self._motion
+        while motion is not None and self._clock() >= motion.step_ends:
+            motion.index += 1
+            if motion.index == len(motion.steps):
+                self._motion = None
+                self.executed += 1
+                return
+            # The next step starts when this one was due, however late we got here.
+            self._start_step(at=motion.step_ends)
+
+    def _apply(self, command):
+        kind, arg = command
+        if kind == "lamp":
+            try:
+                self._gpio.output(self._lamp_pin, self._gpio.HIGH if arg else self._gpio.LOW)
+            except Exception as e:
+                print(f"[WARN] Lamp control failed: {e}")
+            self.executed += 1
+        else:
+            if self._motion is not None:
+                if self._verbose:
+                    print(f"[HW] Curtain motion '{self._motion.name}' superseded by '{arg.name}'")
+                self.superseded += 1
+            self._motion = arg
+            if not arg.steps:
+                self._motion = None
+                self.executed += 1
+                return
+            self._start_step()
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self._motion is not None:
+                timeout = max(0.0, self._motion.step_ends - self._clock())
+            try:
+                command = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+
+            if command is _STOP:
+                if self._motion is not None:
+                    self._motion = None
+                    self._set_duty(self._idle_duty)
+                self._idle.set()
+                return
+            if command is not None:
+                self._apply(command)
+            self._advance_motion()
+
+            with self._lock:
+                if self._motion is None and self._queue.empty():
+                    self._idle.set()
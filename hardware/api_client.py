@@ -0,0 +1,204 @@
+"""
+Keep-alive HTTP client for talking to the API server from the Pi.
+
+One ApiClient holds a pooled session (requests when installed, otherwise a
+persistent http.client connection), so events after the first reuse an open
+TCP/TLS connection instead of paying the handshake again. Every call has an
+overall deadline covering all of its attempts; connection errors, timeouts
+and 429/502/503/504 answers are retried with full-jitter exponential backoff
+until the attempts or the deadline run out. GET answers that carry an ETag
+are remembered, and the next GET of the same URL is sent conditionally, so
+an unchanged /device/settings costs a 304 with no body.
+
+POSTs are retried too: the calls the Pi makes (/update-sleep,
+/device/update-setting) set absolute values, so repeating one is harmless.
+"""
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except Exception:
+    requests = None
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class ApiError(Exception):
+    """The server could not be reached in time, or answered with an error."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status, retry_after):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _retry_after_seconds(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class _RequestsTransport:
+    def __init__(self, pool_size):
+        self._session = requests.Session()
+        # Retries are done by ApiClient, which knows the remaining deadline.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self.errors = (requests.RequestException,)
+
+    def send(self, method, url, body, headers, timeout):
+        r = self._session.request(method, url, data=body, headers=headers, timeout=(min(timeout, 3.0), timeout))
+        return r.status_code, r.headers, r.content
+
+    def close(self):
+        self._session.close()
+
+
+class _StdlibTransport:
+    """One persistent connection per (scheme, host), reopened after any failure."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conns = {}
+        self.errors = (OSError, http.client.HTTPException)
+
+    def send(self, method, url, body, headers, timeout):
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        with self._lock:
+            try:
+                return self._send(key, parts.scheme, method, target, body, headers, timeout)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed the idle keep-alive connection: reconnect once right away.
+                return self._send(key, parts.scheme, method, target, body, headers, timeout)
+
+    def _send(self, key, scheme, method, target, body, headers, timeout):
+        conn = self._conns.get(key)
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = cls(key[1], timeout=timeout)
+            self._conns[key] = conn
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        try:
+            conn.request(method, target, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except Exception:
+            conn.close()
+            self._conns.pop(key, None)
+            raise
+        if resp.will_close:
+            conn.close()
+            self._conns.pop(key, None)
+        return resp.status, resp.headers, data
+
+    def close(self):
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+
+
+class ApiClient:
+    def __init__(self, base_url, household=None, deadline=5.0, attempts=3,
+                 backoff=0.25, max_backoff=2.0, pool_size=4):
+        self.base_url = base_url.strip().rstrip("/")
+        self.household = household or None
+        self.deadline = deadline        # seconds per call, across all attempts
+        self.attempts = attempts
+        self.backoff = backoff          # first backoff ceiling; doubles per retry
+        self.max_backoff = max_backoff
+        self._transport = _RequestsTransport(pool_size) if requests else _StdlibTransport()
+        self._etags = {}                # url -> (etag, parsed body)
+        self.retries = 0
+
+    def _url(self, path):
+        url = f"{self.base_url}{path}"
+        if self.household:
+            url += ("&" if "?" in path else "?") + urllib.parse.urlencode({"household": self.household})
+        return url
+
+    def request(self, method, path, payload=None, deadline=None):
+        """
+        Send one request and return its parsed JSON body (None for an empty
+        body). Raises ApiError once the attempts or the deadline are used up,
+        or straight away for a non-retryable error status or a body that is
+        not JSON.
+        """
+        url = self._url(path)
+        give_up_at = time.monotonic() + (deadline if deadline is not None else self.deadline)
+        headers = {"Accept": "application/json"}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        cached = self._etags.get(url) if method == "GET" else None
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+
+        last_error = None
+        for attempt in range(self.attempts):
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                status, resp_headers, data = self._transport.send(method, url, body, headers, remaining)
+                if status in RETRY_STATUSES:
+                    raise _RetryableStatus(status, _retry_after_seconds(resp_headers.get("Retry-After")))
+            except (_RetryableStatus, *self._transport.errors) as e:
+                last_error = e
+                if attempt + 1 == self.attempts:
+                    break
+                # Full jitter: spreads the retries of many Pis after a server blip.
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+                if isinstance(e, _RetryableStatus) and e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if time.monotonic() + delay >= give_up_at:
+                    break
+                self.retries += 1
+                time.sleep(delay)
+                continue
+
+            if status == 304 and cached is not None:
+                return cached[1]
+            if status >= 400:
+                raise ApiError(f"{method} {url} -> HTTP {status}: {data[:200]!r}", status=status)
+            try:
+                result = json.loads(data) if data else None
+            except ValueError as e:
+                # e.g. a captive portal's HTML login page answered in the server's place
+                raise ApiError(f"{method} {url} -> HTTP {status}: body is not JSON ({e}): {data[:200]!r}",
+                               status=status)
+            etag = resp_headers.get("ETag")
+            if method == "GET" and etag:
+                self._etags[url] = (etag, result)
+            return result
+
+        status = getattr(last_error, "status", None)
+        raise ApiError(f"{method} {url} failed: {last_error or 'deadline exceeded'}", status=status)
+
+    def get_json(self, path, deadline=None):
+        return self.request("GET", path, deadline=deadline)
+
+    def post_json(self, path, payload, deadline=None):
+        return self.request("POST", path, payload, deadline=deadline)
+
+    def close(self):
+        self._transport.close()
@@ -0,0 +1,306 @@
+"""
+The Pi-side sleep automation as one importable object.
+
+Importing this module touches no hardware, starts no thread and opens no
+file. A Controller is configured by parameters (pins, detector, API
+client, journal path); start() sets up GPIO, the servo PWM, the actuator
+executor and the journal flusher, and run(source) feeds heart-rate samples
+from any iterable of (bpm, "HH:MM") pairs through the detector until the
+source is exhausted or stop() is called. The same code therefore runs on
+the device, in tests (with the mock GPIO and an in-memory journal) and
+under a profiler. With background=False no thread is started and the
+caller drives the actuators on a virtual clock (see hardware.simulation).
+
+Sleep and wake events actuate from the last device settings fetched from
+the server, never from a request made at that moment: a background thread
+refreshes them every `settings_interval` seconds and right after each event,
+so an offline or slow server delays a settings change, not the lamp.
+
+    with Controller(server_url="http://127.0.0.1:8000") as controller:
+        controller.run(paced(DEMO_SAMPLES, interval=1.0))
+"""
+import random
+import threading
+import time
+
+try:
+    from actuators import ActuatorExecutor  # run as a script from hardware/
+    from api_client import ApiClient, ApiError
+    from detector import SLEEP_DETECTED, WAKE_DETECTED, SleepDetector
+    from journal import EventJournal, JournalFlusher
+except ImportError:
+    from hardware.actuators import ActuatorExecutor
+    from hardware.api_client import ApiClient, ApiError
+    from hardware.detector import SLEEP_DETECTED, WAKE_DETECTED, SleepDetector
+    from hardware.journal import EventJournal, JournalFlusher
+
+# The recorded night the hardware scripts have always simulated.
+DEMO_SAMPLES = list(zip(
+    [70, 67, 66, 64, 63, 62, 60, 59, 60, 58, 57, 62, 66, 69, 72, 75, 78],
+    ["19:50", "20:10", "20:30", "21:00", "21:30", "22:00", "22:30", "23:00", "23:30",
+     "00:30", "02:00", "06:00", "07:30", "08:30", "09:30", "10:30", "11:30"],
+))
+
+# Every device's full configuration in one GET; ApiClient revalidates it with
+# its ETag, so an unchanged refresh is a bodyless 304.
+SETTINGS_ENDPOINT = "/device/settings"
+
+# Continuous-rotation servo: 2.5 = full speed clockwise, 7.5 = stop,
+# 12.5 = full speed counter-clockwise. Move for 3 s, stop, release the PWM.
+DEFAULT_CURTAIN_STEPS = {
+    "close": [(2.5, 3), (7.5, 0.2), (0, 0)],
+    "open": [(12.5, 3), (7.5, 0.2), (0, 0)],
+}
+
+
+class _DummyPWM:
+    def __init__(self, pin, freq): pass
+    def start(self, d): pass
+    def ChangeDutyCycle(self, d): pass
+    def stop(self): pass
+
+
+class _MockGPIO:
+    BCM = "BCM"; OUT = "OUT"; LOW = 0; HIGH = 1
+    def setmode(self, m): print("[MOCK GPIO] setmode", m)
+    def setwarnings(self, f): pass
+    def setup(self, p, m): print(f"[MOCK GPIO] setup {p} {m}")
+    def output(self, p, v): print(f"[MOCK GPIO] output {p} -> {v}")
+    def PWM(self, p, f): return _DummyPWM(p, f)
+    def cleanup(self): print("[MOCK GPIO] cleanup")
+
+
+def load_gpio():
+    """RPi.GPIO on the Pi, the repo mock (/RPi/GPIO.py) elsewhere, else a print-only stand-in."""
+    try:
+        import RPi.GPIO as GPIO
+        return GPIO
+    except Exception:
+        pass
+    try:
+        from RPi import GPIO
+        return GPIO
+    except Exception:
+        return _MockGPIO()
+
+
+def paced(samples, interval, sleep=time.sleep):
+    """Yield `samples` one at a time, `interval` seconds apart (a replayed recording)."""
+    for i, sample in enumerate(samples):
+        if i and interval:
+            sleep(interval)
+        yield sample
+
+
+class Controller:
+    def __init__(self, gpio=None, lamp_pin=17, servo_pin=18, resting_hr=65, detector=None,
+                 api=None, server_url="http://127.0.0.1:8000", household=None,
+                 journal_path="smartwatch_journal.db", curtain_steps=None, idle_duty=0,
+                 clock=time.monotonic, wall_clock=time.time, background=True, verbose=True,
+                 settings_interval=300.0):
+        self.gpio = gpio
+        self.lamp_pin = lamp_pin
+        self.servo_pin = servo_pin
+        # A detector without a lamp callback gets this controller's lamp.
+        self.detector = detector if detector is not None else SleepDetector(resting_hr)
+        if getattr(self.detector, "on_lamp_lock", None) is None:
+            self.detector.on_lamp_lock = self.turn_off_lamp
+        self.api = api
+        self.server_url = server_url
+        self.household = household
+        self.journal_path = journal_path
+        self.curtain_steps = dict(curtain_steps or DEFAULT_CURTAIN_STEPS)
+        self.idle_duty = idle_duty
+        self.clock = clock              # drives the servo step timing
+        self.wall_clock = wall_clock    # timestamps journaled sleep/wake events
+        self.background = background    # False: no threads; the caller pumps the actuators
+        self.verbose = verbose          # print samples and actions (warnings are always printed)
+        self.servo = None
+        self.actuators = None
+        self.journal = None
+        self.flusher = None
+        self._owns_api = False
+        self._stopping = threading.Event()
+        self.samples = 0
+        self.settings_interval = settings_interval
+        self.settings = None            # last /device/settings body: {device: config or None}
+        self._settings_thread = None
+        self._settings_wake = threading.Event()
+        self._settings_stop = threading.Event()
+
+    # ---------- lifecycle ----------
+    def start(self):
+        """Set up GPIO, the servo PWM and the background threads; a second call is a no-op."""
+        if self.actuators is not None:
+            return self
+        if self.gpio is None:
+            self.gpio = load_gpio()
+        gpio = self.gpio
+        gpio.setmode(gpio.BCM)
+        gpio.setwarnings(False)
+        gpio.setup(self.lamp_pin, gpio.OUT)
+        gpio.setup(self.servo_pin, gpio.OUT)
+        self.servo = gpio.PWM(self.servo_pin, 50)
+        self.servo.start(0)
+
+        if self.api is None:
+            self.api = ApiClient(self.server_url, household=self.household)
+            self._owns_api = True
+        self.journal = EventJournal(self.journal_path)
+        self.flusher = JournalFlusher(self.journal, self.api, clock=self.wall_clock)
+        self.actuators = ActuatorExecutor(gpio, self.lamp_pin, self.servo, idle_duty=self.idle_duty,
+                                        clock=self.clock, verbose=self.verbose)
+        if self.background:
+            self.flusher.start()
+            self.actuators.start()
+            self._settings_stop.clear()
+            self._settings_thread = threading.Thread(target=self._settings_loop, name="settings-refresh",
+                                                     daemon=True)
+            self._settings_thread.start()
+        else:
+            self.refresh_settings()
+        return self
+
+    def stop(self):
+        """Make run() return after the sample it is processing; safe from any thread."""
+        self._stopping.set()
+
+    def close(self, timeout=10.0):
+        """Let queued actuator commands finish, flush the journal and release the GPIO."""
+        if self.actuators is None:
+            return
+        if self.background:
+            self.actuators.wait_idle(timeout=timeout)
+            self.actuators.stop()
+            self.flusher.stop()
+            self._settings_stop.set()
+            self._settings_wake.set()
+            self._settings_thread.join(timeout)
+            self._settings_thread = None
+        else:
+            try:
+                self.flusher.flush_once()
+            except ApiError as e:
+                print(f"[WARN] {self.journal.count()} journaled events not sent: {e}")
+        self.journal.close()
+        if self._owns_api:
+            self.api.close()
+            self.api = None
+            self._owns_api = False
+        self.gpio.cleanup()
+        self.actuators = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- event loop ----------
+    def run(self, source):
+        """
+        Process (bpm, "HH:MM") samples from `source` until it is exhausted or
+        stop() is called. Returns the [(time, event)] sleep/wake transitions seen.
+        """
+        self.start()
+        self._stopping.clear()
+        events = []
+        for hr, current_time in source:
+            if self._stopping.is_set():
+                break
+            self._log(f"[Time: {current_time}] HR: {hr}")
+            status = self.process_sample(hr, current_time)
+            if status is not None:
+                events.append((current_time, status))
+        return events
+
+    def process_sample(self, hr, current_time):
+        self.samples += 1
+        status = self.detector.process_heart_rate(hr, current_time)
+        if status == SLEEP_DETECTED:
+            self.handle_sleep_event()
+        elif status == WAKE_DETECTED:
+            self.handle_wake_event()
+        return status
+
+    # ---------- actions ----------
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def turn_off_lamp(self):
+        if self.actuators.lamp(False):
+            self._log("[HW] Lamp -> OFF")
+
+    def turn_on_lamp(self):
+        if self.actuators.lamp(True):
+            self._log("[HW] Lamp -> ON")
+
+    def move_curtain(self, action):
+        """Run the configured servo steps for "open" or "close"; a newer move cuts this one short."""
+        if self.actuators.move_curtain(action, self.curtain_steps[action]):
+            self._log(f"[HW] Curtain -> {action.upper()}")
+
+    # ---------- settings ----------
+    def refresh_settings(self):
+        """Fetch the device settings, keeping the last known ones if that fails; returns False on failure."""
+        try:
+            cfg = self.api.get_json(SETTINGS_ENDPOINT)
+        except Exception as e:  # not only ApiError: nothing may end the refresh thread
+            print(f"[WARN] Keeping cached device settings: {e!r}")
+            return False
+        if cfg:
+            self.settings = cfg
+        return True
+
+    def _settings_loop(self):
+        # After a failure, retry with jittered exponential backoff (capped at
+        # settings_interval) like the journal flusher.
+        failures = 0
+        while not self._settings_stop.is_set():
+            self._settings_wake.clear()
+            if self.refresh_settings():
+                failures = 0
+                delay = self.settings_interval
+            else:
+                failures += 1
+                delay = random.uniform(0, min(self.settings_interval, 2.0 * (2 ** failures)))
+            self._settings_wake.wait(delay)
+
+    def _refresh_settings_soon(self):
+        """Pick up any settings change made around an event before the next one."""
+        if self.background:
+            self._settings_wake.set()
+        else:
+            self.refresh_settings()  # the caller's api is local (see hardware.simulation)
+
+    def _cached_setting(self, device, field):
+        """`field` ("sleepingStatus" / "notSleepingStatus") of `device` from the cached settings."""
+        return ((self.settings or {}).get(device) or {}).get(field)
+
+    def _have_settings(self):
+        if self.settings is None:
+            print("[WARN] No device settings received yet; not actuating")
+        return self.settings is not None
+
+    def handle_sleep_event(self):
+        self._log("[HW] Sleep detected → Notifying server...")
+        self.flusher.record_sleep(True)
+
+        if self._have_settings():
+            if self._cached_setting("lights", "sleepingStatus") is True:
+                self.turn_off_lamp()
+            if self._cached_setting("curtain", "sleepingStatus") is True:
+                self.move_curtain("close")
+        self._refresh_settings_soon()
+
+    def handle_wake_event(self):
+        self._log("[HW] Wake detected → Notifying server...")
+        self.flusher.record_sleep(False)
+
+        if self._have_settings():
+            if self._cached_setting("lights", "notSleepingStatus") is True:
+                self.turn_on_lamp()
+            if self._cached_setting("curtain", "notSleepingStatus") is True:
+                self.move_curtain("open")
+        self._refresh_settings_soon()
@@ -0,0 +1,62 @@
+"""
+Side-effect free copy of the SleepDetector rules from hardware.py, so the
+same detection logic can run anywhere (server, tests, replays) without
+touching GPIO. Lamp locking is reported through an optional callback
+instead of switching the lamp directly.
+"""
+
+SLEEP_DETECTED = "SLEEP_DETECTED"
+WAKE_DETECTED = "WAKE_DETECTED"
+
+
+class SleepDetector:
+    def __init__(self, resting_hr, sleep_threshold=5, required_minutes=3, on_lamp_lock=None):
+        self.resting_hr = resting_hr
+        self.sleep_threshold = sleep_threshold
+        self.required_minutes = required_minutes
+        self.on_lamp_lock = on_lamp_lock
+        self.sleep_counter = 0
+        self.is_sleeping = False
+        self.lamps_locked = False
+
+    def time_to_int(self, t):
+        """'HH:MM' -> HHMM int; an int is taken as HHMM already."""
+        if isinstance(t, int):
+            return t
+        return int(t.replace(":", ""))
+
+    def is_between(self, current, start, end):
+        curr = self.time_to_int(current)
+        s = self.time_to_int(start)
+        e = self.time_to_int(end)
+        if s <= e:
+            return s <= curr <= e
+        else:
+            return curr >= s or curr <= e
+
+    def process_heart_rate(self, hr, current_time):
+        current_time = self.time_to_int(current_time)
+
+        if hr < self.resting_hr and self.is_between(current_time, 2000, 400):
+            if not self.lamps_locked:
+                self.lamps_locked = True
+                if self.on_lamp_lock is not None:
+                    self.on_lamp_lock()
+
+        if self.lamps_locked and self.is_between(current_time, 1200, 1959):
+            self.lamps_locked = False
+
+        if hr <= self.resting_hr - self.sleep_threshold:
+            self.sleep_counter += 1
+            if self.sleep_counter >= self.required_minutes and not self.is_sleeping:
+                self.is_sleeping = True
+                return SLEEP_DETECTED
+        else:
+            if self.is_sleeping and hr > self.resting_hr and self.is_between(current_time, 401, 2359):
+                self.is_sleeping = False
+                self.sleep_counter = 0
+                return WAKE_DETECTED
+
+            self.sleep_counter = 0
+
+        return None
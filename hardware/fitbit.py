@@ -0,0 +1,247 @@
+"""
+Incremental Fitbit intraday heart-rate fetching.
+
+Instead of downloading the whole day (`.../date/today/1d/1sec.json`, up to
+86,400 points) on every poll to read its last sample, IntradayHeartRate
+keeps a cursor at the newest sample it has returned and asks only for the
+time range since then:
+
+    /1/user/{user}/activities/heart/date/{day}/1d/{detail}/time/{HH:MM}/{HH:MM}.json
+
+The range has minute resolution, so the cursor's own minute is fetched
+again and samples at or before the cursor are dropped. When a poll spans
+midnight, the rest of the previous day is fetched first. Responses are
+streamed through hardware.intraday.parse_dataset, so samples come back as a
+compact HeartRateSeries rather than a list of dicts.
+
+`session` is anything with a requests-style get(url, timeout=..., stream=True)
+returning a response with iter_content(): the
+OAuth2Session on the Pi, or a plain session pointed at a local stand-in via
+`base_url` (see benchmarks/fitbit_standin.py).
+
+PollScheduler drives the fetcher in a loop within the hourly request quota.
+A RequestBudget token bucket is refilled at the rate the Fitbit-Rate-Limit-*
+response headers say is left for the current hour, so the quota is spread
+evenly instead of running out before the hour resets. The wanted polling
+interval depends on the time of day: short in the evening sleep window,
+long mid-day. A 429 blocks polling for its Retry-After.
+"""
+import datetime
+import time
+
+try:
+    from intraday import HeartRateSeries, parse_dataset  # run as a script from hardware/
+except ImportError:
+    from hardware.intraday import HeartRateSeries, parse_dataset
+
+API_BASE = "https://api.fitbit.com"
+CHUNK_SIZE = 64 * 1024
+
+
+class FitbitError(Exception):
+    """Fitbit answered with an error status; retry_after is set from a 429's Retry-After."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _retry_after_seconds(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class IntradayHeartRate:
+    def __init__(self, session, user_id="-", detail="1sec", base_url=API_BASE,
+                 lookback=datetime.timedelta(minutes=5), timeout=10.0, clock=datetime.datetime.now,
+                 budget=None):
+        self.session = session
+        self.user_id = user_id or "-"
+        self.detail = detail            # "1sec" or "1min"
+        self.base_url = base_url.rstrip("/")
+        self.lookback = lookback        # how far back the first poll reaches
+        self.timeout = timeout
+        self.clock = clock              # local time of the Fitbit account
+        self.cursor = None              # datetime of the newest sample returned
+        self.budget = budget            # RequestBudget charged for every request, or None
+        self.requests = 0
+        self.bytes = 0
+
+    def _url(self, day, start, end):
+        return (f"{self.base_url}/1/user/{self.user_id}/activities/heart/date/{day.isoformat()}"
+                f"/1d/{self.detail}/time/{start:%H:%M}/{end:%H:%M}.json")
+
+    def _counted(self, chunks):
+        for chunk in chunks:
+            self.bytes += len(chunk)
+            yield chunk
+
+    def _fetch_range(self, day, start, end):
+        """HeartRateSeries of `day` between the minutes of `start` and `end`, inclusive."""
+        if self.budget is not None:
+            self.budget.spend()
+        resp = self.session.get(self._url(day, start, end), timeout=self.timeout, stream=True)
+        self.requests += 1
+        if self.budget is not None:
+            self.budget.observe(resp.headers)
+        try:
+            if resp.status_code == 429:
+                raise FitbitError("Fitbit rate limit exceeded", status=429,
+                                  retry_after=_retry_after_seconds(resp.headers.get("Retry-After")))
+            if resp.status_code != 200:
+                raise FitbitError(f"Fitbit intraday request failed: HTTP {resp.status_code}", status=resp.status_code)
+            return parse_dataset(self._counted(resp.iter_content(CHUNK_SIZE)), day)
+        finally:
+            resp.close()
+
+    def fetch_new(self):
+        """
+        Samples newer than the cursor, oldest first, as a HeartRateSeries;
+        advances the cursor past them. Raises FitbitError, leaving the cursor
+        where it was, if Fitbit answers with an error.
+        """
+        now = self.clock()
+        cursor = self.cursor if self.cursor is not None else now - self.lookback
+        parts = []
+        day = cursor.date()
+        while True:
+            start = cursor if day == cursor.date() else datetime.datetime.combine(day, datetime.time.min)
+            end = now if day == now.date() else datetime.datetime.combine(day, datetime.time(23, 59, 59))
+            if start <= end:
+                parts.append(self._fetch_range(day, start, end).after(cursor))
+            if day >= now.date():
+                break
+            day += datetime.timedelta(days=1)
+        new = HeartRateSeries.concat(parts) if parts else HeartRateSeries.empty(now.date())
+        if len(new):
+            self.cursor = new[-1][0]
+        elif self.cursor is None or cursor.date() < now.date():
+            # Past days will not be read again: start the next poll from today.
+            self.cursor = max(cursor, datetime.datetime.combine(now.date(), datetime.time.min)
+                              - datetime.timedelta(microseconds=1))
+        return new
+
+
+class RequestBudget:
+    """
+    Token bucket of Fitbit API requests. It starts at `limit` per `window`
+    seconds, holds at most `burst` tokens, and is resynchronised from the
+    rate-limit headers of every response.
+    """
+
+    def __init__(self, limit=150, window=3600.0, burst=3, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.burst = burst
+        self.clock = clock
+        self.rate = limit / window      # tokens per second
+        self.tokens = float(burst)
+        self.blocked_until = 0.0
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def spend(self):
+        self._refill()
+        self.tokens -= 1
+
+    def observe(self, headers):
+        """Spread what Fitbit says is left of this hour's quota evenly until it resets."""
+        limit = _retry_after_seconds(headers.get("Fitbit-Rate-Limit-Limit"))
+        remaining = _retry_after_seconds(headers.get("Fitbit-Rate-Limit-Remaining"))
+        reset = _retry_after_seconds(headers.get("Fitbit-Rate-Limit-Reset"))
+        if remaining is None or reset is None:
+            return
+        self._refill()
+        if limit:
+            self.limit = limit
+        if remaining < 1:
+            # Nothing left this hour: wait for the reset, then pace a fresh quota.
+            self.block(reset)
+            self.tokens = min(self.tokens, 0.0)
+            self.rate = self.limit / self.window
+        else:
+            self.rate = remaining / max(reset, 1.0)
+            self.tokens = min(self.tokens, remaining)
+
+    def block(self, seconds):
+        """No request for `seconds` (a 429's Retry-After, or the rest of an exhausted hour)."""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def wait_time(self):
+        """Seconds until a request fits in the budget (0 if one can be sent now)."""
+        now = self._refill()
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+
+def _hhmm(t):
+    return int(t.replace(":", ""))
+
+
+class PollScheduler:
+    """
+    Polls an IntradayHeartRate as often as the time of day asks for and the
+    RequestBudget allows. `intervals` lists ("HH:MM", "HH:MM", seconds)
+    windows (the first match wins, a window may wrap past midnight);
+    outside all of them `default_interval` applies.
+    """
+
+    INTERVALS = [
+        ("20:00", "04:00", 10.0),   # sleep window: as fast as the quota allows
+        ("04:01", "11:59", 30.0),   # waking up
+        ("12:00", "19:59", 300.0),  # mid-day: nothing to detect
+    ]
+
+    def __init__(self, fetcher, budget=None, intervals=None, default_interval=60.0, sleep=time.sleep):
+        self.fetcher = fetcher
+        self.budget = budget if budget is not None else RequestBudget()
+        self.fetcher.budget = self.budget
+        self.intervals = list(intervals if intervals is not None else self.INTERVALS)
+        self.default_interval = default_interval
+        self.sleep = sleep
+        self.throttled = 0
+
+    def desired_interval(self, now):
+        current = now.hour * 100 + now.minute
+        for start, end, seconds in self.intervals:
+            s, e = _hhmm(start), _hhmm(end)
+            if (s <= current <= e) if s <= e else (current >= s or current <= e):
+                return seconds
+        return self.default_interval
+
+    def next_delay(self):
+        return max(self.desired_interval(self.fetcher.clock()), self.budget.wait_time())
+
+    def poll_once(self):
+        """One fetch if the budget allows it now; returns the new samples (none otherwise)."""
+        nothing = HeartRateSeries.empty(self.fetcher.clock().date())
+        if self.budget.wait_time() > 0:
+            return nothing
+        try:
+            return self.fetcher.fetch_new()
+        except FitbitError as e:
+            if e.status != 429:
+                print(f"[WARN] {e}")
+                return nothing
+            self.throttled += 1
+            wait = e.retry_after if e.retry_after is not None else 60.0
+            self.budget.block(wait)
+            print(f"[WARN] Fitbit rate limit hit; pausing polls for {wait:.0f}s")
+            return nothing
+
+    def run(self):
+        """Yield new (datetime, bpm) samples forever; waits between polls, never recurses."""
+        while True:
+            for sample in self.poll_once():
+                yield sample
+            self.sleep(self.next_delay())
@@ -0,0 +1,292 @@
+"""
+Fleet-scale evaluation of the SleepDetector rules on a process pool.
+
+A fleet is many synthetic users, each with their own resting heart rate,
+and a number of 19:00-12:00 one-minute nights per user with a known true
+sleep onset and wake-up minute. The harness runs the detector over every
+night for each (sleep_threshold, required_minutes) pair of a sweep and
+reports, per pair:
+
+- detection rate and latency of the first sleep detection after onset,
+- detection rate and latency of the first wake detection after wake-up,
+- false sleeps (detected before onset) and false wakes (detected while
+  truly asleep), per night,
+- actuator commands per night (lamp locks, curtain moves).
+
+Nights are split into chunks; each worker builds (or memory-maps) its chunk
+once and evaluates every pair of the sweep on it, so only small histograms
+travel between processes. The default engine is the vectorized replay
+(hardware.replay), which matches the scalar detector sample for sample;
+--engine scalar runs SleepDetector.process_heart_rate itself.
+
+From the repo root:
+    python -m hardware.fleet --users 500 --nights 30 --thresholds 3,5,7 --required 2,3,5
+    python -m hardware.fleet --users 500 --nights 30 --save fleet.hrrec
+    python -m hardware.fleet --load fleet.hrrec --engine scalar
+"""
+import argparse
+import concurrent.futures
+import datetime
+import itertools
+import os
+import time
+
+import numpy as np
+
+from hardware.detector import SLEEP_DETECTED, WAKE_DETECTED, SleepDetector
+from hardware.recording import Recording, RecordingWriter, local_seconds
+from hardware.replay import replay
+
+NIGHT_START = 19 * 60       # minute of day the nights start
+NIGHT_MINUTES = 17 * 60     # 19:00-12:00
+MAX_LATENCY = NIGHT_MINUTES  # histogram bins for latencies, in minutes
+FIRST_NIGHT = datetime.date(2026, 1, 1)
+
+
+class Fleet:
+    """Concatenated nights: per-sample timestamp/bpm, per-night start index, user, resting HR and truth."""
+
+    def __init__(self, ts, bpm, starts, user, resting_hr, onset, wake):
+        self.ts = ts                  # local wall-clock seconds (hardware.recording timestamps)
+        self.minute = ((ts // 60) % 1440).astype(np.int16)
+        self.bpm = bpm
+        self.starts = starts          # index of each night's first sample
+        self.user = user              # per night
+        self.resting_hr = resting_hr  # per night (the user's resting HR)
+        self.onset = onset            # per night: index of the first truly asleep sample
+        self.wake = wake              # per night: index of the first truly awake sample after sleep
+
+    def __len__(self):
+        return self.starts.shape[0]
+
+    def write(self, out):
+        """Add every night, truth included, to a hardware.recording.RecordingWriter."""
+        bounds = np.append(self.starts, self.bpm.shape[0])
+        for n in range(len(self)):
+            lo, hi = bounds[n], bounds[n + 1]
+            out.add_night(self.ts[lo:hi], self.bpm[lo:hi], int(self.user[n]), int(self.resting_hr[n]),
+                          int(self.ts[self.onset[n]]), int(self.ts[self.wake[n]]))
+
+    @classmethod
+    def load(cls, path, nights=None):
+        """Nights range(*nights) (default all) of a recording; only their samples are read."""
+        rec = Recording(path)
+        first, stop = nights if nights is not None else (0, len(rec))
+        index = np.array(rec.index[first:stop])
+        if (index["onset"] == 0).any() or (index["wake"] == 0).any():
+            raise ValueError(f"{path}: nights without sleep onset / wake-up truth cannot be scored")
+        lo, hi = int(index["start"][0]), int(index["stop"][-1])
+        ts = rec.timestamps[lo:hi].astype(np.int64)
+        starts = (index["start"] - lo).astype(np.int64)
+        stops = (index["stop"] - lo).astype(np.int64)
+        onset = np.array([s + np.searchsorted(ts[s:e], t) for s, e, t in zip(starts, stops, index["onset"])])
+        wake = np.array([s + np.searchsorted(ts[s:e], t) for s, e, t in zip(starts, stops, index["wake"])])
+        return cls(ts, np.array(rec.bpm[lo:hi]), starts, index["user"].astype(np.int64),
+                   index["resting_hr"].astype(np.int16), onset, wake)
+
+
+def generate_user(seed, user, nights, first_night=FIRST_NIGHT):
+    """`nights` synthetic nights of one user from the evening of `first_night`; deterministic in (seed, user)."""
+    rng = np.random.default_rng([seed, user])
+    resting = int(np.clip(np.rint(rng.normal(63, 6)), 45, 85))
+    noise = rng.uniform(1.5, 4.0)
+    t = np.arange(NIGHT_MINUTES)
+    ts = (local_seconds(first_night, NIGHT_START * 60) + 86400 * np.arange(nights)[:, None] + 60 * t).ravel()
+
+    bpm = np.empty((nights, NIGHT_MINUTES))
+    onset = rng.integers(150, 331, size=nights)      # 21:30-00:30
+    wake = rng.integers(630, 811, size=nights)       # 05:30-08:30
+    for n in range(nights):
+        awake = resting + rng.normal(8, 2)
+        asleep = resting - abs(rng.normal(9, 2))
+        # Fall asleep and wake up over ~15 minutes.
+        level = np.interp(t, [0, onset[n], onset[n] + 15, wake[n], wake[n] + 15, NIGHT_MINUTES],
+                          [awake, awake, asleep, asleep, awake, awake])
+        # A few brief arousals during sleep.
+        for a in rng.integers(onset[n] + 30, wake[n] - 10, size=rng.poisson(1.5)):
+            level[a:a + rng.integers(2, 6)] += rng.uniform(6, 14)
+        bpm[n] = level + rng.normal(0, noise, size=NIGHT_MINUTES)
+    bpm = np.clip(np.rint(bpm), 35, 200).astype(np.int16)
+    starts = np.arange(nights) * NIGHT_MINUTES
+    return Fleet(ts, bpm.ravel(), starts, np.full(nights, user), np.full(nights, resting, dtype=np.int16),
+                 starts + onset, starts + wake)
+
+
+def generate_fleet(seed, users, nights_per_user):
+    parts = [generate_user(seed, u, nights_per_user) for u in users]
+    offsets = np.cumsum([0] + [p.bpm.shape[0] for p in parts[:-1]])
+    return Fleet(
+        np.concatenate([p.ts for p in parts]),
+        np.concatenate([p.bpm for p in parts]),
+        np.concatenate([p.starts + o for p, o in zip(parts, offsets)]),
+        np.concatenate([p.user for p in parts]),
+        np.concatenate([p.resting_hr for p in parts]),
+        np.concatenate([p.onset + o for p, o in zip(parts, offsets)]),
+        np.concatenate([p.wake + o for p, o in zip(parts, offsets)]),
+    )
+
+
+def _events_vector(fleet, sleep_threshold, required_minutes):
+    lengths = np.diff(np.append(fleet.starts, fleet.bpm.shape[0]))
+    resting = np.repeat(fleet.resting_hr.astype(np.int64), lengths)
+    result = replay(fleet.minute, fleet.bpm.astype(np.int64), resting, sleep_threshold, required_minutes,
+                    starts=fleet.starts)
+    return np.flatnonzero(result.sleep), np.flatnonzero(result.wake), np.flatnonzero(result.lamp_lock)
+
+
+def _events_scalar(fleet, sleep_threshold, required_minutes):
+    sleep, wake, lock = [], [], []
+    hhmm = ((fleet.minute // 60) * 100 + fleet.minute % 60).tolist()
+    bpm = fleet.bpm.tolist()
+    bounds = fleet.starts.tolist() + [len(bpm)]
+    for n in range(len(fleet)):
+        position = [0]
+        detector = SleepDetector(int(fleet.resting_hr[n]), sleep_threshold, required_minutes,
+                                 on_lamp_lock=lambda: lock.append(position[0]))
+        process = detector.process_heart_rate
+        for i in range(bounds[n], bounds[n + 1]):
+            position[0] = i
+            status = process(bpm[i], hhmm[i])
+            if status == SLEEP_DETECTED:
+                sleep.append(i)
+            elif status == WAKE_DETECTED:
+                wake.append(i)
+    return np.array(sleep, dtype=np.int64), np.array(wake, dtype=np.int64), np.array(lock, dtype=np.int64)
+
+
+ENGINES = {"vector": _events_vector, "scalar": _events_scalar}
+
+
+def _first_per_night(night, idx, eligible, n_nights):
+    """Per night, the smallest eligible event index (or -1)."""
+    first = np.full(n_nights, np.iinfo(np.int64).max)
+    np.minimum.at(first, night[eligible], idx[eligible])
+    return np.where(first == np.iinfo(np.int64).max, -1, first)
+
+
+def score(fleet, sleep_idx, wake_idx, lock_idx):
+    """Aggregate counts and latency histograms for one run over `fleet`."""
+    n = len(fleet)
+    s_night = np.searchsorted(fleet.starts, sleep_idx, side="right") - 1
+    w_night = np.searchsorted(fleet.starts, wake_idx, side="right") - 1
+
+    first_sleep = _first_per_night(s_night, sleep_idx, sleep_idx >= fleet.onset[s_night], n)
+    first_wake = _first_per_night(w_night, wake_idx, wake_idx >= fleet.wake[w_night], n)
+    detected_sleep = first_sleep >= 0
+    detected_wake = first_wake >= 0
+    sleep_latency = (first_sleep - fleet.onset)[detected_sleep]
+    wake_latency = (first_wake - fleet.wake)[detected_wake]
+
+    return {
+        "nights": n,
+        "sleep_detected": int(detected_sleep.sum()),
+        "wake_detected": int(detected_wake.sum()),
+        "sleep_latency": np.bincount(np.minimum(sleep_latency, MAX_LATENCY), minlength=MAX_LATENCY + 1),
+        "wake_latency": np.bincount(np.minimum(wake_latency, MAX_LATENCY), minlength=MAX_LATENCY + 1),
+        "false_sleep": int((sleep_idx < fleet.onset[s_night]).sum()),
+        "false_wake": int(((wake_idx >= fleet.onset[w_night]) & (wake_idx < fleet.wake[w_night])).sum()),
+        "lamp_locks": int(lock_idx.shape[0]),
+        "curtain_moves": int(sleep_idx.shape[0] + wake_idx.shape[0]),
+    }
+
+
+def run_chunk(task):
+    """Worker: build or load one chunk of nights, then score every configuration on it."""
+    source, chunk, configs, engine = task
+    if source[0] == "generate":
+        _, seed, nights_per_user = source
+        fleet = generate_fleet(seed, range(*chunk), nights_per_user)
+    else:
+        fleet = Fleet.load(source[1], nights=chunk)
+    events = ENGINES[engine]
+    return [score(fleet, *events(fleet, threshold, required)) for threshold, required in configs]
+
+
+def merge(a, b):
+    return {k: a[k] + b[k] for k in a}
+
+
+def _percentile(hist, q):
+    total = hist.sum()
+    if not total:
+        return float("nan")
+    return float(np.searchsorted(np.cumsum(hist), q * total))
+
+
+def _mean(hist):
+    total = hist.sum()
+    return float((hist * np.arange(hist.shape[0])).sum() / total) if total else float("nan")
+
+
+def report(configs, totals):
+    lines = [f"{'thr':>4} {'req':>4} {'nights':>7} {'sleep%':>7} {'lat p50':>8} {'lat p95':>8} "
+             f"{'wake%':>6} {'lat p50':>8} {'lat p95':>8} {'falseS/n':>9} {'falseW/n':>9} {'lamp/n':>7} {'curt/n':>7}"]
+    for (threshold, required), t in zip(configs, totals):
+        n = t["nights"]
+        lines.append(
+            f"{threshold:>4} {required:>4} {n:>7} {100 * t['sleep_detected'] / n:>6.1f}% "
+            f"{_percentile(t['sleep_latency'], 0.5):>8.0f} {_percentile(t['sleep_latency'], 0.95):>8.0f} "
+            f"{100 * t['wake_detected'] / n:>5.1f}% "
+            f"{_percentile(t['wake_latency'], 0.5):>8.0f} {_percentile(t['wake_latency'], 0.95):>8.0f} "
+            f"{t['false_sleep'] / n:>9.3f} {t['false_wake'] / n:>9.3f} "
+            f"{t['lamp_locks'] / n:>7.2f} {t['curtain_moves'] / n:>7.2f}"
+        )
+    return "\n".join(lines)
+
+
+def sweep(configs, source, chunks, engine="vector", workers=None):
+    """Score every configuration over every chunk on a process pool; returns one total per configuration."""
+    tasks = [(source, chunk, configs, engine) for chunk in chunks]
+    totals = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(run_chunk, tasks):
+            totals = result if totals is None else [merge(a, b) for a, b in zip(totals, result)]
+    return totals
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep SleepDetector parameters over a synthetic fleet.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--nights", type=int, default=30, help="nights per user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--thresholds", type=_ints, default=[5], help="sleep_threshold values, comma-separated")
+    parser.add_argument("--required", type=_ints, default=[3], help="required_minutes values, comma-separated")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="vector")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=20, help="users (or, with --load, nights x 10) per task")
+    parser.add_argument("--save", help="write the generated fleet to this recording and exit")
+    parser.add_argument("--load", help="evaluate the nights of a recording instead of generating them")
+    args = parser.parse_args()
+
+    if args.save:
+        with RecordingWriter(args.save) as out:
+            for user in range(args.users):
+                generate_user(args.seed, user, args.nights).write(out)
+        print(f"saved {args.users * args.nights} nights to {args.save}")
+        return
+
+    configs = list(itertools.product(args.thresholds, args.required))
+    if args.load:
+        total_nights = len(Recording(args.load))
+        step = args.chunk * 10
+        source = ("load", args.load)
+        chunks = [(lo, min(lo + step, total_nights)) for lo in range(0, total_nights, step)]
+    else:
+        total_nights = args.users * args.nights
+        source = ("generate", args.seed, args.nights)
+        chunks = [(lo, min(lo + args.chunk, args.users)) for lo in range(0, args.users, args.chunk)]
+
+    t0 = time.perf_counter()
+    totals = sweep(configs, source, chunks, args.engine, args.workers)
+    elapsed = time.perf_counter() - t0
+    print(report(configs, totals))
+    print(f"{total_nights} nights x {len(configs)} configurations, engine={args.engine}, "
+          f"{args.workers} workers: {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
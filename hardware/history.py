@@ -0,0 +1,185 @@
+"""
+Fixed-memory heart-rate history with 1-minute and 15-minute rollups.
+
+HeartRateHistory keeps the newest `capacity` samples in a ring of NumPy
+arrays (uint32 unix seconds, uint16 bpm) and maintains rollup tiers as
+samples arrive: one bucket per minute and per 15 minutes, each holding the
+bucket's min, max, sum and count. Nothing grows after construction and no
+Python object is kept per sample.
+
+- append() is O(1): one slot in the ring and the open bucket of each tier.
+- extend() appends a whole batch (e.g. a fetched HeartRateSeries) with
+  vectorized writes and per-bucket reductions.
+- window() and Tier.window() binary-search the time-ordered ring (two
+  sorted runs when it has wrapped) and copy out only the matching slice.
+
+Samples must arrive in time order; one older than the newest sample is
+dropped and counted in `dropped`.
+"""
+import datetime
+
+import numpy as np
+
+
+class _Ring:
+    """Parallel fixed-size arrays filled oldest to newest, overwriting the oldest."""
+
+    def __init__(self, capacity, dtypes):
+        self.capacity = capacity
+        self.columns = [np.zeros(capacity, dtype=dt) for dt in dtypes]
+        self.head = 0      # next slot to write
+        self.size = 0
+
+    def runs(self):
+        """The filled slots as time-ordered (start, stop) index ranges."""
+        if self.size < self.capacity:
+            return [(0, self.size)]
+        return [(self.head, self.capacity), (0, self.head)]
+
+    def last_index(self):
+        return (self.head - 1) % self.capacity
+
+    def push(self, *values):
+        for column, value in zip(self.columns, values):
+            column[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def push_many(self, *values):
+        n = len(values[0])
+        if n >= self.capacity:
+            values = [v[n - self.capacity:] for v in values]
+            n = self.capacity
+        first = min(n, self.capacity - self.head)
+        for column, v in zip(self.columns, values):
+            column[self.head:self.head + first] = v[:first]
+            column[:n - first] = v[first:]
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def select(self, key, start, end):
+        """Columns of the slots whose `key` column lies in [start, end), in time order."""
+        parts = []
+        for lo, hi in self.runs():
+            keys = self.columns[key][lo:hi]
+            i = lo + np.searchsorted(keys, np.int64(start), side="left")
+            j = lo + np.searchsorted(keys, np.int64(end), side="left")
+            if i < j:
+                parts.append((i, j))
+        return [np.concatenate([c[i:j] for i, j in parts]) if parts else c[:0].copy() for c in self.columns]
+
+
+class Tier:
+    """Rollup buckets of `width` seconds: start time, min, max, sum and count of the bpm in each."""
+
+    def __init__(self, width, capacity):
+        self.width = width
+        self._ring = _Ring(capacity, (np.uint32, np.uint16, np.uint16, np.uint32, np.uint16))
+
+    def __len__(self):
+        return self._ring.size
+
+    def add(self, ts, bpm):
+        ring = self._ring
+        start = ts - ts % self.width
+        if ring.size:
+            i = ring.last_index()
+            starts, mins, maxs, sums, counts = ring.columns
+            if starts[i] == start:
+                mins[i] = min(mins[i], bpm)
+                maxs[i] = max(maxs[i], bpm)
+                sums[i] += bpm
+                counts[i] += 1
+                return
+        ring.push(start, bpm, bpm, bpm, 1)
+
+    def add_many(self, ts, bpm):
+        starts = ts - ts % self.width
+        cut = np.flatnonzero(np.diff(starts)) + 1
+        bounds = np.concatenate(([0], cut))
+        mins = np.minimum.reduceat(bpm, bounds)
+        maxs = np.maximum.reduceat(bpm, bounds)
+        sums = np.add.reduceat(bpm.astype(np.uint32), bounds)
+        counts = np.diff(np.concatenate((bounds, [len(ts)])))
+        starts = starts[bounds]
+        ring = self._ring
+        if ring.size and ring.columns[0][ring.last_index()] == starts[0]:
+            # The batch continues the bucket that is still open.
+            i = ring.last_index()
+            c = ring.columns
+            c[1][i] = min(c[1][i], mins[0])
+            c[2][i] = max(c[2][i], maxs[0])
+            c[3][i] += sums[0]
+            c[4][i] += counts[0]
+            starts, mins, maxs, sums, counts = starts[1:], mins[1:], maxs[1:], sums[1:], counts[1:]
+        if len(starts):
+            ring.push_many(starts, mins, maxs, sums, counts)
+
+    def window(self, start, end):
+        """Buckets starting in [start, end) as (start, min, mean, max) arrays."""
+        starts, mins, maxs, sums, counts = self._ring.select(0, start, end)
+        return starts, mins, sums / np.maximum(counts, 1), maxs
+
+
+class HeartRateHistory:
+    def __init__(self, capacity=6 * 3600, minute_buckets=24 * 60, quarter_buckets=7 * 24 * 4):
+        # Defaults: 6 h of 1-second samples, 1 day of minutes, 1 week of 15-minute buckets.
+        self._ring = _Ring(capacity, (np.uint32, np.uint16))
+        self.minutes = Tier(60, minute_buckets)
+        self.quarters = Tier(15 * 60, quarter_buckets)
+        self.tiers = (self.minutes, self.quarters)
+        self.newest = None
+        self.dropped = 0
+
+    def __len__(self):
+        return self._ring.size
+
+    @property
+    def nbytes(self):
+        rings = [self._ring] + [t._ring for t in self.tiers]
+        return sum(c.nbytes for r in rings for c in r.columns)
+
+    def append(self, ts, bpm):
+        """Record one sample at unix time `ts`; returns False if it was older than the newest."""
+        ts = int(ts)
+        if self.newest is not None and ts < self.newest:
+            self.dropped += 1
+            return False
+        self.newest = ts
+        self._ring.push(ts, bpm)
+        for tier in self.tiers:
+            tier.add(ts, bpm)
+        return True
+
+    def extend(self, ts, bpm):
+        """Record a batch of samples given as arrays in time order."""
+        ts = np.asarray(ts, dtype=np.int64)
+        bpm = np.asarray(bpm, dtype=np.uint16)
+        if self.newest is not None:
+            keep = ts >= self.newest
+            self.dropped += int(len(ts) - keep.sum())
+            ts, bpm = ts[keep], bpm[keep]
+        if not len(ts):
+            return
+        if (np.diff(ts) < 0).any():
+            raise ValueError("extend() needs samples in time order")
+        ts = ts.astype(np.uint32)
+        self.newest = int(ts[-1])
+        self._ring.push_many(ts, bpm)
+        for tier in self.tiers:
+            tier.add_many(ts, bpm)
+
+    def extend_series(self, series):
+        """Record a hardware.intraday.HeartRateSeries (local times of series.day)."""
+        midnight = int(datetime.datetime.combine(series.day, datetime.time.min).timestamp())
+        self.extend(series.seconds.astype(np.int64) + midnight, series.bpm)
+
+    def window(self, start, end):
+        """Raw samples with start <= ts < end as (ts, bpm) arrays, oldest first."""
+        return tuple(self._ring.select(0, start, end))
+
+    def recent(self, seconds):
+        """Raw samples of the last `seconds` seconds up to the newest one."""
+        if self.newest is None:
+            return self.window(0, 0)
+        return self.window(self.newest - seconds + 1, self.newest + 1)
@@ -0,0 +1,173 @@
+"""
+Streaming parser and compact storage for Fitbit intraday heart-rate data.
+
+`parse_dataset()` reads an intraday response body chunk by chunk and
+decodes only `activities-heart-intraday.dataset` into two parallel NumPy
+arrays, uint32 seconds since midnight and uint16 bpm, without ever building
+the full JSON document or a dict per sample. A full day of 1-second data
+takes about 0.5 MB this way instead of tens of MB of Python objects.
+
+Fitbit sends the dataset as compact `{"time":"HH:MM:SS","value":N}`
+objects; each chunk is decoded with vectorized byte comparisons on that
+layout. A chunk that does not follow it exactly (whitespace, other key
+order) is decoded with a regular expression instead, so any valid dataset
+parses, only slower.
+
+Check equivalence with json.loads and time both from the repo root:
+    python -m benchmarks.bench_intraday_parse
+"""
+import datetime
+import re
+
+import numpy as np
+
+_DATASET = re.compile(rb'"activities-heart-intraday"\s*:\s*\{.*?"dataset"\s*:\s*\[', re.S)
+_ITEM = re.compile(
+    rb'\{\s*"time"\s*:\s*"(\d\d):(\d\d):(\d\d)"\s*,\s*"value"\s*:\s*(\d+)\s*\}'
+    rb'|\{\s*"value"\s*:\s*(\d+)\s*,\s*"time"\s*:\s*"(\d\d):(\d\d):(\d\d)"\s*\}'
+)
+# Fitbit's compact item up to its value digits; "0" marks the clock digits.
+_TEMPLATE = np.frombuffer(b'{"time":"00:00:00","value":', dtype=np.uint8)
+_ITEM_PREFIX = _TEMPLATE.shape[0]
+_CLOCK = np.array([9, 10, 12, 13, 15, 16])
+_FIXED = np.setdiff1d(np.arange(_ITEM_PREFIX), _CLOCK)
+_MAX_PREFIX = 1 << 20   # give up looking for the dataset after this many bytes
+
+
+class HeartRateSeries:
+    """
+    Samples of one night or day: `seconds` counts from midnight of `day` (so
+    samples after the next midnight are >= 86400) and `bpm` holds the rates.
+    Indexing and iteration give (datetime, bpm) pairs.
+    """
+
+    def __init__(self, day, seconds, bpm):
+        self.day = day
+        self.seconds = np.asarray(seconds, dtype=np.uint32)
+        self.bpm = np.asarray(bpm, dtype=np.uint16)
+
+    @classmethod
+    def empty(cls, day):
+        return cls(day, np.empty(0, np.uint32), np.empty(0, np.uint16))
+
+    @classmethod
+    def concat(cls, parts):
+        """Join series in time order, re-based on the first one's day."""
+        day = parts[0].day
+        seconds = [p.seconds.astype(np.int64) + (p.day - day).days * 86400 for p in parts]
+        return cls(day, np.concatenate(seconds), np.concatenate([p.bpm for p in parts]))
+
+    def __len__(self):
+        return self.seconds.shape[0]
+
+    def _datetime(self, seconds):
+        return datetime.datetime.combine(self.day, datetime.time.min) + datetime.timedelta(seconds=int(seconds))
+
+    def __getitem__(self, i):
+        return self._datetime(self.seconds[i]), int(self.bpm[i])
+
+    def __iter__(self):
+        for s, b in zip(self.seconds.tolist(), self.bpm.tolist()):
+            yield self._datetime(s), b
+
+    def after(self, ts):
+        """The samples strictly later than datetime `ts`."""
+        cutoff = (ts - datetime.datetime.combine(self.day, datetime.time.min)).total_seconds()
+        keep = self.seconds > cutoff
+        return HeartRateSeries(self.day, self.seconds[keep], self.bpm[keep])
+
+    def minute_of_day(self):
+        """Minute of day (0..1439) of every sample, as hardware.replay.replay() takes."""
+        return (self.seconds // 60) % 1440
+
+    @property
+    def nbytes(self):
+        return self.seconds.nbytes + self.bpm.nbytes
+
+
+def _decode_fast(buf):
+    """Decode a run of compact items; None if `buf` is not exactly in Fitbit's layout."""
+    n = len(buf)
+    arr = np.frombuffer(buf + b"\0\0\0", dtype=np.uint8)
+    opens = np.flatnonzero(arr[:n] == ord("{"))
+    closes = np.flatnonzero(arr[:n] == ord("}"))
+    if opens.shape[0] == 0 or opens.shape[0] != closes.shape[0]:
+        return None
+    digits_len = closes - opens - _ITEM_PREFIX
+    if digits_len.min() < 1 or digits_len.max() > 3:
+        return None
+    # One contiguous window per item: the fixed prefix plus up to three value digits.
+    rows = np.lib.stride_tricks.sliding_window_view(arr, _ITEM_PREFIX + 3)[opens]
+    if not (rows[:, _FIXED] == _TEMPLATE[_FIXED]).all():
+        return None
+    clock = (rows[:, _CLOCK] - 48).astype(np.int32)   # uint8 wrap-around flags non-digits as > 9
+    if clock.max() > 9:
+        return None
+    d = (rows[:, _ITEM_PREFIX:] - 48).astype(np.int32)
+    valid = (d[:, 0] <= 9) & ((digits_len < 2) | (d[:, 1] <= 9)) & ((digits_len < 3) | (d[:, 2] <= 9))
+    if not valid.all():
+        return None
+    seconds = (clock[:, 0] * 10 + clock[:, 1]) * 3600 + (clock[:, 2] * 10 + clock[:, 3]) * 60 + clock[:, 4] * 10 + clock[:, 5]
+    value = np.where(digits_len == 1, d[:, 0],
+                     np.where(digits_len == 2, d[:, 0] * 10 + d[:, 1], d[:, 0] * 100 + d[:, 1] * 10 + d[:, 2]))
+    return seconds, value
+
+
+def _decode_slow(buf):
+    seconds, value = [], []
+    for m in _ITEM.finditer(buf):
+        if m.group(1) is not None:
+            h, mi, s, v = m.group(1, 2, 3, 4)
+        else:
+            v, h, mi, s = m.group(5, 6, 7, 8)
+        seconds.append(int(h) * 3600 + int(mi) * 60 + int(s))
+        value.append(int(v))
+    return np.array(seconds, dtype=np.int64), np.array(value, dtype=np.int64)
+
+
+def parse_dataset(chunks, day):
+    """
+    Decode the intraday dataset of a response body given as an iterable of
+    byte chunks (e.g. resp.iter_content(65536)) into a HeartRateSeries for
+    `day`. A body without an intraday dataset gives an empty series; a body
+    cut off inside the dataset raises ValueError.
+    """
+    buf = b""
+    chunks = iter(chunks)
+    for chunk in chunks:
+        buf += chunk
+        m = _DATASET.search(buf)
+        if m:
+            buf = buf[m.end():]
+            break
+        if len(buf) > _MAX_PREFIX:
+            raise ValueError("No intraday dataset in the first MB of the response")
+    else:
+        return HeartRateSeries.empty(day)
+
+    seconds, bpm = [], []
+
+    def decode(run):
+        run = run.strip(b" \t\r\n,")
+        if run:
+            decoded = _decode_fast(run) or _decode_slow(run)
+            seconds.append(decoded[0])
+            bpm.append(decoded[1])
+
+    while True:
+        close = buf.find(b"]")
+        if close >= 0:
+            decode(buf[:close])
+            break
+        # Decode every complete item; keep a partial one for the next chunk.
+        last = buf.rfind(b"}")
+        if last >= 0:
+            decode(buf[:last + 1])
+            buf = buf[last + 1:]
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Intraday dataset ended before its closing bracket")
+        buf += chunk
+    if not seconds:
+        return HeartRateSeries.empty(day)
+    return HeartRateSeries(day, np.concatenate(seconds), np.concatenate(bpm))
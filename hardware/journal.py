@@ -0,0 +1,166 @@
+"""
+Durable outbox for the sleep/wake events the Pi reports to the server.
+
+Events are appended to a local SQLite journal (WAL, synchronous=FULL, so an
+acknowledged append survives a power cut) and sent by a background
+JournalFlusher, oldest first, in batches to POST /update-sleep/batch. Rows
+are deleted only once the server has acknowledged them. While the uplink is
+down the flusher backs off and keeps retrying; recording an event never
+waits on the network.
+"""
+import json
+import random
+import sqlite3
+import threading
+import time
+
+try:
+    from api_client import ApiError  # run as a script from hardware/
+except ImportError:
+    from hardware.api_client import ApiError
+
+
+class EventJournal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+
+    def append(self, kind, payload):
+        """Durably record one event; returns its sequence number."""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO events (kind, payload) VALUES (?, ?)", (kind, json.dumps(payload))
+            )
+            return cur.lastrowid
+
+    def pending(self, kind, limit):
+        """Oldest unacknowledged events of `kind`, as [(seq, payload)]."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, payload FROM events WHERE kind = ? ORDER BY seq LIMIT ?", (kind, limit)
+            ).fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def ack(self, kind, up_to_seq):
+        """Drop every event of `kind` up to and including `up_to_seq`."""
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE kind = ? AND seq <= ?", (kind, up_to_seq))
+
+    def count(self):
+        with self._lock:
+            (n,) = self._conn.execute("SELECT COUNT(*) FROM events").fetchone()
+        return n
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JournalFlusher:
+    """
+    Background thread replaying the journal's "sleep" events to the server.
+    It wakes up when an event is appended (notify()) or after `interval`
+    seconds, and after a failed send waits with jittered exponential backoff
+    (capped at `max_backoff`) before trying again.
+    """
+
+    KIND = "sleep"
+
+    def __init__(self, journal, api, batch_size=50, interval=30.0, max_backoff=300.0, clock=time.time):
+        self.journal = journal
+        self.api = api
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.clock = clock              # timestamps the recorded events
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._batch_endpoint = True  # cleared if the server predates /update-sleep/batch
+        self.sent = 0
+
+    def record_sleep(self, is_sleeping):
+        """Journal a sleep/wake transition and nudge the flusher; never blocks on the network."""
+        seq = self.journal.append(self.KIND, {"isSleeping": bool(is_sleeping), "timestamp": self.clock()})
+        self.notify()
+        return seq
+
+    def notify(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the thread after one last attempt to send what is pending."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _send(self, events):
+        payloads = [payload for _, payload in events]
+        if self._batch_endpoint:
+            try:
+                self.api.post_json("/update-sleep/batch", {"events": payloads})
+                return
+            except ApiError as e:
+                if e.status not in (404, 405):
+                    raise
+                self._batch_endpoint = False
+                print("[INFO] Server has no /update-sleep/batch; replaying events one by one")
+        for payload in payloads:
+            self.api.post_json("/update-sleep", {"isSleeping": payload["isSleeping"]})
+
+    def flush_once(self):
+        """Send pending events batch by batch until the journal is empty; raises ApiError on failure."""
+        while True:
+            events = self.journal.pending(self.KIND, self.batch_size)
+            if not events:
+                return
+            try:
+                self._send(events)
+            except ApiError as e:
+                if e.status == 413 and len(events) > 1:
+                    self.batch_size = max(1, len(events) // 2)
+                    continue
+                if e.status != 422:
+                    # Anything else (including 400 for a bad household id or device
+                    # config) may be fixed on the server side, so keep the events.
+                    raise
+                # The payloads themselves are invalid and will never be accepted;
+                # don't let them block newer events.
+                print(f"[WARN] Dropping {len(events)} journaled events rejected by the server: {e}")
+            self.journal.ack(self.KIND, events[-1][0])
+            self.sent += len(events)
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                self.flush_once()
+                self._failures = 0
+                delay = self.interval
+            except Exception as e:
+                # Not only ApiError: an unexpected error (a response body that
+                # is not JSON, a journal error) must not end the thread either.
+                self._failures += 1
+                delay = random.uniform(0, min(self.max_backoff, 2.0 * (2 ** self._failures)))
+                print(f"[WARN] Journal flush failed, retrying in {delay:.1f}s: {e!r}")
+            if self._stopping.is_set():
+                return
+            self._wake.wait(delay)
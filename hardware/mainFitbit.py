@@ -4,6 +4,15 @@ import requests
 from requests_oauthlib import OAuth2Session
 from dotenv import load_dotenv
 
+try:
+    from fitbit import IntradayHeartRate, PollScheduler  # run as a script from hardware/
+    from history import HeartRateHistory
+    from recording import NightlyRecordingWriter, local_seconds
+except ImportError:
+    from hardware.fitbit import IntradayHeartRate, PollScheduler
+    from hardware.history import HeartRateHistory
+    from hardware.recording import NightlyRecordingWriter, local_seconds
+
 # Load environment variables
 load_dotenv()
 
@@ -13,9 +22,11 @@ REDIRECT_URI = os.getenv('FITBIT_REDIRECT_URI')
 ACCESS_TOKEN = os.getenv('FITBIT_ACCESS_TOKEN')
 REFRESH_TOKEN = os.getenv('FITBIT_REFRESH_TOKEN')
 USER_ID = os.getenv('FITBIT_USER_ID')
+# Optional: also write every fetched sample to hardware.recording files, one per
+# night, named from this path with the night's date (e.g. nights/hr-{date}.hrrec)
+RECORDING_PATH = os.getenv('FITBIT_RECORDING_PATH')
 
 TOKEN_URL = 'https://api.fitbit.com/oauth2/token'
-HEART_RATE_URL = f'https://api.fitbit.com/1/user/{USER_ID}/activities/heart/date/today/1d/1sec.json'
 
 # Scopes required for heart rate
 SCOPE = ['heartrate', 'activity', 'profile']
@@ -29,30 +40,8 @@ def refresh_token(session):
     token = session.refresh_token(TOKEN_URL, refresh_token=REFRESH_TOKEN, **extra)
     return token
 
-# Helper: Get current heart rate
-def get_current_heartrate(session):
-    resp = session.get(HEART_RATE_URL)
-    if resp.status_code == 200:
-        data = resp.json()
-        # Extract latest heart rate value
-        try:
-            dataset = data['activities-heart-intraday']['dataset']
-            if dataset:
-                latest = dataset[-1]
-                return latest['value'], latest['time']
-            else:
-                return None, None
-        except Exception:
-            return None, None
-    elif resp.status_code == 429:
-        print('Rate limit exceeded. Waiting before retrying...')
-        time.sleep(30)
-        return get_current_heartrate(session)
-    else:
-        print(f'Error: {resp.status_code} {resp.text}')
-        return None, None
-
-def main(interval=30):
+# Polls on PollScheduler's time-of-day schedule, or every `interval` seconds all day if given
+def main(interval=None):
     token = {
         'access_token': ACCESS_TOKEN,
         'refresh_token': REFRESH_TOKEN,
@@ -65,15 +54,35 @@ def main(interval=30):
                                'client_secret': CLIENT_SECRET,
                            },
                            token_updater=None)
+    # Only the samples since the last poll are downloaded, not the whole day, and
+    # polls are paced by time of day within the hourly Fitbit request quota
+    fetcher = IntradayHeartRate(session, user_id=USER_ID)
+    if interval is None:
+        scheduler = PollScheduler(fetcher)
+    else:
+        scheduler = PollScheduler(fetcher, intervals=[], default_interval=interval)
+    # Recent samples and their 1-minute / 15-minute rollups, in fixed memory
+    history = HeartRateHistory()
+    recording = NightlyRecordingWriter(RECORDING_PATH) if RECORDING_PATH else None
     print('Starting Fitbit heart rate fetcher...')
-    while True:
-        hr, t = get_current_heartrate(session)
-        if hr is not None:
-            print(f'[{t}] Current Heart Rate: {hr} bpm')
-        else:
-            print('No heart rate data available.')
-        time.sleep(interval)
+    try:
+        while True:
+            new = scheduler.poll_once()
+            if new:
+                history.extend_series(new)
+                if recording is not None:
+                    recording.append(local_seconds(new.day, new.seconds), new.bpm)
+                t, hr = new[-1]
+                _, lows, means, highs = history.minutes.window(history.newest - 60, history.newest + 1)
+                print(f'[{t:%H:%M:%S}] Current Heart Rate: {hr} bpm ({len(new)} new samples, '
+                      f'this minute {lows[-1]}/{means[-1]:.0f}/{highs[-1]} min/mean/max)')
+            else:
+                print('No new heart rate data available.')
+            time.sleep(scheduler.next_delay())
+    finally:
+        if recording is not None:
+            recording.close()
 
 if __name__ == '__main__':
-    # Set the interval in seconds (default: 60)
-    main(interval=30)
+    # Follows PollScheduler.INTERVALS; pass interval=<seconds> for a fixed pace instead
+    main()
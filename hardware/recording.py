@@ -0,0 +1,403 @@
+"""
+Binary heart-rate recordings that are read with np.memmap, zero-copy.
+
+A recording is one file (conventionally *.hrrec) laid out as
+
+    header   64 bytes, HEADER below
+    ts       uint32 little-endian, one per sample, 8-byte aligned
+    bpm      uint16 little-endian, one per sample, 8-byte aligned
+    index    INDEX_DTYPE records, one per night (optional, flag HAS_INDEX)
+
+Timestamps are wall-clock seconds since 1970-01-01 in the wearer's local
+time, as Fitbit reports them, so the minute of day is ts // 60 % 1440 with
+no time zone involved. Samples are in time order within a night. A night
+runs from noon to noon and is identified by the date of its evening; the
+index gives each night's sample range, user id, resting heart rate and,
+for synthetic nights, the true sleep onset and wake-up time (0 if unknown).
+
+Recording maps the sections and never reads more than the caller slices;
+RecordingWriter streams samples to disk, so neither side holds a corpus in
+memory. A writer's file only appears at its path once close() has
+completed it (it is written as <path>.part and renamed), so a crash never
+leaves a truncated recording behind. Long-running recorders use
+NightlyRecordingWriter, which closes one file per night, so a power cut
+loses at most the night in progress.
+
+    with RecordingWriter("night.hrrec") as out:
+        out.append(ts, bpm, user=3)          # split into nights at noon
+    rec = Recording("night.hrrec")
+    ts, bpm = rec.night(0)                   # memmap views
+
+From the repo root:
+    python -m hardware.recording convert nights.hrrec day1.json day2.json --user 3
+    python -m hardware.recording slice nights.hrrec week.hrrec --user 3 --from 2026-01-10 --to 2026-01-16
+    python -m hardware.recording info week.hrrec
+"""
+import argparse
+import datetime
+import itertools
+import os
+import re
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+try:
+    from intraday import HeartRateSeries, parse_dataset  # run as a script from hardware/
+except ImportError:
+    from hardware.intraday import HeartRateSeries, parse_dataset
+
+MAGIC = b"SWHRREC\0"
+VERSION = 1
+HAS_INDEX = 1
+# magic, version, flags, index record size, samples, nights, ts / bpm / index offsets
+HEADER = struct.Struct("<8sHHIQQQQQ8x")
+INDEX_DTYPE = np.dtype([
+    ("start", "<u8"), ("stop", "<u8"),      # sample range [start, stop)
+    ("user", "<u4"),
+    ("onset", "<u4"), ("wake", "<u4"),      # true sleep onset / wake-up ts, 0 if unknown
+    ("resting_hr", "<u2"), ("reserved", "<u2"),
+])
+EPOCH = datetime.date(1970, 1, 1)
+NOON = 12 * 3600
+CHUNK_SIZE = 64 * 1024
+
+_DATE = re.compile(rb'"dateTime"\s*:\s*"(\d{4}-\d\d-\d\d)"')
+
+
+def local_seconds(day, seconds=0):
+    """Recording timestamp of `seconds` after midnight of `day`."""
+    return (day - EPOCH).days * 86400 + np.asarray(seconds, dtype=np.int64)
+
+
+def night_of(ts):
+    """Day number (days since 1970-01-01) of the night each timestamp belongs to."""
+    return (np.asarray(ts, dtype=np.int64) - NOON) // 86400
+
+
+def _align(f):
+    pad = -f.tell() % 8
+    if pad:
+        f.write(b"\0" * pad)
+    return f.tell()
+
+
+class RecordingWriter:
+    def __init__(self, path, index=True):
+        self.path = path
+        self.index = index
+        self._partial = path + ".part"
+        self._ts = open(self._partial, "w+b")
+        self._ts.seek(HEADER.size)
+        self._bpm = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+        self._nights = []
+        self._open = None       # [night, user, first sample] of the night being appended to
+        self._last_ts = None
+        self.samples = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, ts, bpm):
+        np.asarray(ts).astype("<u4", copy=False).tofile(self._ts)
+        np.asarray(bpm).astype("<u2", copy=False).tofile(self._bpm)
+        self.samples += len(ts)
+
+    def _end_night(self):
+        if self._open is not None:
+            _, user, start = self._open
+            if self.samples > start:
+                self._nights.append((start, self.samples, user, 0, 0, 0, 0))
+            self._open = None
+
+    def append(self, ts, bpm, user=0):
+        """Stream samples in time order; a new night starts at noon or when `user` changes."""
+        ts = np.asarray(ts, dtype=np.int64)
+        bpm = np.asarray(bpm)
+        if not len(ts):
+            return
+        continues = self._open is not None and self._open[1] == user
+        if (np.diff(ts) < 0).any() or (continues and ts[0] < self._last_ts):
+            raise ValueError("append() needs samples in time order")
+        nights = night_of(ts)
+        cuts = np.flatnonzero(np.diff(nights)) + 1
+        for lo, hi in zip(np.concatenate(([0], cuts)), np.concatenate((cuts, [len(ts)]))):
+            night = int(nights[lo])
+            if self._open is None or self._open[0] != night or self._open[1] != user:
+                self._end_night()
+                self._open = [night, user, self.samples]
+            self._write(ts[lo:hi], bpm[lo:hi])
+        self._last_ts = int(ts[-1])
+
+    def add_night(self, ts, bpm, user=0, resting_hr=0, onset=0, wake=0):
+        """Write one whole night with its index metadata (onset/wake: true timestamps or 0)."""
+        self._end_night()
+        start = self.samples
+        self._write(ts, bpm)
+        self._nights.append((start, self.samples, user, onset, wake, resting_hr, 0))
+        self._last_ts = None
+
+    def close(self):
+        if self._ts is None:
+            return
+        self._end_night()
+        f = self._ts
+        ts_offset = HEADER.size
+        bpm_offset = _align(f)
+        self._bpm.seek(0)
+        shutil.copyfileobj(self._bpm, f, CHUNK_SIZE * 16)
+        self._bpm.close()
+        index_offset = _align(f)
+        flags = 0
+        if self.index:
+            np.array(self._nights, dtype=INDEX_DTYPE).tofile(f)
+            flags |= HAS_INDEX
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, flags, INDEX_DTYPE.itemsize, self.samples,
+                            len(self._nights) if self.index else 0, ts_offset, bpm_offset, index_offset))
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.replace(self._partial, self.path)
+        self._ts = None
+
+
+class NightlyRecordingWriter:
+    """
+    Streams samples like RecordingWriter, but into one recording per night,
+    each closed as soon as a sample of a later night arrives. `pattern` names
+    the files with a {date} field (the night's evening); without one, the
+    date is added before the extension. A night whose file already exists
+    (e.g. after a restart) goes to <name>-2, <name>-3, ...
+    """
+
+    def __init__(self, pattern, index=True):
+        if "{date}" not in pattern:
+            root, ext = os.path.splitext(pattern)
+            pattern = f"{root}-{{date}}{ext}"
+        self.pattern = pattern
+        self.index = index
+        self.paths = []             # completed recordings, oldest first
+        self._writer = None
+        self._night = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open(self, night):
+        date = EPOCH + datetime.timedelta(days=night)
+        path = self.pattern.format(date=date.isoformat())
+        root, ext = os.path.splitext(path)
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = f"{root}-{n}{ext}"
+        self._writer = RecordingWriter(path, index=self.index)
+        self._night = night
+
+    def append(self, ts, bpm, user=0):
+        """Stream samples in time order, starting a new file at noon."""
+        ts = np.asarray(ts, dtype=np.int64)
+        bpm = np.asarray(bpm)
+        if not len(ts):
+            return
+        nights = night_of(ts)
+        cuts = np.flatnonzero(np.diff(nights)) + 1
+        for lo, hi in zip(np.concatenate(([0], cuts)), np.concatenate((cuts, [len(ts)]))):
+            night = int(nights[lo])
+            if night != self._night:
+                self.close()
+                self._open(night)
+            self._writer.append(ts[lo:hi], bpm[lo:hi], user=user)
+
+    def close(self):
+        """Complete the file of the night in progress."""
+        if self._writer is not None:
+            self._writer.close()
+            self.paths.append(self._writer.path)
+            self._writer = None
+            self._night = None
+
+
+def _map(path, dtype, offset, count):
+    if not count:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+class Recording:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            raise ValueError(f"{path}: too short for a recording header")
+        magic, version, flags, itemsize, samples, nights, ts_offset, bpm_offset, index_offset = HEADER.unpack(raw)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a heart-rate recording")
+        if version != VERSION or (flags & HAS_INDEX and itemsize != INDEX_DTYPE.itemsize):
+            raise ValueError(f"{path}: unsupported recording version {version}")
+        self.samples = samples
+        self.timestamps = _map(path, "<u4", ts_offset, samples)
+        self.bpm = _map(path, "<u2", bpm_offset, samples)
+        if flags & HAS_INDEX:
+            self.index = _map(path, INDEX_DTYPE, index_offset, nights)
+        else:
+            # No index: the whole recording is one night of an unknown user.
+            self.index = np.zeros(1 if samples else 0, dtype=INDEX_DTYPE)
+            if samples:
+                self.index["stop"] = samples
+
+    def __len__(self):
+        return self.index.shape[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.timestamps = self.bpm = self.index = None
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.bpm.nbytes + self.index.nbytes
+
+    def night(self, i):
+        """(ts, bpm) of night `i` as read-only views of the file."""
+        start, stop = int(self.index["start"][i]), int(self.index["stop"][i])
+        return self.timestamps[start:stop], self.bpm[start:stop]
+
+    def night_days(self):
+        """Day number of each night's evening (its first sample's night)."""
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        return night_of(self.timestamps[self.index["start"].astype(np.int64)])
+
+    def dates(self):
+        return [EPOCH + datetime.timedelta(days=int(d)) for d in self.night_days()]
+
+    def select(self, users=None, first=None, last=None):
+        """Positions of the nights of `users` whose evening falls in [first, last] (dates, inclusive)."""
+        keep = np.ones(len(self), dtype=bool)
+        if users is not None:
+            keep &= np.isin(self.index["user"], list(users))
+        if first is not None or last is not None:
+            days = self.night_days()
+            if first is not None:
+                keep &= days >= (first - EPOCH).days
+            if last is not None:
+                keep &= days <= (last - EPOCH).days
+        return np.flatnonzero(keep)
+
+    def series(self, i):
+        """Night `i` as a HeartRateSeries on the date of its evening (iterates as (datetime, bpm))."""
+        ts, bpm = self.night(i)
+        day = EPOCH + datetime.timedelta(days=int(night_of(ts[:1])[0])) if len(ts) else EPOCH
+        return HeartRateSeries(day, ts - (day - EPOCH).days * 86400, bpm)
+
+    def write(self, path, nights):
+        """Copy the nights at positions `nights` into a new recording at `path`."""
+        with RecordingWriter(path) as out:
+            for i in nights:
+                ts, bpm = self.night(i)
+                entry = self.index[i]
+                out.add_night(ts, bpm, int(entry["user"]), int(entry["resting_hr"]),
+                              int(entry["onset"]), int(entry["wake"]))
+
+
+def read_fitbit_json(f, day=None):
+    """
+    Decode one Fitbit intraday heart-rate response saved to the binary file
+    `f` into a HeartRateSeries. The day comes from the body's "dateTime"
+    unless given.
+    """
+    chunks = iter(lambda: f.read(CHUNK_SIZE), b"")
+    first = next(chunks, b"")
+    if day is None:
+        m = _DATE.search(first)
+        if not m:
+            raise ValueError("No dateTime in the response; pass the day explicitly")
+        day = datetime.date.fromisoformat(m.group(1).decode())
+    return parse_dataset(itertools.chain([first], chunks), day)
+
+
+def convert_fitbit(paths, writer, user=0):
+    """Append the Fitbit day responses at `paths` (any order) to `writer` as nights of `user`."""
+    days = []
+    for path in paths:
+        with open(path, "rb") as f:
+            days.append(read_fitbit_json(f))
+    days.sort(key=lambda s: s.day)
+    for series in days:
+        writer.append(local_seconds(series.day, series.seconds), series.bpm, user=user)
+    return len(days)
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def _info(args):
+    rec = Recording(args.recording)
+    print(f"{args.recording}: {rec.samples:,} samples, {len(rec)} nights, {rec.nbytes / 1e6:.1f} MB")
+    if len(rec):
+        users = np.unique(rec.index["user"])
+        dates = rec.dates()
+        print(f"users: {len(users)} ({', '.join(str(u) for u in users[:10])}{', ...' if len(users) > 10 else ''})")
+        print(f"nights: {min(dates)} to {max(dates)}")
+        if (rec.index["onset"] != 0).any():
+            print("sleep onset / wake-up truth: yes")
+
+
+def _convert(args):
+    with RecordingWriter(args.output) as out:
+        days = convert_fitbit(args.json, out, user=args.user)
+    rec = Recording(args.output)
+    print(f"{args.output}: {days} days, {rec.samples:,} samples, {len(rec)} nights")
+
+
+def _slice(args):
+    rec = Recording(args.recording)
+    nights = rec.select(args.user or None, args.first, args.last)
+    rec.write(args.output, nights)
+    print(f"{args.output}: {len(nights)} of {len(rec)} nights")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, convert and slice heart-rate recordings.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    info = commands.add_parser("info", help="summarize a recording")
+    info.add_argument("recording")
+    info.set_defaults(func=_info)
+
+    convert = commands.add_parser("convert", help="Fitbit intraday JSON day responses to a recording")
+    convert.add_argument("output")
+    convert.add_argument("json", nargs="+")
+    convert.add_argument("--user", type=int, default=0)
+    convert.set_defaults(func=_convert)
+
+    select = commands.add_parser("slice", help="copy the nights of some users and dates to a new recording")
+    select.add_argument("recording")
+    select.add_argument("output")
+    select.add_argument("--user", type=int, action="append", help="repeat for several users")
+    select.add_argument("--from", dest="first", type=_date, help="first night (date of its evening)")
+    select.add_argument("--to", dest="last", type=_date, help="last night, inclusive")
+    select.set_defaults(func=_slice)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Vectorized replay of the SleepDetector rules over whole recordings.
+
+`replay()` takes minute-of-day and bpm NumPy arrays and reproduces, sample
+for sample, what `hardware.detector.SleepDetector.process_heart_rate`
+would do when fed the same values in order: the sleep counter, lamp lock
+state and every LAMP_LOCK / SLEEP_DETECTED / WAKE_DETECTED event. It relies
+on two properties of the rules:
+
+- the sleep counter is just the length of the current run of low samples
+  (every non-low sample resets it), so it is a cumulative index difference;
+- `is_sleeping` and `lamps_locked` are set/reset flip-flops whose set and
+  reset conditions never hold on the same sample, so their value is decided
+  by the most recent set-or-reset sample, found with a running maximum.
+
+Several independent nights can be replayed in one call by passing the
+indices where a fresh detector starts in `starts`.
+
+Check equivalence with the scalar detector and time both from the repo root:
+    python -m hardware.replay --nights 500
+"""
+import argparse
+import time
+
+import numpy as np
+
+from hardware.detector import SLEEP_DETECTED, WAKE_DETECTED, SleepDetector
+
+LAMP_LOCK = "LAMP_LOCK"
+
+
+class ReplayResult:
+    def __init__(self, sleep_counter, is_sleeping, lamps_locked, lamp_lock, sleep, wake):
+        self.sleep_counter = sleep_counter  # counter after each sample
+        self.is_sleeping = is_sleeping      # is_sleeping after each sample
+        self.lamps_locked = lamps_locked    # lamps_locked after each sample
+        self.lamp_lock = lamp_lock          # bool mask: lamp locked on this sample
+        self.sleep = sleep                  # bool mask: SLEEP_DETECTED returned
+        self.wake = wake                    # bool mask: WAKE_DETECTED returned
+
+    def status(self):
+        """Per-sample return value of process_heart_rate (None, SLEEP_DETECTED or WAKE_DETECTED)."""
+        out = np.full(self.sleep.shape, None, dtype=object)
+        out[self.sleep] = SLEEP_DETECTED
+        out[self.wake] = WAKE_DETECTED
+        return out
+
+    def events(self):
+        """[(sample index, event)] in the order the scalar detector produces them."""
+        lock_idx = np.flatnonzero(self.lamp_lock)
+        sleep_idx = np.flatnonzero(self.sleep)
+        wake_idx = np.flatnonzero(self.wake)
+        idx = np.concatenate([lock_idx, sleep_idx, wake_idx])
+        # On the same sample the lamp lock happens before the sleep/wake decision.
+        rank = np.concatenate([np.zeros(len(lock_idx)), np.ones(len(sleep_idx) + len(wake_idx))])
+        names = np.array([LAMP_LOCK] * len(lock_idx) + [SLEEP_DETECTED] * len(sleep_idx) + [WAKE_DETECTED] * len(wake_idx))
+        order = np.lexsort((rank, idx))
+        return [(int(i), str(n)) for i, n in zip(idx[order], names[order])]
+
+
+def minute_to_hhmm(minute_of_day):
+    minute_of_day = np.asarray(minute_of_day)
+    return (minute_of_day // 60) * 100 + minute_of_day % 60
+
+
+def _flip_flop(set_mask, reset_mask, seg_start, index):
+    """
+    State after each sample of a flag that `set_mask` turns on and `reset_mask`
+    turns off (never both on one sample), starting False at every segment.
+    """
+    last = np.maximum.accumulate(np.where(set_mask | reset_mask, index, -1))
+    valid = last >= seg_start
+    return valid & set_mask[np.where(valid, last, 0)]
+
+
+def replay(minute_of_day, bpm, resting_hr, sleep_threshold=5, required_minutes=3, starts=None):
+    """
+    Replay the detector over `bpm` sampled at `minute_of_day` (0..1439).
+    `starts` lists the sample indices where a new detector begins (index 0
+    always does); state never carries across them.
+    """
+    bpm = np.asarray(bpm)
+    hhmm = minute_to_hhmm(minute_of_day)
+    n = bpm.shape[0]
+    index = np.arange(n)
+
+    seg_flags = np.zeros(n, dtype=bool)
+    if n:
+        seg_flags[0] = True
+    if starts is not None:
+        seg_flags[np.asarray(starts, dtype=np.int64)] = True
+    seg_start = np.maximum.accumulate(np.where(seg_flags, index, 0))
+
+    night = (hhmm >= 2000) | (hhmm <= 400)
+    midday = (hhmm >= 1200) & (hhmm <= 1959)
+    wake_window = (hhmm >= 401) & (hhmm <= 2359)
+
+    # Lamp lock: set by a below-resting sample at night, cleared at mid-day.
+    lock_set = (bpm < resting_hr) & night
+    lamps_locked = _flip_flop(lock_set, midday, seg_start, index)
+    locked_before = np.zeros(n, dtype=bool)
+    locked_before[1:] = lamps_locked[:-1]
+    locked_before[seg_flags] = False
+    lamp_lock = lock_set & ~locked_before
+
+    # Sleep counter: length of the current run of low samples.
+    low = bpm <= resting_hr - sleep_threshold
+    last_not_low = np.maximum.accumulate(np.where(~low, index, -1))
+    run_start = np.maximum(last_not_low + 1, seg_start)
+    sleep_counter = np.where(low, index - run_start + 1, 0)
+
+    # Sleeping: set once the run is long enough, cleared by a wake-up sample.
+    sleep_set = low & (sleep_counter >= required_minutes)
+    wake_set = ~low & (bpm > resting_hr) & wake_window
+    is_sleeping = _flip_flop(sleep_set, wake_set, seg_start, index)
+    sleeping_before = np.zeros(n, dtype=bool)
+    sleeping_before[1:] = is_sleeping[:-1]
+    sleeping_before[seg_flags] = False
+
+    return ReplayResult(
+        sleep_counter=sleep_counter,
+        is_sleeping=is_sleeping,
+        lamps_locked=lamps_locked,
+        lamp_lock=lamp_lock,
+        sleep=sleep_set & ~sleeping_before,
+        wake=wake_set & sleeping_before,
+    )
+
+
+def replay_scalar(minute_of_day, bpm, resting_hr, sleep_threshold=5, required_minutes=3, starts=None):
+    """Reference: the same replay, one SleepDetector.process_heart_rate call per sample."""
+    starts = set(int(s) for s in (starts if starts is not None else ())) | {0}
+    events = []
+    position = [0]
+    detector = None
+    for i, (m, hr) in enumerate(zip(np.asarray(minute_of_day).tolist(), np.asarray(bpm).tolist())):
+        position[0] = i
+        if i in starts:
+            detector = SleepDetector(resting_hr, sleep_threshold, required_minutes,
+                                     on_lamp_lock=lambda: events.append((position[0], LAMP_LOCK)))
+        status = detector.process_heart_rate(hr, (m // 60) * 100 + m % 60)
+        if status is not None:
+            events.append((i, status))
+    return events
+
+
+def synthetic_nights(nights, resting_hr=65, seed=0):
+    """Random 19:00-12:00 one-minute nights with a noisy sleep dip; returns (minute, bpm, starts)."""
+    rng = np.random.default_rng(seed)
+    minutes = (np.arange(19 * 60, 36 * 60) % 1440).astype(np.int64)
+    per_night = minutes.shape[0]
+    t = np.linspace(0.0, 1.0, per_night)
+    dip = 12 * np.exp(-((t - 0.45) / 0.22) ** 2)
+    bpm = resting_hr + 6 - dip[None, :] + rng.normal(0, 3, size=(nights, per_night))
+    bpm = np.clip(np.rint(bpm), 35, 200).astype(np.int64)
+    starts = np.arange(nights) * per_night
+    return np.tile(minutes, nights), bpm.ravel(), starts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time the vectorized replay against the scalar detector.")
+    parser.add_argument("--nights", type=int, default=200)
+    parser.add_argument("--resting-hr", type=int, default=65)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    minute, bpm, starts = synthetic_nights(args.nights, args.resting_hr, args.seed)
+    print(f"{args.nights} nights, {bpm.shape[0]} samples")
+
+    t0 = time.perf_counter()
+    expected = replay_scalar(minute, bpm, args.resting_hr, starts=starts)
+    t1 = time.perf_counter()
+    result = replay(minute, bpm, args.resting_hr, starts=starts)
+    got = result.events()
+    t2 = time.perf_counter()
+
+    print(f"scalar:     {t1 - t0:8.3f} s  ({bpm.shape[0] / (t1 - t0):,.0f} samples/s)")
+    print(f"vectorized: {t2 - t1:8.3f} s  ({bpm.shape[0] / (t2 - t1):,.0f} samples/s)")
+    print(f"events: {len(got)}")
+    if got != expected:
+        mismatch = next(i for i, (a, b) in enumerate(zip(got + [None], expected + [None])) if a != b)
+        raise SystemExit(f"MISMATCH at event {mismatch}: vectorized={got[mismatch:mismatch + 3]} scalar={expected[mismatch:mismatch + 3]}")
+    print("OK: identical events")
+
+
+if __name__ == "__main__":
+    main()
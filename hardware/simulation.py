@@ -0,0 +1,292 @@
+"""
+Virtual-time simulation of the Pi controller.
+
+A Simulation runs the real Controller, detector and actuator executor with
+no threads, no sleeping and no hardware:
+
+- VirtualClock is the only clock; it jumps from one sample, or servo step
+  deadline, to the next.
+- RecordingGPIO stands in for RPi.GPIO and appends every pin and PWM
+  transition, stamped with the virtual time, to an in-memory trace instead
+  of printing.
+- StaticApi answers the settings GETs from a dict and records the POSTs the
+  journal flusher sends.
+
+Samples are averaged per clock minute before they reach the detector, as
+the server's /hr/batch does, because its `required_minutes` counter assumes
+one reading per minute. A minute's average is processed when the minute
+ends, which is when it would be known on the Pi.
+
+A night of 1-second samples replays in a fraction of a second and leaves
+an assertable actuation timeline:
+
+    sim = Simulation()
+    sim.run(samples)            # (datetime, bpm) pairs, e.g. a HeartRateSeries
+    sim.timeline()              # [(datetime, "lamp", "OFF"), (datetime, "servo", 2.5), ...]
+
+From the repo root, simulate a synthetic 19:00-12:00 night of 1-second
+samples (add --timeline to print every transition):
+    python -m hardware.simulation --seconds-per-sample 1
+"""
+import argparse
+import datetime
+import time
+
+try:
+    from controller import DEMO_SAMPLES, Controller  # run as a script from hardware/
+except ImportError:
+    from hardware.controller import DEMO_SAMPLES, Controller
+
+DEFAULT_SETTINGS = {
+    "/device/settings": {
+        "lights": {"sleepingStatus": True, "notSleepingStatus": True, "active": False},
+        "curtain": {"sleepingStatus": True, "notSleepingStatus": True, "active": False},
+    },
+}
+
+
+class VirtualClock:
+    """Unix seconds that move only when told to; callable like time.monotonic."""
+
+    def __init__(self, now=0.0):
+        self.now = float(now)
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, t):
+        if t > self.now:
+            self.now = float(t)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class _RecordingPWM:
+    def __init__(self, gpio, pin, freq):
+        self._gpio = gpio
+        self.pin = pin
+        self.freq = freq
+        self.duty = None
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        if duty != self.duty:
+            self.duty = duty
+            self._gpio.record(self.pin, "duty", duty)
+
+    def ChangeFrequency(self, freq):
+        self.freq = freq
+
+    def stop(self):
+        self.ChangeDutyCycle(0)
+
+
+class RecordingGPIO:
+    """RPi.GPIO look-alike that records transitions as (time, pin, kind, value) into `trace`."""
+
+    BCM = "BCM"; BOARD = "BOARD"; OUT = "OUT"; IN = "IN"; LOW = 0; HIGH = 1
+    PUD_UP = "PUD_UP"; PUD_DOWN = "PUD_DOWN"
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.trace = []
+        self.pins = {}
+
+    def record(self, pin, kind, value):
+        self.trace.append((self.clock(), pin, kind, value))
+
+    def setmode(self, mode): pass
+    def setwarnings(self, flag): pass
+
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        self.pins[pin] = self.LOW if initial is None else initial
+
+    def output(self, pin, value):
+        if self.pins.get(pin) != value:
+            self.pins[pin] = value
+            self.record(pin, "output", value)
+
+    def input(self, pin):
+        return self.pins.get(pin, self.LOW)
+
+    def PWM(self, pin, freq):
+        return _RecordingPWM(self, pin, freq)
+
+    def cleanup(self):
+        self.pins.clear()
+
+
+class StaticApi:
+    """API client stand-in: settings from a dict, POSTs recorded with the virtual time."""
+
+    def __init__(self, clock, settings=None):
+        self.clock = clock
+        self.settings = dict(DEFAULT_SETTINGS if settings is None else settings)
+        self.posts = []
+
+    def get_json(self, path, deadline=None):
+        return self.settings.get(path)
+
+    def post_json(self, path, payload, deadline=None):
+        self.posts.append((self.clock(), path, payload))
+        return {"ok": True}
+
+    def close(self):
+        pass
+
+
+class Simulation:
+    def __init__(self, settings=None, **controller_options):
+        self.clock = VirtualClock()
+        self.gpio = RecordingGPIO(self.clock)
+        self.api = StaticApi(self.clock, settings)
+        options = dict(journal_path=":memory:", verbose=False)
+        options.update(controller_options)
+        self.controller = Controller(gpio=self.gpio, api=self.api, clock=self.clock, wall_clock=self.clock,
+                                     background=False, **options)
+        self.events = []
+
+    def advance_to(self, t):
+        """Move the clock to `t`, applying every servo step that falls due on the way."""
+        actuators = self.controller.actuators
+        while True:
+            deadline = actuators.next_deadline()
+            if deadline is None or deadline > t:
+                break
+            self.clock.advance_to(deadline)
+            actuators.pump()
+        self.clock.advance_to(t)
+        actuators.pump()
+
+    def run(self, samples, lamp_on=True):
+        """
+        Feed (datetime, bpm) samples through the controller in virtual time,
+        one per-minute average at a time, let the last motion finish and
+        flush the journal. Returns the [(datetime, event)] sleep/wake
+        transitions, stamped with the start of the minute that caused them.
+        """
+        controller = self.controller
+        minutes = per_minute(samples)
+        first = next(minutes, None)
+        if first is None:
+            return []
+        self.clock.advance_to(first[0].timestamp())
+        controller.start()
+        actuators = controller.actuators
+        if lamp_on:
+            actuators.lamp(True)
+            actuators.pump()
+        process = controller.process_sample
+        clock = self.clock
+        for minute, closed_at, bpm in _chain(first, minutes):
+            t = closed_at.timestamp()
+            deadline = actuators.next_deadline()
+            if deadline is not None and deadline <= t:
+                self.advance_to(t)
+            clock.advance_to(t)
+            status = process(bpm, f"{minute:%H:%M}")
+            if status is not None:
+                self.events.append((minute, status))
+            actuators.pump()
+        while actuators.next_deadline() is not None:
+            self.advance_to(actuators.next_deadline())
+        controller.close()
+        return self.events
+
+    def timeline(self):
+        """The trace as [(datetime, "lamp" | "servo" | pin, value)], lamp values as "ON"/"OFF"."""
+        names = {self.controller.lamp_pin: "lamp", self.controller.servo_pin: "servo"}
+        out = []
+        for t, pin, kind, value in self.gpio.trace:
+            name = names.get(pin, pin)
+            if name == "lamp":
+                value = "ON" if value == self.gpio.HIGH else "OFF"
+            out.append((datetime.datetime.fromtimestamp(t), name, value))
+        return out
+
+
+ONE_MINUTE = datetime.timedelta(minutes=1)
+
+
+def per_minute(samples):
+    """
+    Average (datetime, bpm) samples per clock minute. Yields (minute start,
+    closed at, mean bpm) where `closed at` is the end of the minute or, when
+    the next sample comes sooner, that sample's time (the last sample's, for
+    the final minute).
+    """
+    minute, total, count, last = None, 0, 0, None
+    for ts, bpm in samples:
+        start = ts.replace(second=0, microsecond=0)
+        if start != minute:
+            if count:
+                yield minute, min(ts, minute + ONE_MINUTE), total / count
+            minute, total, count = start, 0, 0
+        total += bpm
+        count += 1
+        last = ts
+    if count:
+        yield minute, last, total / count
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def demo_night(date):
+    """DEMO_SAMPLES as (datetime, bpm) of the night starting on `date`."""
+    night = []
+    for bpm, hhmm in DEMO_SAMPLES:
+        t = datetime.time.fromisoformat(hhmm)
+        day = date if t.hour >= 12 else date + datetime.timedelta(days=1)
+        night.append((datetime.datetime.combine(day, t), bpm))
+    return night
+
+
+def synthetic_night(date, resting_hr=65, seconds_per_sample=1, seed=0):
+    """A 19:00-12:00 night with a noisy sleep dip, as (datetime, bpm) pairs."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime.combine(date, datetime.time(19, 0))
+    n = 17 * 3600 // seconds_per_sample
+    t = np.linspace(0.0, 1.0, n)
+    bpm = resting_hr + 6 - 12 * np.exp(-((t - 0.45) / 0.22) ** 2) + rng.normal(0, 3, size=n)
+    bpm = np.clip(np.rint(bpm), 35, 200).astype(int).tolist()
+    step = datetime.timedelta(seconds=seconds_per_sample)
+    return [(start + i * step, b) for i, b in enumerate(bpm)]
+
+
+def print_timeline(sim):
+    for ts, name, value in sim.timeline():
+        print(f"{ts:%Y-%m-%d %H:%M:%S.%f}"[:-3], f"{name:6s}", value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a synthetic night through the controller in virtual time.")
+    parser.add_argument("--date", default="2026-01-15")
+    parser.add_argument("--resting-hr", type=int, default=65)
+    parser.add_argument("--seconds-per-sample", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeline", action="store_true", help="print every pin and PWM transition")
+    args = parser.parse_args()
+
+    samples = synthetic_night(datetime.date.fromisoformat(args.date), args.resting_hr,
+                              args.seconds_per_sample, args.seed)
+    sim = Simulation(resting_hr=args.resting_hr)
+    t0 = time.perf_counter()
+    events = sim.run(samples)
+    elapsed = time.perf_counter() - t0
+
+    if args.timeline:
+        print_timeline(sim)
+    print(f"{len(samples)} samples, {sim.controller.samples} minutes, {len(events)} sleep/wake events, {len(sim.api.posts)} POSTs, "
+          f"simulated in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Server-side streaming sleep detection for uploaded heart-rate batches.
+
+Each household keeps one SleepDetector plus a little streaming state between
+batches. Samples are averaged per local minute before they reach the
+detector, because its `required_minutes` counter assumes one reading per
+minute; a minute is only fed once a sample from a later minute arrives, so a
+minute split across two uploads is still counted once.
+
+feed() works on a copy of the household's state and commit() installs it, so
+a caller that fails to store a detected transition can leave the state alone
+and the resent batch is detected again instead of being deduplicated away.
+"""
+import asyncio
+import copy
+import time
+
+from hardware.detector import SleepDetector
+
+
+class _HouseholdStream:
+    def __init__(self, detector):
+        self.detector = detector
+        self.last_ts = None        # newest sample timestamp accepted
+        self.minute = None         # local minute index of the open bucket
+        self.minute_ts = None      # first timestamp in the open bucket
+        self.bpm_sum = 0
+        self.bpm_count = 0
+        self.last_seen = time.monotonic()
+
+
+class HeartRateIngestor:
+    def __init__(self, max_households=10000):
+        self._max_households = max_households
+        self._streams = {}
+        self._locks = {}
+
+    def lock(self, household_id):
+        """asyncio.Lock to hold from feed() until commit(), so batches of one household apply in order."""
+        return self._locks.setdefault(household_id, asyncio.Lock())
+
+    def _stream(self, household_id, resting_hr, sleep_threshold, required_minutes):
+        stream = self._streams.get(household_id)
+        if stream is None:
+            if len(self._streams) >= self._max_households:
+                oldest = min(self._streams, key=lambda h: self._streams[h].last_seen)
+                del self._streams[oldest]
+                self._locks.pop(oldest, None)
+            stream = _HouseholdStream(SleepDetector(resting_hr, sleep_threshold, required_minutes))
+            self._streams[household_id] = stream
+        else:
+            stream.detector.resting_hr = resting_hr
+            stream.detector.sleep_threshold = sleep_threshold
+            stream.detector.required_minutes = required_minutes
+        stream.last_seen = time.monotonic()
+        return stream
+
+    def feed(self, household_id, samples, resting_hr, tz_offset_minutes=0, sleep_threshold=5, required_minutes=3):
+        """
+        Run (unix timestamp, bpm) samples for a household through a copy of
+        its state and return (events, stream): the detector events they
+        complete, oldest first, as dicts with 'timestamp', 'time' (local
+        HH:MM) and 'event', and the advanced state to pass to commit().
+        Samples at or before the newest timestamp already committed are
+        ignored.
+        """
+        stream = copy.deepcopy(self._stream(household_id, resting_hr, sleep_threshold, required_minutes))
+        detector = stream.detector
+        events = []
+
+        def _close_minute():
+            bpm = stream.bpm_sum / stream.bpm_count
+            minute_of_day = stream.minute % 1440
+            hhmm = (minute_of_day // 60) * 100 + minute_of_day % 60
+            ts = stream.minute_ts
+            locked_before = detector.lamps_locked
+            status = detector.process_heart_rate(bpm, hhmm)
+            label = f"{hhmm // 100:02d}:{hhmm % 100:02d}"
+            if detector.lamps_locked and not locked_before:
+                events.append({"timestamp": ts, "time": label, "event": "LAMP_LOCK"})
+            if status is not None:
+                events.append({"timestamp": ts, "time": label, "event": status})
+
+        for ts, bpm in sorted(samples):
+            if stream.last_ts is not None and ts <= stream.last_ts:
+                continue
+            stream.last_ts = ts
+            minute = (int(ts) + tz_offset_minutes * 60) // 60
+            if stream.minute is not None and minute != stream.minute:
+                _close_minute()
+                stream.bpm_sum = stream.bpm_count = 0
+            if stream.bpm_count == 0:
+                stream.minute = minute
+                stream.minute_ts = ts
+            stream.bpm_sum += bpm
+            stream.bpm_count += 1
+
+        return events, stream
+
+    def commit(self, household_id, stream):
+        """Make `stream` (from feed()) the household's state."""
+        stream.last_seen = time.monotonic()
+        self._streams[household_id] = stream
+
+    def stats(self):
+        return {"households": len(self._streams)}
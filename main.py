@@ -1,34 +1,142 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()  # cold-start clock, started before the heavier imports below
+
 import os
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hashlib
+import json
+import zlib
+from typing import List, Optional, Tuple
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import firebase_admin
-from firebase_admin import credentials, firestore
 from fastapi.middleware.cors import CORSMiddleware
+from doc_paths import DEFAULT_HOUSEHOLD_ID, DEVICES, DOC_PATH_RE, HOUSEHOLD_ID_RE, device_doc, household_docs, state_doc
+from events import EventBroker, format_sse
+from hr_ingest import HeartRateIngestor
+import metrics
+from storage import InvalidDocumentError, create_storage_from_env
+
+# Storage backend (STORAGE_BACKEND=firestore|memory|sqlite, default firestore).
+# Created in the background once the app has started (see lifespan), so the
+# port is bound without waiting for Firestore. None until then, and for good
+# if the backend could not be initialized: data endpoints then return 503.
+_storage = None
+
+# Warm-up after init: open the backend connection and pre-read the default
+# household's documents before /readyz reports ready (STARTUP_WARMUP=0 skips it).
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
+# How long a request arriving during startup waits for the backend before a 503.
+STARTUP_WAIT_SECONDS = float(os.getenv("STARTUP_WAIT_SECONDS", "10"))
+_startup_task = None
+_startup = {
+    "phase": "starting",  # starting -> warming_up -> ready | failed
+    "import_seconds": None,
+    "storage_init_seconds": None,
+    "warmup_seconds": None,
+    "cold_start_seconds": None,  # module import until ready
+    "error": None,
+}
+
+# Push channel: cache listener changes are fanned out to /events subscribers
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "32"))
+PUSH_KEEPALIVE_SECONDS = float(os.getenv("PUSH_KEEPALIVE_SECONDS", "15"))
+_event_broker = EventBroker(max_queue=PUSH_QUEUE_SIZE)
+
+
+def _change_event(path, doc):
+    """Map a changed document to (household_id, event type, payload), or None."""
+    match = DOC_PATH_RE.match(path)
+    if match is None:
+        return None
+    household_id, device = match.group("household"), match.group("device")
+    data = doc.to_dict() if doc.exists else None
+    if device is None:
+        return household_id, "state", {"isSleeping": data.get("isSleeping") if data else None}
+    return household_id, "device", {"device": device, **(data or {})}
+
+
+def _on_document_change(path, doc):
+    event = _change_event(path, doc)
+    if event is not None:
+        household_id, event_type, data = event
+        _event_broker.publish_threadsafe(household_id, (event_type, data))
+
+
+async def _start_storage():
+    """Create the storage backend (unless one was injected before startup) and warm it up."""
+    global _storage
+    t0 = time.perf_counter()
+    if _storage is None:
+        try:
+            storage = await run_in_threadpool(create_storage_from_env)
+        except Exception as e:
+            _startup.update(phase="failed", error=f"storage backend could not be initialized: {e}")
+            metrics.STORAGE_AVAILABLE.set(0)
+            print(f"[WARN] Storage backend init failed: {e}; data endpoints will return 503")
+            return
+        if storage is None:
+            _startup.update(phase="failed", error="storage backend could not be initialized")
+            metrics.STORAGE_AVAILABLE.set(0)
+            print("[WARN] Storage backend unavailable; data endpoints will return 503")
+            return
+        storage.add_change_callback(_on_document_change)
+        _storage = storage
+    metrics.STORAGE_AVAILABLE.set(1)
+    t1 = time.perf_counter()
+    _startup["storage_init_seconds"] = t1 - t0
+
+    if STARTUP_WARMUP:
+        _startup["phase"] = "warming_up"
+        try:
+            await _storage.warm_up(household_docs(DEFAULT_HOUSEHOLD_ID))
+        except Exception as e:
+            # Not fatal: requests still work, they just pay the connection setup.
+            print(f"[WARN] Storage warm-up failed: {e}")
+        _startup["warmup_seconds"] = time.perf_counter() - t1
+
+    _startup["phase"] = "ready"
+    _startup["cold_start_seconds"] = time.perf_counter() - _IMPORT_STARTED
+    metrics.COLD_START_SECONDS.set(_startup["cold_start_seconds"])
+    print(f"[INFO] Ready {_startup['cold_start_seconds']:.2f}s after import "
+          f"(storage init {_startup['storage_init_seconds']:.2f}s, warm-up {_startup['warmup_seconds'] or 0:.2f}s)")
+
+
+async def _storage_ready():
+    """
+    True once the storage backend is available. During startup, waits up to
+    STARTUP_WAIT_SECONDS for it instead of failing the request right away.
+    """
+    task = _startup_task
+    if _storage is None and task is not None and not task.done():
+        try:
+            await asyncio.wait_for(asyncio.shield(task), STARTUP_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    return _storage is not None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _startup_task
+    _event_broker.bind(asyncio.get_running_loop())
+    _startup_task = asyncio.create_task(_start_storage())
+    yield
+    _event_broker.unbind()
+    if not _startup_task.done():
+        _startup_task.cancel()
+    if _storage is not None:
+        _storage.close()
 
-# Firestore initialization (safe)
-_firestore_client = None
-_firebase_available = False
-if os.path.exists("serviceAccountKey.json"):
-    try:
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(cred)
-        _firestore_client = firestore.client()
-        _firebase_available = True
-        print("[INFO] Firestore initialized")
-    except Exception as e:
-        print(f"[WARN] Firestore init failed: {e}")
-else:
-    print("[WARN] serviceAccountKey.json not found. Firestore disabled for this process.")
-
-# Document paths (Firestore)
-DOC_STATE = "state/update"          # document path
-DOC_DEVICE_LIGHTS = "device/lights"
-DOC_DEVICE_CURTAIN = "device/curtain"
 
 app = FastAPI(
     title="Smartwatch Automation API",
-    description="Controls curtain + light state based on sleeping status (Firestore backend).",
+    description="Controls curtain + light state based on sleeping status (Firestore, SQLite or in-memory backend).",
     version="1.0",
+    lifespan=lifespan,
 )
 
 # Allow CORS (set ALLOWED_ORIGINS env var to comma-separated list, default "*")
@@ -45,151 +153,446 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.PrometheusMiddleware, fastapi_app=app)
 
 # ---------------- MODELS ----------------
 class SleepState(BaseModel):
     isSleeping: bool
 
 
+class SleepEvent(BaseModel):
+    isSleeping: bool
+    timestamp: Optional[float] = None  # unix seconds when the device detected it
+
+
+class SleepEventBatch(BaseModel):
+    events: List[SleepEvent]  # oldest first
+
+
 class DeviceSettingUpdate(BaseModel):
     device: str  # 'lights' or 'curtain'
     setting: str  # 'sleepingStatus' or 'notSleepingStatus'
     value: bool
 
 
-# ---------------- HELPERS ----------------
-def _ensure_device_doc(ref):
-    doc = ref.get()
-    if not doc.exists:
-        default = {"sleepingStatus": False, "notSleepingStatus": True, "active": False}
-        ref.set(default)
-        return default
-    return doc.to_dict()
+class HeartRateBatch(BaseModel):
+    samples: List[Tuple[int, int]]  # (unix timestamp in seconds, bpm)
+    restingHr: int = 65
+    sleepThreshold: int = 5
+    requiredMinutes: int = 3
+    tzOffsetMinutes: int = 0  # household's local time = UTC + offset
 
 
-def update_device_states(is_sleeping: bool):
+# ---------------- HELPERS ----------------
+MAX_HR_BATCH_SAMPLES = int(os.getenv("MAX_HR_BATCH_SAMPLES", "100000"))
+# Limit on the (decompressed) /hr/batch body; a [timestamp, bpm] pair is ~20 bytes of JSON
+MAX_HR_BATCH_BYTES = int(os.getenv("MAX_HR_BATCH_BYTES", str(64 * MAX_HR_BATCH_SAMPLES)))
+MAX_SLEEP_EVENT_BATCH = int(os.getenv("MAX_SLEEP_EVENT_BATCH", "1000"))
+_hr_ingestor = HeartRateIngestor()
+
+# Sleep transitions committed, suppressed because nothing changed, or skipped
+# as stale (only touched from the event loop, so no lock is needed)
+_write_stats = {"committed": 0, "suppressed": 0, "stale": 0}
+_OUTCOME_MESSAGES = {
+    "committed": "State updated successfully",
+    "suppressed": "State unchanged; write skipped",
+    "stale": "Event older than the current state; write skipped",
+}
+
+
+def get_household_id(
+    household: str = Query(DEFAULT_HOUSEHOLD_ID, description="Household the request applies to."),
+):
+    if not HOUSEHOLD_ID_RE.match(household):
+        raise HTTPException(status_code=400, detail="Invalid household id. Use 1-64 letters, digits, '-' or '_'.")
+    return household
+
+
+def _storage_unavailable(detail):
+    """503 for a request that needs the storage backend when none is initialized (counted in /metrics)."""
+    metrics.STORAGE_UNAVAILABLE.inc()
+    if _startup["phase"] == "starting":
+        detail = "Storage backend is still starting"
+    return HTTPException(status_code=503, detail=detail)
+
+
+def _settings_etag(docs):
     """
-    Reads device docs (sleepingStatus / notSleepingStatus) from Firestore
-    and updates the 'active' field for both lights and curtain.
+    Strong ETag for a set of device documents, derived from their paths and
+    versions (Firestore update times; a missing document contributes a fixed marker).
     """
-    if not _firebase_available:
-        raise HTTPException(status_code=503, detail="Firestore not initialized on server.")
-
-    try:
-        lights_ref = _firestore_client.document(DOC_DEVICE_LIGHTS)
-        curtain_ref = _firestore_client.document(DOC_DEVICE_CURTAIN)
+    h = hashlib.sha1()
+    for doc in docs:
+        version = doc.version if doc.exists and doc.version else "-"
+        h.update(f"{doc.path}@{version};".encode("utf-8"))
+    return f'"{h.hexdigest()}"'
 
-        lights = _ensure_device_doc(lights_ref)
-        curtain = _ensure_device_doc(curtain_ref)
 
-        if is_sleeping:
-            new_light_state = lights.get("sleepingStatus")
-            new_curtain_state = curtain.get("sleepingStatus")
-        else:
-            new_light_state = lights.get("notSleepingStatus")
-            new_curtain_state = curtain.get("notSleepingStatus")
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in (c[2:] if c.startswith("W/") else c for c in candidates)
 
-        if new_light_state is None or new_curtain_state is None:
-            raise HTTPException(status_code=400, detail="Device configuration missing required fields.")
 
-        lights_ref.update({"active": new_light_state})
-        curtain_ref.update({"active": new_curtain_state})
+async def commit_sleep_transition(household_id: str, is_sleeping: bool, event_time: Optional[float] = None):
+    """
+    Applies a household's sleep transition atomically:
+    - its state doc's isSleeping and eventTime
+    - the 'active' field of every device according to its settings
+      (missing device docs are created with the default settings)
+    Either every document is updated or none is. Documents already in the
+    target state are not rewritten, and when nothing changes no write is
+    made at all. A transition whose event_time (unix seconds, default now)
+    is older than the stored eventTime is stale and is not written either;
+    event times in the future are clamped to now, so a device with a fast
+    clock cannot make every later transition look stale.
+    Returns (device states, outcome: "committed", "suppressed" or "stale").
+    """
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized on server.")
 
-        return {"lights_active": new_light_state, "curtain_active": new_curtain_state}
-    except HTTPException:
-        raise
+    now = time.time()
+    event_time = now if event_time is None else min(event_time, now)
+    try:
+        result, outcome = await _storage.commit_sleep_transition(household_id, is_sleeping, event_time)
+    except InvalidDocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Firestore error: {e}")
+        raise HTTPException(status_code=500, detail=f"Storage error: {e}")
+
+    _write_stats[outcome] += 1
+    metrics.SLEEP_TRANSITIONS.labels(outcome).inc()
+    return result, outcome
 
 
 # ---------------- ENDPOINTS ----------------
 @app.post("/update-sleep")
-def set_sleep_status(state: SleepState):
+async def set_sleep_status(state: SleepState, household_id: str = Depends(get_household_id)):
     """
-    Called by hardware (or app). Updates:
-    - state/update (Firestore doc) → isSleeping
-    - device/lights.active and device/curtain.active according to settings
+    Called by hardware (or app). Atomically updates, for the household:
+    - households/{id}/state/update → isSleeping
+    - households/{id}/devices/{lights,curtain}.active according to settings
     """
-    if not _firebase_available:
-        raise HTTPException(status_code=503, detail="Firestore not initialized on server.")
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized on server.")
 
     try:
-        # 1) Update global state doc
-        state_ref = _firestore_client.document(DOC_STATE)
-        state_ref.set({"isSleeping": state.isSleeping}, merge=True)
-
-        # 2) Update devices according to rules
-        result = update_device_states(state.isSleeping)
+        result, outcome = await commit_sleep_transition(household_id, state.isSleeping)
 
-        return {"message": "State updated successfully", "isSleeping": state.isSleeping, "updated_device_states": result}
+        return {
+            "message": _OUTCOME_MESSAGES[outcome],
+            "householdId": household_id,
+            "isSleeping": state.isSleeping,
+            "noop": outcome != "committed",
+            "stale": outcome == "stale",
+            "updated_device_states": result,
+        }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update sleep state: {e}")
 
 
+@app.post("/update-sleep/batch")
+async def replay_sleep_events(batch: SleepEventBatch, household_id: str = Depends(get_household_id)):
+    """
+    Sleep/wake events a device journaled while it could not reach the
+    server, oldest first. Every event sets the state outright, so replaying
+    them in order ends where the last one does: only that one is committed
+    (like /update-sleep) and the earlier ones are acknowledged without a
+    write. The commit carries the event's own timestamp, so a journal
+    flushed after a newer transition was stored (from /hr/batch or the app)
+    does not overwrite it. Re-sending a batch whose response was lost is
+    harmless.
+    """
+    if len(batch.events) > MAX_SLEEP_EVENT_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_SLEEP_EVENT_BATCH} events).")
+    if not batch.events:
+        return {"message": "No events", "householdId": household_id, "accepted": 0}
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized on server.")
+
+    last = batch.events[-1]
+    result, outcome = await commit_sleep_transition(household_id, last.isSleeping, last.timestamp)
+    return {
+        "message": _OUTCOME_MESSAGES[outcome],
+        "householdId": household_id,
+        "accepted": len(batch.events),
+        "isSleeping": last.isSleeping,
+        "noop": outcome != "committed",
+        "stale": outcome == "stale",
+        "updated_device_states": result,
+    }
+
+
 @app.post("/device/update-setting")
-def update_device_setting(update: DeviceSettingUpdate):
+async def update_device_setting(update: DeviceSettingUpdate, household_id: str = Depends(get_household_id)):
     """
     Called by the app when the user toggles a setting.
-    Updates device/{device}.{setting} and preserves other fields.
+    Updates households/{id}/devices/{device}.{setting} and preserves other fields.
     """
-    if not _firebase_available:
-        raise HTTPException(status_code=503, detail="Firestore not initialized on server.")
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized on server.")
 
     device = update.device
     setting = update.setting
     value = update.value
 
-    if device not in ("lights", "curtain"):
+    if device not in DEVICES:
         raise HTTPException(status_code=400, detail="Invalid device. Must be 'lights' or 'curtain'.")
 
     if setting not in ("sleepingStatus", "notSleepingStatus"):
         raise HTTPException(status_code=400, detail="Invalid setting. Must be 'sleepingStatus' or 'notSleepingStatus'.")
 
     try:
-        ref = _firestore_client.document(f"device/{device}")
-        # ensure document exists
-        _ensure_device_doc(ref)
-        # update single field
-        ref.update({setting: value})
-        return {"message": "Device setting updated", "device": device, "setting": setting, "value": value}
+        await _storage.update_device_setting(household_id, device, setting, value)
+        return {
+            "message": "Device setting updated",
+            "householdId": household_id,
+            "device": device,
+            "setting": setting,
+            "value": value,
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update device setting: {e}")
 
 
+@app.post("/hr/batch")
+async def ingest_heart_rate(request: Request, household_id: str = Depends(get_household_id)):
+    """
+    Called by thin clients with a batch of heart-rate samples (the body may be
+    gzip-compressed with Content-Encoding: gzip). Samples run through the
+    household's server-side SleepDetector; if the batch completes a sleep or
+    wake transition, the latest one is committed like /update-sleep. Bodies
+    over MAX_HR_BATCH_BYTES (compressed or decompressed) or with more than
+    MAX_HR_BATCH_SAMPLES samples are rejected with 413.
+    """
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized on server.")
+
+    too_large = HTTPException(status_code=413, detail=f"Batch too large (max {MAX_HR_BATCH_BYTES} bytes).")
+    try:
+        content_length = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header.")
+    if content_length > MAX_HR_BATCH_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_HR_BATCH_BYTES:
+            raise too_large
+
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = inflater.decompress(body, MAX_HR_BATCH_BYTES + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+        if len(data) > MAX_HR_BATCH_BYTES or inflater.unconsumed_tail:
+            raise too_large
+        if not inflater.eof:
+            raise HTTPException(status_code=400, detail="Invalid gzip body: truncated stream")
+        body = data
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid heart-rate batch: {e}")
+    if isinstance(payload, dict) and isinstance(payload.get("samples"), list) \
+            and len(payload["samples"]) > MAX_HR_BATCH_SAMPLES:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_HR_BATCH_SAMPLES} samples).")
+    try:
+        batch = HeartRateBatch(**payload)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid heart-rate batch: {e}")
+
+    # The detector state only advances once a detected transition is stored,
+    # so a batch that failed with a 5xx can be resent and is detected again.
+    async with _hr_ingestor.lock(household_id):
+        events, stream = _hr_ingestor.feed(
+            household_id,
+            batch.samples,
+            resting_hr=batch.restingHr,
+            tz_offset_minutes=batch.tzOffsetMinutes,
+            sleep_threshold=batch.sleepThreshold,
+            required_minutes=batch.requiredMinutes,
+        )
+
+        transitions = [e for e in events if e["event"] in ("SLEEP_DETECTED", "WAKE_DETECTED")]
+        result, outcome = None, None
+        if transitions:
+            latest = transitions[-1]
+            result, outcome = await commit_sleep_transition(
+                household_id, latest["event"] == "SLEEP_DETECTED", latest["timestamp"]
+            )
+        _hr_ingestor.commit(household_id, stream)
+
+    return {
+        "householdId": household_id,
+        "received": len(batch.samples),
+        "events": events,
+        "isSleeping": stream.detector.is_sleeping,
+        "noop": None if outcome is None else outcome != "committed",
+        "stale": None if outcome is None else outcome == "stale",
+        "updated_device_states": result,
+    }
+
+
 @app.get("/")
-def root():
-    return {"ok": True, "service": "smartwatch-automation", "firebase_available": _firebase_available}
+async def root():
+    return {
+        "ok": True,
+        "service": "smartwatch-automation",
+        "storage_backend": _storage.name if _storage is not None else None,
+        "firebase_available": _storage is not None and _storage.name == "firestore",
+        "firestore_mode": getattr(_storage, "mode", None),
+    }
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving, whatever the state of the backend."""
+    return {"ok": True}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """
+    Readiness: 200 once the storage backend is initialized and warmed up,
+    503 while starting or if it could not be initialized. Also reports the
+    measured cold-start timings.
+    """
+    ready = _startup["phase"] == "ready"
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "storage_backend": _storage.name if _storage is not None else None, **_startup}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/debug/db")
-def debug_db():
-    if not _firebase_available:
-        raise HTTPException(status_code=503, detail="Firestore not initialized")
+async def debug_db(household_id: str = Depends(get_household_id)):
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized")
     try:
-        state_doc = _firestore_client.document(DOC_STATE).get()
-        lights_doc = _firestore_client.document(DOC_DEVICE_LIGHTS).get()
-        curtain_doc = _firestore_client.document(DOC_DEVICE_CURTAIN).get()
+        state, *devices = await _storage.read_docs(household_docs(household_id))
         return {
-            "state": state_doc.to_dict() if state_doc.exists else None,
-            "lights": lights_doc.to_dict() if lights_doc.exists else None,
-            "curtain": curtain_doc.to_dict() if curtain_doc.exists else None,
+            "householdId": household_id,
+            "state": state.to_dict() if state.exists else None,
+            **{name: (doc.to_dict() if doc.exists else None) for name, doc in zip(DEVICES, devices)},
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB read failed: {e}")
 
+@app.get("/debug/cache")
+async def debug_cache():
+    if _storage is None:
+        return {"backend": None}
+    return {
+        "backend": _storage.name,
+        **_storage.stats(),
+        "push": _event_broker.stats(),
+        "hr": _hr_ingestor.stats(),
+    }
+
+
+@app.get("/debug/writes")
+async def debug_writes():
+    total = sum(_write_stats.values())
+    return {
+        **_write_stats,
+        "suppressed_ratio": (_write_stats["suppressed"] / total) if total else None,
+    }
+
+
+@app.get("/events")
+async def stream_events(household_id: str = Depends(get_household_id)):
+    """
+    Server-Sent Events stream of a household's state and device changes. The
+    current value of every document is sent on connect, then one event per
+    change. All connections share the storage backend's change feed (for
+    Firestore, the document cache's listeners, which stay pinned while the
+    stream is open).
+    """
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized")
+    if not _storage.supports_push:
+        raise HTTPException(status_code=503, detail="Push channel requires a storage backend with change notifications")
+
+    paths = household_docs(household_id)
+    storage = _storage
+    sub = _event_broker.subscribe(household_id)
+    storage.pin(paths)
+    try:
+        docs = await storage.read_docs(paths)
+    except Exception:
+        storage.unpin(paths)
+        _event_broker.unsubscribe(household_id, sub)
+        raise
+    initial = [_change_event(doc.path, doc)[1:] for doc in docs]
+
+    async def _stream():
+        try:
+            for event_type, data in initial:
+                yield format_sse(event_type, data)
+            while True:
+                try:
+                    event_type, data = await asyncio.wait_for(sub.queue.get(), timeout=PUSH_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event_type, data)
+        finally:
+            storage.unpin(paths)
+            _event_broker.unsubscribe(household_id, sub)
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # ---------------- NEW: GET SETTINGS ----------------
+@app.get("/device/settings")
+async def get_device_settings(request: Request, response: Response, household_id: str = Depends(get_household_id)):
+    """
+    Return the full configuration of every device, with an ETag derived from
+    the device documents' versions. A request whose If-None-Match matches
+    the current ETag gets an empty 304 instead of the body.
+    """
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized")
+    try:
+        docs = await _storage.read_docs([device_doc(household_id, d) for d in DEVICES])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read device settings: {e}")
+
+    etag = _settings_etag(docs)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return {
+        name: (doc.to_dict() if doc.exists else None)
+        for name, doc in zip(DEVICES, docs)
+    }
+
+
 @app.get("/device/settings/sleep")
-def get_sleep_settings():
+async def get_sleep_settings(household_id: str = Depends(get_household_id)):
     """
     Return the configured 'sleepingStatus' for lights and curtain.
     """
-    if not _firebase_available:
-        raise HTTPException(status_code=503, detail="Firestore not initialized")
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized")
     try:
-        lights_doc = _firestore_client.document(DOC_DEVICE_LIGHTS).get()
-        curtain_doc = _firestore_client.document(DOC_DEVICE_CURTAIN).get()
+        lights_doc, curtain_doc = await _storage.read_docs([device_doc(household_id, d) for d in DEVICES])
 
         lights = lights_doc.to_dict() if lights_doc.exists else {}
         curtain = curtain_doc.to_dict() if curtain_doc.exists else {}
@@ -203,15 +606,14 @@ def get_sleep_settings():
 
 
 @app.get("/device/settings/not-sleep")
-def get_not_sleep_settings():
+async def get_not_sleep_settings(household_id: str = Depends(get_household_id)):
     """
     Return the configured 'notSleepingStatus' for lights and curtain.
     """
-    if not _firebase_available:
-        raise HTTPException(status_code=503, detail="Firestore not initialized")
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized")
     try:
-        lights_doc = _firestore_client.document(DOC_DEVICE_LIGHTS).get()
-        curtain_doc = _firestore_client.document(DOC_DEVICE_CURTAIN).get()
+        lights_doc, curtain_doc = await _storage.read_docs([device_doc(household_id, d) for d in DEVICES])
 
         lights = lights_doc.to_dict() if lights_doc.exists else {}
         curtain = curtain_doc.to_dict() if curtain_doc.exists else {}
@@ -225,14 +627,14 @@ def get_not_sleep_settings():
 
 
 @app.get("/state")
-def get_state():
+async def get_state(household_id: str = Depends(get_household_id)):
     """
-    Return current global sleep state document.
+    Return the household's current sleep state document.
     """
-    if not _firebase_available:
-        raise HTTPException(status_code=503, detail="Firestore not initialized")
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized")
     try:
-        doc = _firestore_client.document(DOC_STATE).get()
+        (doc,) = await _storage.read_docs([state_doc(household_id)])
         if doc.exists:
             data = doc.to_dict()
             return {"isSleeping": data.get("isSleeping")}
@@ -242,16 +644,20 @@ def get_state():
 
 
 @app.get("/state/is-sleeping")
-def get_is_sleeping():
+async def get_is_sleeping(household_id: str = Depends(get_household_id)):
     """
     Convenience endpoint returning only the boolean or null if missing.
     """
-    if not _firebase_available:
-        raise HTTPException(status_code=503, detail="Firestore not initialized")
+    if not await _storage_ready():
+        raise _storage_unavailable("Storage backend not initialized")
     try:
-        doc = _firestore_client.document(DOC_STATE).get()
+        (doc,) = await _storage.read_docs([state_doc(household_id)])
         if doc.exists:
             return {"isSleeping": bool(doc.to_dict().get("isSleeping"))}
         return {"isSleeping": None}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read isSleeping: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to read isSleeping: {e}")
+
+
+# End of module import; the rest of the cold start happens in lifespan.
+_startup["import_seconds"] = time.perf_counter() - _IMPORT_STARTED
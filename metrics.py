@@ -0,0 +1,135 @@
+"""
+Prometheus metrics for the API, served by GET /metrics.
+
+- http_request_duration_seconds{method, route, status}: handler latency per
+  route template (e.g. /device/settings), so query strings and household ids
+  never become labels
+- http_requests_in_progress{method, route}
+- storage_operation_duration_seconds{backend, op, path}: every backend round
+  trip, with `path` the document path template (households/{household}/...)
+- storage_operation_errors_total{backend, op, path}
+- storage_unavailable_total: requests answered 503 because no storage
+  backend could be initialized
+- storage_available: 1 once a backend is initialized, 0 otherwise
+- sleep_transitions_total{outcome}: sleep transitions "committed" vs.
+  "suppressed" because nothing changed (also on /debug/writes)
+- cold_start_seconds: module import until /readyz reports ready
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.routing import Match
+
+from doc_paths import path_template
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status code.",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled.",
+    ["method", "route"],
+)
+STORAGE_DURATION = Histogram(
+    "storage_operation_duration_seconds",
+    "Storage backend round trip latency by operation and document path template.",
+    ["backend", "op", "path"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+STORAGE_ERRORS = Counter(
+    "storage_operation_errors_total",
+    "Storage backend operations that raised.",
+    ["backend", "op", "path"],
+)
+STORAGE_UNAVAILABLE = Counter(
+    "storage_unavailable_total",
+    "Requests answered 503 because the storage backend is not initialized.",
+)
+STORAGE_AVAILABLE = Gauge(
+    "storage_available",
+    "1 if a storage backend is initialized, 0 otherwise.",
+)
+SLEEP_TRANSITIONS = Counter(
+    "sleep_transitions_total",
+    "Sleep transitions by outcome: committed, suppressed because nothing changed, or stale.",
+    ["outcome"],
+)
+COLD_START_SECONDS = Gauge(
+    "cold_start_seconds",
+    "Seconds from importing main until ready (storage initialized and warmed up).",
+)
+
+
+@contextmanager
+def time_storage_op(backend, op, path):
+    """Time one backend operation on `path` (a document path or an already templated label)."""
+    label = path if "{" in path else path_template(path)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STORAGE_ERRORS.labels(backend, op, label).inc()
+        raise
+    finally:
+        STORAGE_DURATION.labels(backend, op, label).observe(time.perf_counter() - start)
+
+
+class PrometheusMiddleware:
+    """ASGI middleware recording request latency and in-flight requests per route template."""
+
+    # Route templates are remembered per (method, path); the routes here have
+    # no path parameters, so this stays as small as the route table.
+    MAX_CACHED_ROUTES = 1024
+
+    def __init__(self, app, fastapi_app):
+        self.app = app
+        self._fastapi_app = fastapi_app
+        self._routes = {}
+
+    def _route_template(self, scope):
+        key = (scope["method"], scope["path"])
+        template = self._routes.get(key)
+        if template is not None:
+            return template
+        template = "unmatched"
+        for route in self._fastapi_app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+        # Unmatched paths are client-controlled: don't let them grow the cache.
+        if template != "unmatched" and len(self._routes) < self.MAX_CACHED_ROUTES:
+            self._routes[key] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        status = [500]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            in_progress.dec()
+            REQUEST_DURATION.labels(method, route, str(status[0])).observe(time.perf_counter() - start)
+
+
+def render():
+    """(body, content type) of the current metrics in the Prometheus text format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,81 @@
+"""
+Copy the old global documents (state/update, device/lights, device/curtain)
+into the per-household layout used by main.py (see doc_paths.py):
+
+    households/{household_id}/state/update
+    households/{household_id}/devices/{lights,curtain}
+
+Usage:
+    python migrate_households.py --household default            # copy
+    python migrate_households.py --household default --dry-run  # show only
+    python migrate_households.py --household default --delete-legacy
+"""
+import argparse
+import os
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from doc_paths import DEVICES, device_doc, state_doc
+
+KEY = "serviceAccountKey.json"
+LEGACY_STATE = "state/update"
+LEGACY_DEVICES = {device: f"device/{device}" for device in DEVICES}
+
+
+def plan(client, household_id, overwrite):
+    """Return [(source path, target path, data)] for every document to copy."""
+    pairs = [(LEGACY_STATE, state_doc(household_id))]
+    pairs += [(LEGACY_DEVICES[d], device_doc(household_id, d)) for d in DEVICES]
+
+    sources = {s.reference.path: s for s in client.get_all([client.document(src) for src, _ in pairs])}
+    targets = {s.reference.path: s for s in client.get_all([client.document(dst) for _, dst in pairs])}
+
+    copies = []
+    for src, dst in pairs:
+        snap = sources.get(src)
+        if snap is None or not snap.exists:
+            print(f"[SKIP] {src} does not exist")
+            continue
+        target = targets.get(dst)
+        if target is not None and target.exists and not overwrite:
+            print(f"[SKIP] {dst} already exists (use --overwrite to replace it)")
+            continue
+        copies.append((src, dst, snap.to_dict()))
+    return copies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move global state/device docs under households/{id}.")
+    parser.add_argument("--household", default=os.getenv("DEFAULT_HOUSEHOLD_ID", "default"))
+    parser.add_argument("--overwrite", action="store_true", help="replace existing household documents")
+    parser.add_argument("--delete-legacy", action="store_true", help="delete the global documents after copying")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if not os.path.exists(KEY):
+        raise SystemExit("serviceAccountKey.json missing")
+
+    firebase_admin.initialize_app(credentials.Certificate(KEY))
+    client = firestore.client()
+
+    copies = plan(client, args.household, args.overwrite)
+    for src, dst, data in copies:
+        print(f"[COPY] {src} -> {dst}: {data}")
+
+    if args.dry_run or not copies:
+        print("Nothing written.")
+        return
+
+    # One atomic batch: the household either gets every document or none.
+    batch = client.batch()
+    for src, dst, data in copies:
+        batch.set(client.document(dst), data)
+        if args.delete_legacy:
+            batch.delete(client.document(src))
+    batch.commit()
+    print(f"Migrated {len(copies)} document(s) to households/{args.household}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,572 @@
+"""
+Storage backends for the API. Every handler in main.py goes through the
+Storage interface, so the same endpoints can run on:
+
+- "firestore" (default): Cloud Firestore, optionally through the listener cache
+- "memory": a process-local dict, for load tests and single-process installs
+- "sqlite": a local SQLite file, for edge installs without cloud round trips
+
+The backend is chosen with STORAGE_BACKEND (see create_storage_from_env).
+Documents are addressed with the paths from doc_paths.py on every backend.
+"""
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+
+from doc_paths import DEFAULT_HOUSEHOLD_ID, DEVICES, device_doc, household_docs, state_doc
+from metrics import time_storage_op
+
+DEFAULT_DEVICE_DOC = {"sleepingStatus": False, "notSleepingStatus": True, "active": False}
+
+# Metric path label of operations spanning several documents of a household
+HOUSEHOLD_LABEL = "households/{household}"
+
+
+class StorageError(Exception):
+    """Base class for errors raised by a storage backend."""
+
+
+class InvalidDocumentError(StorageError):
+    """A stored document is missing fields the request needs."""
+
+
+class Document:
+    """
+    Backend-neutral document read: `data` is None when the document does not
+    exist, `version` changes on every write (used for ETags).
+    """
+
+    __slots__ = ("path", "data", "version")
+
+    def __init__(self, path, data, version=None):
+        self.path = path
+        self.data = data
+        self.version = version
+
+    @property
+    def exists(self):
+        return self.data is not None
+
+    def to_dict(self):
+        return dict(self.data) if self.data is not None else None
+
+
+def plan_sleep_transition(is_sleeping, state, devices, event_time=None):
+    """
+    Decide the writes for a sleep transition from the current state document
+    and device documents ({device: Document}). Documents that already hold the
+    target values are left out, so an unchanged transition plans no writes.
+
+    `event_time` (unix seconds) is when the transition happened; the newest
+    one accepted is stored on the state document as eventTime, also when the
+    state itself is unchanged. A transition older than the stored one is
+    stale (e.g. a journal replayed hours late) and plans no writes, leaving
+    the newer state in place.
+
+    Returns (writes, result, outcome) where writes is a list of (op, path,
+    data) with op one of "merge" (set with merge), "update" or "set", result
+    maps '<device>_active' to the device's new 'active' value, and outcome is
+    "committed", "suppressed" (nothing changed) or "stale".
+    """
+    stored_time = state.data.get("eventTime", float("-inf")) if state.exists else float("-inf")
+    if event_time is not None and stored_time > event_time:
+        result = {f"{name}_active": doc.data.get("active") if doc.exists else None for name, doc in devices.items()}
+        return [], result, "stale"
+
+    setting = "sleepingStatus" if is_sleeping else "notSleepingStatus"
+    writes = []
+    changed = not state.exists or state.data.get("isSleeping") != is_sleeping
+
+    data = {"isSleeping": is_sleeping} if changed else {}
+    if event_time is not None and event_time > stored_time:
+        data["eventTime"] = event_time
+    if data:
+        writes.append(("merge", state.path, data))
+
+    result = {}
+    for name, doc in devices.items():
+        if doc.exists:
+            new_state = doc.data.get(setting)
+            if new_state is None:
+                raise InvalidDocumentError("Device configuration missing required fields.")
+            if doc.data.get("active") != new_state:
+                writes.append(("update", doc.path, {"active": new_state}))
+                changed = True
+        else:
+            new_state = DEFAULT_DEVICE_DOC[setting]
+            writes.append(("set", doc.path, {**DEFAULT_DEVICE_DOC, "active": new_state}))
+            changed = True
+        result[f"{name}_active"] = new_state
+    return writes, result, "committed" if changed else "suppressed"
+
+
+class Storage:
+    """Interface implemented by every backend. All data methods are coroutines."""
+
+    name = "base"
+
+    def __init__(self):
+        self._change_callbacks = []
+
+    @property
+    def supports_push(self):
+        """True when add_change_callback will see every change (needed by /events)."""
+        return True
+
+    def add_change_callback(self, callback):
+        """Register callback(path, Document), called after every change to a document."""
+        self._change_callbacks.append(callback)
+
+    def _notify(self, path, doc):
+        for callback in self._change_callbacks:
+            try:
+                callback(path, doc)
+            except Exception as e:
+                print(f"[WARN] Change callback failed for {path}: {e}")
+
+    def pin(self, paths):
+        """Keep change notifications flowing for `paths` until unpin(); a no-op for backends that always notify."""
+
+    def unpin(self, paths):
+        """Release a pin() of `paths`."""
+
+    async def read_docs(self, paths):
+        """Return a Document for each path, in order."""
+        raise NotImplementedError
+
+    async def commit_sleep_transition(self, household_id, is_sleeping, event_time=None):
+        """
+        Atomically apply plan_sleep_transition for the household.
+        Returns (result, outcome) with plan_sleep_transition's outcome.
+        """
+        raise NotImplementedError
+
+    async def update_device_setting(self, household_id, device, setting, value):
+        """Set one setting field of a device, creating the device with defaults first if needed."""
+        raise NotImplementedError
+
+    async def warm_up(self, paths):
+        """Open connections and prime caches by reading `paths`; called once at startup."""
+        await self.read_docs(paths)
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+# ---------------- MEMORY ----------------
+class MemoryStorage(Storage):
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._versions = {}
+        self._counter = itertools.count(1)
+
+    def _doc(self, path):
+        data = self._docs.get(path)
+        return Document(path, dict(data) if data is not None else None, self._versions.get(path))
+
+    def _apply(self, writes):
+        changed = []
+        for op, path, data in writes:
+            if op == "set":
+                self._docs[path] = dict(data)
+            else:
+                if op == "update" and path not in self._docs:
+                    raise StorageError(f"No document to update: {path}")
+                self._docs.setdefault(path, {}).update(data)
+            self._versions[path] = str(next(self._counter))
+            changed.append(path)
+        return [(path, self._doc(path)) for path in changed]
+
+    async def read_docs(self, paths):
+        with self._lock:
+            return [self._doc(path) for path in paths]
+
+    async def commit_sleep_transition(self, household_id, is_sleeping, event_time=None):
+        with self._lock:
+            state = self._doc(state_doc(household_id))
+            devices = {d: self._doc(device_doc(household_id, d)) for d in DEVICES}
+            writes, result, outcome = plan_sleep_transition(is_sleeping, state, devices, event_time)
+            changed = self._apply(writes)
+        for path, doc in changed:
+            self._notify(path, doc)
+        return result, outcome
+
+    async def update_device_setting(self, household_id, device, setting, value):
+        path = device_doc(household_id, device)
+        with self._lock:
+            base = self._docs.get(path, DEFAULT_DEVICE_DOC)
+            changed = self._apply([("set", path, {**base, setting: value})])
+        for changed_path, doc in changed:
+            self._notify(changed_path, doc)
+
+    def stats(self):
+        with self._lock:
+            return {"documents": len(self._docs)}
+
+
+# ---------------- SQLITE ----------------
+class SQLiteStorage(Storage):
+    """
+    One table of JSON documents keyed by path. A single connection is shared
+    behind a lock and every call runs in the threadpool; sleep transitions run
+    inside one IMMEDIATE transaction, so the read and the writes are atomic.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " path TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " version INTEGER NOT NULL)"
+        )
+
+    def _read(self, paths):
+        placeholders = ",".join("?" * len(paths))
+        rows = self._conn.execute(
+            f"SELECT path, data, version FROM documents WHERE path IN ({placeholders})", list(paths)
+        ).fetchall()
+        found = {path: Document(path, json.loads(data), str(version)) for path, data, version in rows}
+        return [found.get(path) or Document(path, None) for path in paths]
+
+    def _apply(self, writes):
+        current = {doc.path: doc for doc in self._read([path for _, path, _ in writes])} if writes else {}
+        changed = []
+        for op, path, data in writes:
+            doc = current[path]
+            if op == "set":
+                new_data = dict(data)
+            else:
+                if op == "update" and not doc.exists:
+                    raise StorageError(f"No document to update: {path}")
+                new_data = {**(doc.data or {}), **data}
+            version = int(doc.version or 0) + 1
+            self._conn.execute(
+                "INSERT INTO documents (path, data, version) VALUES (?, ?, ?)"
+                " ON CONFLICT(path) DO UPDATE SET data = excluded.data, version = excluded.version",
+                (path, json.dumps(new_data), version),
+            )
+            current[path] = Document(path, new_data, str(version))
+            changed.append(path)
+        return [(path, current[path]) for path in changed]
+
+    def _transaction(self, fn, label):
+        with self._lock, time_storage_op(self.name, "transaction", label):
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return out
+
+    async def read_docs(self, paths):
+        def _read():
+            with self._lock, time_storage_op(self.name, "get", paths[0] if len(paths) == 1 else HOUSEHOLD_LABEL):
+                return self._read(paths)
+        return await run_in_threadpool(_read)
+
+    async def commit_sleep_transition(self, household_id, is_sleeping, event_time=None):
+        def _commit():
+            state, *device_docs = self._read(household_docs(household_id))
+            writes, result, outcome = plan_sleep_transition(is_sleeping, state, dict(zip(DEVICES, device_docs)), event_time)
+            return result, outcome, self._apply(writes)
+
+        result, outcome, changed = await run_in_threadpool(self._transaction, _commit, HOUSEHOLD_LABEL)
+        for path, doc in changed:
+            self._notify(path, doc)
+        return result, outcome
+
+    async def update_device_setting(self, household_id, device, setting, value):
+        path = device_doc(household_id, device)
+
+        def _update():
+            (doc,) = self._read([path])
+            return self._apply([("set", path, {**(doc.data or DEFAULT_DEVICE_DOC), setting: value})])
+
+        changed = await run_in_threadpool(self._transaction, _update, path)
+        for changed_path, doc in changed:
+            self._notify(changed_path, doc)
+
+    def stats(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+        return {"path": self.db_path, "documents": count}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ---------------- FIRESTORE ----------------
+def _to_document(snapshot):
+    return Document(
+        snapshot.reference.path,
+        snapshot.to_dict() if snapshot.exists else None,
+        snapshot.update_time.isoformat() if snapshot.exists and snapshot.update_time else None,
+    )
+
+
+class FirestoreStorage(Storage):
+    """
+    Firestore backend. In "sync" mode the blocking client runs in the
+    threadpool; in "async" mode the AsyncClient is awaited on the event loop
+    and independent reads are gathered. Reads go through the listener-backed
+    DocumentCache when one is given (it always uses the sync client, since
+    only that supports on_snapshot).
+    """
+
+    name = "firestore"
+
+    def __init__(self, client, async_client=None, cache=None):
+        super().__init__()
+        self._client = client
+        self._async_client = async_client
+        self._cache = cache
+        self.mode = "async" if async_client is not None else "sync"
+        if cache is not None:
+            cache.add_change_callback(lambda path, snapshot: self._notify(path, _to_document(snapshot)))
+
+    @property
+    def supports_push(self):
+        return self._cache is not None
+
+    def pin(self, paths):
+        """Exempt `paths` from the cache's LRU eviction, so their listeners keep feeding /events."""
+        if self._cache is not None:
+            for path in paths:
+                self._cache.pin(path)
+
+    def unpin(self, paths):
+        if self._cache is not None:
+            for path in paths:
+                self._cache.unpin(path)
+
+    # reads
+    def _read_doc(self, path):
+        if self._cache is not None:
+            snapshot = self._cache.get_cached(path)
+            if snapshot is not None:
+                return snapshot
+        with time_storage_op(self.name, "get", path):
+            return self._client.document(path).get()
+
+    async def _read_doc_async(self, path):
+        if self._cache is not None:
+            snapshot = self._cache.get_cached(path)
+            if snapshot is not None:
+                return snapshot
+        with time_storage_op(self.name, "get", path):
+            return await self._async_client.document(path).get()
+
+    async def read_docs(self, paths):
+        """
+        In async mode the reads are issued concurrently on the AsyncClient;
+        in sync mode they run back to back on one threadpool thread.
+        """
+        if self._async_client is not None:
+            snapshots = await asyncio.gather(*(self._read_doc_async(p) for p in paths))
+        else:
+            snapshots = await run_in_threadpool(lambda: [self._read_doc(p) for p in paths])
+        return [_to_document(snap) for snap in snapshots]
+
+    async def warm_up(self, paths, timeout=10.0):
+        """
+        Open the gRPC channel of each client with one get_all of `paths`, then
+        wait (up to `timeout` seconds) for the listener cache to hold them, so
+        the first polls after startup are served from memory.
+        """
+        refs = [self._client.document(p) for p in paths]
+        with time_storage_op(self.name, "get_all", HOUSEHOLD_LABEL):
+            await run_in_threadpool(lambda: list(self._client.get_all(refs)))
+        if self._async_client is not None:
+            async_refs = [self._async_client.document(p) for p in paths]
+            with time_storage_op(self.name, "get_all", HOUSEHOLD_LABEL):
+                async for _ in self._async_client.get_all(async_refs):
+                    pass
+        if self._cache is None:
+            return
+        for path in paths:
+            self._cache.watch(path)
+        deadline = asyncio.get_running_loop().time() + timeout
+        while any(self._cache.get_cached(p, count=False) is None for p in paths):
+            if asyncio.get_running_loop().time() > deadline:
+                print("[WARN] Document cache not populated before warm-up timeout")
+                return
+            await asyncio.sleep(0.05)
+
+    # sleep transitions
+    def _stage(self, client, transaction, household_id, is_sleeping, event_time, snapshots):
+        docs = {snap.reference.path: _to_document(snap) for snap in snapshots}
+        state = docs[state_doc(household_id)]
+        devices = {d: docs[device_doc(household_id, d)] for d in DEVICES}
+        writes, result, outcome = plan_sleep_transition(is_sleeping, state, devices, event_time)
+        for op, path, data in writes:
+            ref = client.document(path)
+            if op == "merge":
+                transaction.set(ref, data, merge=True)
+            elif op == "update":
+                transaction.update(ref, data)
+            else:
+                transaction.set(ref, data)
+        return result, outcome
+
+    def _commit_sync(self, household_id, is_sleeping, event_time):
+        from google.cloud.firestore import transactional
+
+        client = self._client
+        refs = [client.document(path) for path in household_docs(household_id)]
+
+        @transactional
+        def _run(transaction):
+            with time_storage_op(self.name, "get_all", HOUSEHOLD_LABEL):
+                snapshots = list(client.get_all(refs, transaction=transaction))
+            return self._stage(client, transaction, household_id, is_sleeping, event_time, snapshots)
+
+        with time_storage_op(self.name, "transaction", HOUSEHOLD_LABEL):
+            return _run(client.transaction())
+
+    async def _commit_async(self, household_id, is_sleeping, event_time):
+        from google.cloud.firestore import async_transactional
+
+        client = self._async_client
+        refs = [client.document(path) for path in household_docs(household_id)]
+
+        @async_transactional
+        async def _run(transaction):
+            with time_storage_op(self.name, "get_all", HOUSEHOLD_LABEL):
+                snapshots = [snap async for snap in client.get_all(refs, transaction=transaction)]
+            return self._stage(client, transaction, household_id, is_sleeping, event_time, snapshots)
+
+        with time_storage_op(self.name, "transaction", HOUSEHOLD_LABEL):
+            return await _run(client.transaction())
+
+    async def commit_sleep_transition(self, household_id, is_sleeping, event_time=None):
+        """
+        Read, plan and write in one Firestore transaction: the get_all of the
+        state and device docs and the writes it plans commit atomically, and a
+        concurrent transition that changes those docs in between makes this
+        one retry with fresh reads. The read never comes from the listener
+        cache, so a change still in flight to the listener is never mistaken
+        for a repeat. An unchanged transition writes at most its eventTime, and
+        a stale one commits the transaction with no writes.
+        """
+        if self._async_client is not None:
+            return await self._commit_async(household_id, is_sleeping, event_time)
+        return await run_in_threadpool(self._commit_sync, household_id, is_sleeping, event_time)
+
+    # settings
+    async def update_device_setting(self, household_id, device, setting, value):
+        path = device_doc(household_id, device)
+        if self._async_client is not None:
+            ref = self._async_client.document(path)
+            with time_storage_op(self.name, "get", path):
+                doc = await ref.get()
+            if not doc.exists:
+                with time_storage_op(self.name, "set", path):
+                    await ref.set(dict(DEFAULT_DEVICE_DOC))
+            with time_storage_op(self.name, "update", path):
+                await ref.update({setting: value})
+            return
+
+        ref = self._client.document(path)
+
+        def _update():
+            with time_storage_op(self.name, "get", path):
+                doc = ref.get()
+            if not doc.exists:
+                with time_storage_op(self.name, "set", path):
+                    ref.set(dict(DEFAULT_DEVICE_DOC))
+            with time_storage_op(self.name, "update", path):
+                ref.update({setting: value})
+
+        await run_in_threadpool(_update)
+
+    def stats(self):
+        if self._cache is None:
+            return {"mode": self.mode, "cache": {"enabled": False}}
+        return {"mode": self.mode, "cache": {"enabled": True, **self._cache.stats()}}
+
+    def close(self):
+        if self._cache is not None:
+            self._cache.stop()
+
+
+def create_firestore_storage():
+    """
+    Initialize firebase_admin from serviceAccountKey.json and build the
+    Firestore backend (FIRESTORE_MODE=sync|async, FIRESTORE_CACHE=0 disables
+    the listener cache). Returns None when Firestore cannot be initialized.
+    """
+    if not os.path.exists("serviceAccountKey.json"):
+        print("[WARN] serviceAccountKey.json not found. Firestore disabled for this process.")
+        return None
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore, firestore_async
+    from doc_cache import DocumentCache
+
+    mode = os.getenv("FIRESTORE_MODE", "sync").strip().lower()
+    try:
+        cred = credentials.Certificate("serviceAccountKey.json")
+        firebase_admin.initialize_app(cred)
+        # The sync client is always created: snapshot listeners are only available on it.
+        client = firestore.client()
+        async_client = firestore_async.client() if mode == "async" else None
+        print(f"[INFO] Firestore initialized ({mode} mode)")
+    except Exception as e:
+        print(f"[WARN] Firestore init failed: {e}")
+        return None
+
+    cache = None
+    if os.getenv("FIRESTORE_CACHE", "1") != "0":
+        cache = DocumentCache(
+            client,
+            household_docs(DEFAULT_HOUSEHOLD_ID),
+            max_watched=int(os.getenv("FIRESTORE_CACHE_MAX_DOCS", "3000")),
+        )
+    storage = FirestoreStorage(client, async_client, cache)
+    if cache is not None:
+        cache.start()
+        print("[INFO] Document cache listeners started")
+    return storage
+
+
+def create_storage_from_env():
+    """
+    Build the backend named by STORAGE_BACKEND ("firestore", "memory" or
+    "sqlite"; SQLITE_PATH sets the database file). Returns None if the
+    backend could not be initialized.
+    """
+    backend = os.getenv("STORAGE_BACKEND", "firestore").strip().lower()
+    if backend == "memory":
+        print("[INFO] Using in-memory storage (data is lost on restart)")
+        return MemoryStorage()
+    if backend == "sqlite":
+        db_path = os.getenv("SQLITE_PATH", "smartwatch.db")
+        print(f"[INFO] Using SQLite storage at {db_path}")
+        return SQLiteStorage(db_path)
+    if backend != "firestore":
+        print(f"[WARN] Unknown STORAGE_BACKEND '{backend}'. Storage disabled for this process.")
+        return None
+    return create_firestore_storage()
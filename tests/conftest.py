@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the server modules (main, storage, ...) and the hardware package from the repo root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
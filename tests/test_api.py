@@ -0,0 +1,164 @@
+import datetime
+import gzip
+import time
+import urllib.parse
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from hardware.api_client import ApiClient, ApiError
+from storage import MemoryStorage
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "_storage", MemoryStorage())
+    with TestClient(main.app) as c:
+        yield c
+
+
+class _TestClientTransport:
+    """ApiClient transport that sends through a FastAPI TestClient and records the statuses."""
+
+    errors = ()
+
+    def __init__(self, client):
+        self._client = client
+        self.statuses = []
+
+    def send(self, method, url, body, headers, timeout):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        r = self._client.request(method, path, content=body, headers=headers)
+        self.statuses.append(r.status_code)
+        return r.status_code, r.headers, r.content
+
+    def close(self):
+        pass
+
+
+# ---------------- /device/settings ETag ----------------
+def test_settings_etag_and_304(client):
+    first = client.get("/device/settings")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = client.get("/device/settings", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert client.get("/device/settings", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    update = {"device": "lights", "setting": "sleepingStatus", "value": True}
+    assert client.post("/device/update-setting", json=update).status_code == 200
+    changed = client.get("/device/settings", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["lights"]["sleepingStatus"] is True
+
+
+def test_api_client_revalidates_with_etag(client):
+    api = ApiClient("http://testserver")
+    api._transport = transport = _TestClientTransport(client)
+    client.post("/device/update-setting", json={"device": "curtain", "setting": "sleepingStatus", "value": True})
+
+    body = api.get_json("/device/settings")
+    assert api.get_json("/device/settings") == body
+    assert transport.statuses == [200, 304]
+
+    client.post("/device/update-setting", json={"device": "curtain", "setting": "sleepingStatus", "value": False})
+    assert api.get_json("/device/settings")["curtain"]["sleepingStatus"] is False
+    assert transport.statuses == [200, 304, 200]
+
+
+def test_api_client_rejects_body_that_is_not_json(client):
+    api = ApiClient("http://testserver")
+    api._transport = _TestClientTransport(client)
+    with pytest.raises(ApiError, match="not JSON"):
+        api.get_json("/metrics")
+
+
+# ---------------- /update-sleep/batch ----------------
+def test_replayed_event_older_than_state_is_skipped(client):
+    assert client.post("/update-sleep", json={"isSleeping": True}).json()["noop"] is False
+    stale = {"events": [{"isSleeping": False, "timestamp": time.time() - 3600}]}
+    r = client.post("/update-sleep/batch", json=stale).json()
+    assert (r["noop"], r["stale"]) == (True, True)
+    fresh = {"events": [{"isSleeping": False, "timestamp": time.time() + 1}]}
+    assert client.post("/update-sleep/batch", json=fresh).json()["noop"] is False
+
+
+def test_event_from_the_future_does_not_lock_out_later_ones(client):
+    future = {"events": [{"isSleeping": True, "timestamp": time.time() + 86400}]}
+    assert client.post("/update-sleep/batch", json=future).json()["noop"] is False
+    r = client.post("/update-sleep", json={"isSleeping": False}).json()
+    assert (r["noop"], r["stale"]) == (False, False)
+
+
+# ---------------- /hr/batch ----------------
+def _night_samples(minutes, bpm=50):
+    start = datetime.datetime(2026, 1, 15, 23, 0, tzinfo=datetime.timezone.utc).timestamp()
+    return [[int(start) + 60 * i, bpm] for i in range(minutes)]
+
+
+def test_hr_batch_rejects_gzip_bomb(client):
+    bomb = gzip.compress(b'{"samples": [' + b" " * (main.MAX_HR_BATCH_BYTES + 1) + b"]}")
+    r = client.post("/hr/batch", content=bomb, headers={"Content-Encoding": "gzip"})
+    assert r.status_code == 413
+
+
+def test_hr_batch_rejects_too_many_samples(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_HR_BATCH_SAMPLES", 5)
+    r = client.post("/hr/batch", json={"samples": _night_samples(6)})
+    assert r.status_code == 413
+
+
+def test_hr_batch_transition_survives_failed_commit(client, monkeypatch):
+    samples = _night_samples(6)
+
+    async def failing_commit(*args):
+        raise HTTPException(status_code=500, detail="Storage error")
+
+    with monkeypatch.context() as m:
+        m.setattr(main, "commit_sleep_transition", failing_commit)
+        assert client.post("/hr/batch?household=retry", json={"samples": samples}).status_code == 500
+
+    r = client.post("/hr/batch?household=retry", json={"samples": samples})
+    assert r.status_code == 200
+    assert "SLEEP_DETECTED" in [e["event"] for e in r.json()["events"]]
+    assert r.json()["noop"] is False
+    assert client.get("/state/is-sleeping?household=retry").json()["isSleeping"] is True
+    assert client.get("/debug/cache").json()["hr"]["households"] >= 1
+
+
+# ---------------- /metrics ----------------
+def _metric(client, line_prefix):
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_sleep_transitions_are_exported(client):
+    committed = _metric(client, 'sleep_transitions_total{outcome="committed"}')
+    suppressed = _metric(client, 'sleep_transitions_total{outcome="suppressed"}')
+    client.post("/update-sleep?household=metrics", json={"isSleeping": True})
+    client.post("/update-sleep?household=metrics", json={"isSleeping": True})
+    assert _metric(client, 'sleep_transitions_total{outcome="committed"}') == committed + 1
+    assert _metric(client, 'sleep_transitions_total{outcome="suppressed"}') == suppressed + 1
+
+    stale = _metric(client, 'sleep_transitions_total{outcome="stale"}')
+    old = {"events": [{"isSleeping": False, "timestamp": time.time() - 3600}]}
+    client.post("/update-sleep/batch?household=metrics", json=old)
+    assert _metric(client, 'sleep_transitions_total{outcome="stale"}') == stale + 1
+    assert client.get("/debug/writes").json()["stale"] >= 1
+
+
+def test_events_without_storage_counts_unavailable(monkeypatch):
+    monkeypatch.setattr(main, "_storage", None)
+    monkeypatch.setenv("STORAGE_BACKEND", "none")
+    with TestClient(main.app) as c:
+        before = _metric(c, "storage_unavailable_total")
+        assert c.get("/events").status_code == 503
+        assert _metric(c, "storage_unavailable_total") == before + 1
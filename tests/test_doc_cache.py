@@ -0,0 +1,74 @@
+from doc_cache import DocumentCache
+
+
+class _Watch:
+    is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+
+
+class _Document:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def on_snapshot(self, callback):
+        self._client.listeners[self.path] = callback
+        return _Watch()
+
+
+class _Client:
+    """Just enough of firestore.Client for DocumentCache: listeners are fired by the test."""
+
+    def __init__(self):
+        self.listeners = {}
+
+    def document(self, path):
+        return _Document(self, path)
+
+
+class _Snapshot:
+    exists = True
+    update_time = None
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+def test_missing_document_is_cached_and_notified():
+    client = _Client()
+    cache = DocumentCache(client)
+    changes = []
+    cache.add_change_callback(lambda path, snapshot: changes.append((path, snapshot.exists)))
+    cache.start()
+    cache.watch("households/h/state/update")
+    assert cache.get_cached("households/h/state/update") is None
+
+    listener = client.listeners["households/h/state/update"]
+    listener([_Snapshot(client.document("households/h/state/update"), {"isSleeping": True})], [], None)
+    assert cache.get_cached("households/h/state/update").to_dict() == {"isSleeping": True}
+
+    listener([], [], None)   # deleted
+    snapshot = cache.get_cached("households/h/state/update")
+    assert snapshot is not None and not snapshot.exists and snapshot.to_dict() is None
+    assert changes == [("households/h/state/update", True), ("households/h/state/update", False)]
+
+
+def test_pinned_documents_are_not_evicted():
+    cache = DocumentCache(_Client(), max_watched=2)
+    cache.start()
+    cache.pin("a")
+    for path in ("b", "c", "d"):
+        cache.watch(path)
+    assert cache.stats()["watched"] == 2
+    assert cache._is_connected("a")
+
+    cache.unpin("a")
+    cache.watch("e")
+    assert not cache._is_connected("a")
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from hardware.history import HeartRateHistory
+
+
+def _samples(n, seed=0, start=1_768_000_000):
+    rng = np.random.default_rng(seed)
+    ts = start + np.cumsum(rng.integers(0, 40, size=n))   # repeats and gaps included
+    bpm = rng.integers(40, 180, size=n)
+    return ts, bpm
+
+
+def _rollup(ts, bpm, width):
+    """Brute force: {bucket start: (min, mean, max)} over all samples."""
+    buckets = {}
+    for t, b in zip(ts.tolist(), bpm.tolist()):
+        buckets.setdefault(t - t % width, []).append(b)
+    return {start: (min(v), sum(v) / len(v), max(v)) for start, v in buckets.items()}
+
+
+def _check_tier(tier, ts, bpm):
+    starts, mins, means, maxs = tier.window(0, 2 ** 32)
+    expected = _rollup(ts, bpm, tier.width)
+    # The tier only keeps its newest buckets.
+    kept = sorted(expected)[-len(tier):]
+    assert starts.tolist() == kept
+    assert mins.tolist() == [expected[s][0] for s in kept]
+    assert maxs.tolist() == [expected[s][2] for s in kept]
+    np.testing.assert_allclose(means, [expected[s][1] for s in kept])
+
+
+def _fill(history, ts, bpm, mode):
+    if mode == "append":
+        for t, b in zip(ts.tolist(), bpm.tolist()):
+            history.append(t, b)
+    else:
+        rng = np.random.default_rng(1)
+        cuts = np.sort(rng.choice(np.arange(1, len(ts)), size=200, replace=False))
+        for t, b in zip(np.split(ts, cuts), np.split(bpm, cuts)):
+            history.extend(t, b)
+
+
+@pytest.mark.parametrize("mode", ["append", "extend"])
+def test_rollups_match_brute_force(mode):
+    ts, bpm = _samples(50_000)
+    history = HeartRateHistory(capacity=4096, minute_buckets=2000, quarter_buckets=300)
+    _fill(history, ts, bpm, mode)
+
+    assert len(history) == 4096
+    raw_ts, raw_bpm = history.window(0, 2 ** 32)
+    assert raw_ts.tolist() == ts[-4096:].tolist()
+    assert raw_bpm.tolist() == bpm[-4096:].tolist()
+    _check_tier(history.minutes, ts, bpm)
+    _check_tier(history.quarters, ts, bpm)
+
+
+def test_window_after_wrap_and_out_of_order_samples():
+    ts, bpm = _samples(1000, seed=3)
+    history = HeartRateHistory(capacity=256)
+    history.extend(ts, bpm)
+    assert history.append(int(ts[-1]) - 1, 60) is False
+    assert history.dropped == 1
+
+    lo, hi = int(ts[-200]), int(ts[-50])
+    got_ts, got_bpm = history.window(lo, hi)
+    keep = (ts >= lo) & (ts < hi)
+    assert got_ts.tolist() == ts[keep].tolist()
+    assert got_bpm.tolist() == bpm[keep].tolist()
@@ -0,0 +1,59 @@
+import datetime
+import json
+
+import numpy as np
+import pytest
+
+from hardware.intraday import parse_dataset
+
+DAY = datetime.date(2026, 1, 15)
+
+
+def _body(n, seed=0, compact=True):
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.choice(86400, size=n, replace=False))
+    dataset = [{"time": f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}", "value": int(v)}
+               for s, v in zip(seconds, rng.integers(1, 250, size=n))]
+    body = {
+        "activities-heart": [{"dateTime": DAY.isoformat(), "value": {"restingHeartRate": 61}}],
+        "activities-heart-intraday": {"dataset": dataset, "datasetInterval": 1, "datasetType": "second"},
+    }
+    return json.dumps(body, separators=(",", ":") if compact else None).encode()
+
+
+def _expected(body):
+    dataset = json.loads(body)["activities-heart-intraday"]["dataset"]
+    seconds = [int(d["time"][:2]) * 3600 + int(d["time"][3:5]) * 60 + int(d["time"][6:]) for d in dataset]
+    return seconds, [d["value"] for d in dataset]
+
+
+def _chunks(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("compact", [True, False])
+@pytest.mark.parametrize("chunk_size", [7, 1000, 65536])
+def test_parse_dataset_matches_json_loads(compact, chunk_size):
+    body = _body(3000, compact=compact)
+    series = parse_dataset(_chunks(body, chunk_size), DAY)
+    seconds, bpm = _expected(body)
+    assert series.day == DAY
+    assert series.seconds.tolist() == seconds
+    assert series.bpm.tolist() == bpm
+
+
+def test_parse_dataset_other_key_order():
+    body = b'{"activities-heart-intraday":{"dataset":[{"value":61,"time":"00:00:05"},{"time":"00:01:00","value":7}]}}'
+    series = parse_dataset([body], DAY)
+    assert series.seconds.tolist() == [5, 60]
+    assert series.bpm.tolist() == [61, 7]
+
+
+def test_parse_dataset_without_intraday_is_empty():
+    assert len(parse_dataset([b'{"activities-heart":[]}'], DAY).bpm) == 0
+
+
+def test_parse_dataset_truncated_raises():
+    body = _body(100)
+    with pytest.raises(ValueError):
+        parse_dataset([body[:len(body) // 2]], DAY)
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from hardware.replay import replay, replay_scalar, synthetic_nights
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_replay_matches_scalar_detector(seed):
+    minute, bpm, starts = synthetic_nights(20, seed=seed)
+    expected = replay_scalar(minute, bpm, 65, starts=starts)
+    assert expected  # the synthetic nights do contain sleep and wake events
+    assert replay(minute, bpm, 65, starts=starts).events() == expected
+
+
+@pytest.mark.parametrize("sleep_threshold,required_minutes", [(3, 1), (5, 3), (8, 10)])
+def test_replay_matches_scalar_on_random_minutes(sleep_threshold, required_minutes):
+    rng = np.random.default_rng(sleep_threshold * 100 + required_minutes)
+    minute = rng.integers(0, 1440, size=5000)
+    bpm = rng.integers(45, 80, size=5000)
+    starts = np.sort(rng.choice(5000, size=7, replace=False))
+    expected = replay_scalar(minute, bpm, 65, sleep_threshold, required_minutes, starts=starts)
+    result = replay(minute, bpm, 65, sleep_threshold, required_minutes, starts=starts)
+    assert result.events() == expected
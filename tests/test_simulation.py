@@ -0,0 +1,22 @@
+import datetime
+
+from hardware.simulation import Simulation, demo_night, synthetic_night
+
+DATE = datetime.date(2026, 1, 15)
+
+
+def test_demo_night_actuates_once_each_way():
+    sim = Simulation()
+    events = sim.run(demo_night(DATE))
+    assert [e for _, e in events] == ["SLEEP_DETECTED", "WAKE_DETECTED"]
+    servo = [value for _, name, value in sim.timeline() if name == "servo" and value not in (0, 7.5)]
+    assert servo == [2.5, 12.5]   # close once, open once
+    assert [p[2]["events"][0]["isSleeping"] for p in sim.api.posts] == [True]
+
+
+def test_second_samples_are_averaged_per_minute():
+    samples = synthetic_night(DATE, seconds_per_sample=1)
+    sim = Simulation()
+    events = sim.run(samples)
+    assert sim.controller.samples == 17 * 60   # one detector reading per minute, not per sample
+    assert [e for _, e in events] == ["SLEEP_DETECTED", "WAKE_DETECTED"]
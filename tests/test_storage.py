@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from benchmarks.firestore_standin import StandInAsyncClient, StandInClient, StandInStore
+from doc_paths import device_doc, household_docs, state_doc
+from storage import (
+    DEFAULT_DEVICE_DOC,
+    Document,
+    FirestoreStorage,
+    InvalidDocumentError,
+    MemoryStorage,
+    SQLiteStorage,
+    plan_sleep_transition,
+)
+
+HOUSEHOLD = "h1"
+LIGHTS = device_doc(HOUSEHOLD, "lights")
+CURTAIN = device_doc(HOUSEHOLD, "curtain")
+STATE = state_doc(HOUSEHOLD)
+
+
+def _devices(lights=None, curtain=None):
+    return {"lights": Document(LIGHTS, lights), "curtain": Document(CURTAIN, curtain)}
+
+
+# ---------------- plan_sleep_transition ----------------
+def test_plan_creates_missing_documents_with_defaults():
+    writes, result, _ = plan_sleep_transition(True, Document(STATE, None), _devices())
+    assert writes == [
+        ("merge", STATE, {"isSleeping": True}),
+        ("set", LIGHTS, {**DEFAULT_DEVICE_DOC, "active": DEFAULT_DEVICE_DOC["sleepingStatus"]}),
+        ("set", CURTAIN, {**DEFAULT_DEVICE_DOC, "active": DEFAULT_DEVICE_DOC["sleepingStatus"]}),
+    ]
+    assert result == {"lights_active": False, "curtain_active": False}
+
+
+def test_plan_updates_only_devices_that_change():
+    lights = {"sleepingStatus": False, "notSleepingStatus": True, "active": True}
+    curtain = {"sleepingStatus": True, "notSleepingStatus": False, "active": True}
+    writes, result, _ = plan_sleep_transition(True, Document(STATE, {"isSleeping": False}), _devices(lights, curtain))
+    assert writes == [("merge", STATE, {"isSleeping": True}), ("update", LIGHTS, {"active": False})]
+    assert result == {"lights_active": False, "curtain_active": True}
+
+
+def test_plan_unchanged_transition_has_no_writes():
+    lights = {"sleepingStatus": False, "notSleepingStatus": True, "active": False}
+    writes, result, outcome = plan_sleep_transition(True, Document(STATE, {"isSleeping": True}), _devices(lights, lights))
+    assert (writes, outcome) == ([], "suppressed")
+    assert result == {"lights_active": False, "curtain_active": False}
+
+
+def test_plan_rejects_device_without_settings():
+    with pytest.raises(InvalidDocumentError):
+        plan_sleep_transition(True, Document(STATE, None), _devices({"active": True}))
+
+
+def test_plan_records_event_time_and_skips_older_events():
+    writes, _, outcome = plan_sleep_transition(True, Document(STATE, None), _devices(), event_time=100.0)
+    assert writes[0] == ("merge", STATE, {"isSleeping": True, "eventTime": 100.0})
+    assert outcome == "committed"
+
+    state = Document(STATE, {"isSleeping": True, "eventTime": 100.0})
+    lights = {**DEFAULT_DEVICE_DOC, "active": True}
+    writes, result, outcome = plan_sleep_transition(False, state, _devices(lights, lights), event_time=50.0)
+    assert (writes, outcome) == ([], "stale")
+    assert result == {"lights_active": True, "curtain_active": True}
+
+    writes, _, outcome = plan_sleep_transition(False, state, _devices(lights, lights), event_time=150.0)
+    assert writes[0] == ("merge", STATE, {"isSleeping": False, "eventTime": 150.0})
+    assert outcome == "committed"
+
+
+def test_plan_repeat_only_advances_event_time():
+    state = Document(STATE, {"isSleeping": True, "eventTime": 100.0})
+    asleep = {**DEFAULT_DEVICE_DOC, "active": False}
+    writes, _, outcome = plan_sleep_transition(True, state, _devices(asleep, asleep), event_time=150.0)
+    assert (writes, outcome) == ([("merge", STATE, {"eventTime": 150.0})], "suppressed")
+
+    writes, _, outcome = plan_sleep_transition(True, state, _devices(asleep, asleep), event_time=100.0)
+    assert (writes, outcome) == ([], "suppressed")
+
+
+# ---------------- backends ----------------
+@pytest.fixture(params=["memory", "sqlite", "firestore-sync", "firestore-async"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        backend = MemoryStorage()
+    elif request.param == "sqlite":
+        backend = SQLiteStorage(str(tmp_path / "smartwatch.db"))
+    else:
+        store = StandInStore(latency=0)
+        async_client = StandInAsyncClient(store) if request.param == "firestore-async" else None
+        backend = FirestoreStorage(StandInClient(store), async_client=async_client)
+    yield backend
+    if hasattr(backend, "close"):
+        backend.close()
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_transition_writes_then_noop(storage):
+    result, outcome = _run(storage.commit_sleep_transition(HOUSEHOLD, True))
+    assert (result, outcome) == ({"lights_active": False, "curtain_active": False}, "committed")
+
+    result, outcome = _run(storage.commit_sleep_transition(HOUSEHOLD, True))
+    assert (result, outcome) == ({"lights_active": False, "curtain_active": False}, "suppressed")
+
+    state, lights, curtain = _run(storage.read_docs(household_docs(HOUSEHOLD)))
+    assert state.to_dict()["isSleeping"] is True
+    assert lights.to_dict() == {**DEFAULT_DEVICE_DOC, "active": False}
+    assert curtain.to_dict() == {**DEFAULT_DEVICE_DOC, "active": False}
+
+    result, outcome = _run(storage.commit_sleep_transition(HOUSEHOLD, False))
+    assert (result, outcome) == ({"lights_active": True, "curtain_active": True}, "committed")
+
+
+def test_transition_follows_device_settings(storage):
+    _run(storage.update_device_setting(HOUSEHOLD, "lights", "sleepingStatus", True))
+    result, outcome = _run(storage.commit_sleep_transition(HOUSEHOLD, True))
+    assert (result, outcome) == ({"lights_active": True, "curtain_active": False}, "committed")
+
+
+def test_stale_transition_is_skipped(storage):
+    _run(storage.commit_sleep_transition(HOUSEHOLD, True, event_time=200.0))
+    result, outcome = _run(storage.commit_sleep_transition(HOUSEHOLD, False, event_time=100.0))
+    assert outcome == "stale"
+    state = _run(storage.read_docs([STATE]))[0]
+    assert state.to_dict() == {"isSleeping": True, "eventTime": 200.0}
+
+    _, outcome = _run(storage.commit_sleep_transition(HOUSEHOLD, True, event_time=300.0))
+    assert outcome == "suppressed"
+    state = _run(storage.read_docs([STATE]))[0]
+    assert state.to_dict() == {"isSleeping": True, "eventTime": 300.0}
+
+
+def test_change_callbacks_see_written_documents(storage):
+    seen = []
+    storage.add_change_callback(lambda path, doc: seen.append(path))
+    _run(storage.commit_sleep_transition(HOUSEHOLD, True))
+    if storage.supports_push:
+        assert sorted(seen) == sorted(household_docs(HOUSEHOLD))